@@ -1,9 +1,14 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException
 import api.auto_dotenv  # Fuerza la carga de .env
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from api.routers import analysis
 from api.routers import rag as rag_router
+from api.routers import cache as cache_router
+from api.routers import jobs as jobs_router
+from api.services import job_service
 from pathlib import Path
 import socket
 import urllib.request
@@ -12,6 +17,51 @@ from src.config import settings
 from fastapi.responses import ORJSONResponse
 import time
 from src.rag_system.retriever_factory import get_rag_chain
+from src.resources import get_chroma_client, chroma_client_kind, startup_resources, ashutdown_resources
+from src.rate_limit import is_overloaded, note_shed
+from src.cache import ingest_stamp_scope
+from src.rag_system.reranker import warm_reranker
+from src.llm_provider import warm_embeddings
+from src.turbo_pipeline import warm_turbo_retriever
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Clientes compartidos (Chroma, pool HTTP de OpenAI) creados una vez por proceso
+    startup_resources()
+    # Modelos locales (embeddings / reranker, si están habilitados): cargar antes del primer request
+    await asyncio.to_thread(warm_embeddings)
+    await asyncio.to_thread(warm_reranker)
+    # Retriever TURBO (vectorstore Chroma): construirlo fuera del event loop y antes del primer request
+    await asyncio.to_thread(warm_turbo_retriever)
+    # Workers de la cola de jobs (POST /api/jobs)
+    await job_service.start_workers()
+    try:
+        yield
+    finally:
+        await job_service.stop_workers()
+        await ashutdown_resources()
+
+
+def _shed_load() -> None:
+    # Backpressure: con la cola de llamadas a OpenAI sobre el umbral, rechazar antes de sumar trabajo
+    if is_overloaded():
+        note_shed()
+        raise HTTPException(status_code=503, detail="Servicio saturado, reintentar más tarde.", headers={"Retry-After": "5"})
+
+
+class _IngestStampMiddleware:
+    """ASGI: memoiza el sello de ingesta por request (un solo GET a Redis aunque varios caminos lo lean)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with ingest_stamp_scope():
+            await self.app(scope, receive, send)
 
 
 def create_app() -> FastAPI:
@@ -20,6 +70,7 @@ def create_app() -> FastAPI:
         description="API para ejecutar el análisis de seguridad con agentes de IA.",
         version="1.1.0",
         default_response_class=ORJSONResponse,
+        lifespan=_lifespan,
     )
 
     app.add_middleware(
@@ -29,9 +80,12 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(_IngestStampMiddleware)
 
-    app.include_router(analysis.router, prefix="/api", tags=["Analysis"])
-    app.include_router(rag_router.router, prefix="/api", tags=["RAG"])
+    app.include_router(analysis.router, prefix="/api", tags=["Analysis"], dependencies=[Depends(_shed_load)])
+    app.include_router(rag_router.router, prefix="/api", tags=["RAG"], dependencies=[Depends(_shed_load)])
+    app.include_router(cache_router.router, prefix="/api", tags=["Cache"])
+    app.include_router(jobs_router.router, prefix="/api", tags=["Jobs"])
 
 
     @app.get("/", summary="Endpoint de estado", tags=["Status"])
@@ -62,18 +116,11 @@ def create_app() -> FastAPI:
                 status["mcp_dns"] = "ok"
         except Exception:
             status["mcp_dns"] = "fail"
-        # Chroma: primero intentamos vía SDK; si falla, intentamos REST
+        # Chroma: primero vía el cliente compartido del registro (sin crear uno por probe); si falla, REST
         try:
             if settings.CHROMA_DB_HOST and settings.CHROMA_DB_PORT:
-                try:
-                    import chromadb  # type: ignore
-                    from chromadb.config import Settings as _ChromaCfg  # type: ignore
-                    _cfg = _ChromaCfg(
-                        chroma_api_impl="rest",
-                        chroma_server_host=settings.CHROMA_DB_HOST,
-                        chroma_server_http_port=settings.CHROMA_DB_PORT,
-                    )
-                    _client = chromadb.Client(_cfg)  # type: ignore
+                _client = get_chroma_client()
+                if chroma_client_kind() == "http":
                     _col = _client.get_or_create_collection(settings.COLLECTION_NAME)
                     try:
                         _count = _col.count()  # type: ignore
@@ -83,8 +130,6 @@ def create_app() -> FastAPI:
                     status["chroma_collection"] = "present"
                     status["chroma_count"] = _count
                     return status
-                except Exception:
-                    pass
         except Exception:
             pass
 
@@ -146,9 +191,7 @@ def create_app() -> FastAPI:
                 if coll_state != "present" or cnt_state == "unknown":
                     # Fallback: intentar leer conteo desde el directorio persistente local
                     try:
-                        import chromadb  # type: ignore
-                        _pc = chromadb.PersistentClient(path=str(settings.CHROMA_DB_PATH))  # type: ignore
-                        _col = _pc.get_or_create_collection(settings.COLLECTION_NAME)
+                        _col = get_chroma_client().get_or_create_collection(settings.COLLECTION_NAME)
                         status["chroma_collection"] = "present"
                         status["chroma_count"] = _col.count()  # type: ignore
                     except Exception:
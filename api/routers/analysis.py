@@ -1,8 +1,10 @@
+import json
 import logging
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query
-from api.services import crew_service
+from fastapi.responses import StreamingResponse
+from api.services import crew_service, batch_service
 
-from api.schemas.analysis import AnalysisRequest, AnalysisResponse
+from api.schemas.analysis import AnalysisRequest, AnalysisResponse, BatchAnalysisRequest
 
 router = APIRouter()
 
@@ -43,6 +45,76 @@ async def analyze_ecosystem(request: AnalysisRequest, mode: str | None = Query(d
         )
 
 
+def _sse(event: str, data: dict) -> str:
+    """Serializa un evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post(
+    "/analyze/stream",
+    summary="Análisis de seguridad en streaming (Server-Sent Events)",
+    description=(
+        "Igual que /analyze pero emite eventos SSE a medida que avanza el pipeline: "
+        "start, retrieval, token (texto parcial del LLM, turbo), task (tareas de la crew, heavy), "
+        "y finalmente report con el FinalReport validado (o error)."
+    ),
+)
+async def analyze_ecosystem_stream(request: AnalysisRequest, mode: str | None = Query(default=None, description="Analyzer mode: heavy|turbo")):
+    async def events():
+        try:
+            async for event, data in crew_service.stream_analysis_crew(request.user_input, mode_override=mode):
+                yield _sse(event, data)
+        except ValueError as ve:
+            logging.error(f"Input inválido: {ve}")
+            yield _sse("error", {"status": 422, "detail": str(ve)})
+        except Exception as e:
+            logging.critical(f"Error inesperado en el endpoint /analyze/stream: {e}", exc_info=True)
+            yield _sse("error", {"status": 500, "detail": "Ocurrió un error interno inesperado en el servidor de análisis."})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/analyze/batch",
+    summary="Análisis por lotes",
+    description=(
+        "Analiza varios inputs con concurrencia acotada, deduplicando inputs idénticos (normalizados) "
+        "y compartiendo la recuperación entre inputs similares (turbo). Por defecto responde JSON "
+        "{results, summary}; con `format=jsonl` emite NDJSON (un item por línea al terminar, y el resumen al final)."
+    ),
+)
+async def analyze_batch(
+    request: BatchAnalysisRequest,
+    mode: str | None = Query(default=None, description="Analyzer mode: heavy|turbo"),
+    format: str = Query(default="json", description="json|jsonl"),
+):
+    items = [it.model_dump() for it in request.items]
+    if not items:
+        raise HTTPException(status_code=422, detail="El batch no puede estar vacío.")
+    try:
+        if format == "jsonl":
+            gen = batch_service.iter_batch(items, mode_override=mode, concurrency=request.concurrency)
+            # Validar antes de abrir el stream para poder responder 422
+            first = await gen.__anext__()
+
+            async def lines():
+                yield json.dumps(first, ensure_ascii=False) + "\n"
+                async for record in gen:
+                    yield json.dumps(record, ensure_ascii=False) + "\n"
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+        return await batch_service.run_batch(items, mode_override=mode, concurrency=request.concurrency)
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    except Exception as e:
+        logging.critical(f"Error inesperado en el endpoint /analyze/batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Ocurrió un error interno inesperado en el análisis por lotes.")
+
+
 @router.post(
     "/analyze-upload",
     response_model=AnalysisResponse,
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from src.turbo_pipeline import get_report_cache_stats
+from src.cache import memory_cache_stats
+from src.rag_system.embeddings import embedding_cache_stats
+from src.singleflight import singleflight_stats
+from src.rate_limit import limiter_stats
+
+
+router = APIRouter()
+
+
+@router.get("/cache/stats", summary="Métricas de cachés (reportes turbo, tier en memoria, embeddings, single-flight, limitador LLM)")
+async def cache_stats():
+    return {
+        "report_cache": get_report_cache_stats(),
+        "memory_cache": memory_cache_stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "singleflight": singleflight_stats(),
+        "llm_limiter": limiter_stats(),
+    }
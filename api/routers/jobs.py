@@ -0,0 +1,66 @@
+import logging
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+
+from api.schemas.analysis import AnalysisRequest
+from api.schemas.jobs import JobResponse
+from api.services import job_service
+
+router = APIRouter()
+
+
+def _to_response(job: dict) -> JobResponse:
+    data = {k: v for k, v in job.items() if k != "user_input"}
+    return JobResponse.model_validate(data)
+
+
+@router.post(
+    "/jobs",
+    response_model=JobResponse,
+    status_code=202,
+    summary="Encolar un análisis (job asíncrono)",
+    description=(
+        "Encola el análisis (pensado para el modo heavy) y responde de inmediato con el job_id. "
+        "Consultar el estado y el resultado con GET /api/jobs/{job_id}. Ante JOB_TIMEOUT_SECONDS el job "
+        "pasa a 'failed' (timeout) y la crew heavy se detiene tras el paso de agente en curso."
+    ),
+)
+async def create_job(request: AnalysisRequest, mode: str | None = Query(default=None, description="Analyzer mode: heavy|turbo")):
+    try:
+        job = await job_service.submit_job(request.user_input, mode_override=mode)
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    except job_service.JobQueueFull as qf:
+        # Load shedding explícito: el cliente reintenta en lugar de perder el request
+        return ORJSONResponse(status_code=503, content={"detail": str(qf)}, headers={"Retry-After": "5"})
+    except Exception as e:
+        logging.critical(f"Error inesperado encolando job: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="La cola de jobs no está disponible.")
+    return _to_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse, summary="Estado y resultado de un job")
+async def read_job(job_id: str):
+    job = await job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado.")
+    return _to_response(job)
+
+
+@router.delete(
+    "/jobs/{job_id}",
+    response_model=JobResponse,
+    summary="Cancelar un job encolado o en curso",
+    description=(
+        "Un job encolado no llega a ejecutarse. En uno en curso (heavy), la crew corre en un thread que no se "
+        "puede interrumpir: se detiene tras el paso de agente en curso (la llamada al LLM o tool en vuelo "
+        "termina) y su resultado se descarta; hasta entonces sigue ocupando un thread y cuota de LLM."
+    ),
+)
+async def cancel_job(job_id: str):
+    job = await job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado.")
+    if job["status"] in job_service.TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"El job ya finalizó ({job['status']}).")
+    return _to_response(await job_service.cancel_job(job_id))
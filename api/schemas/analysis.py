@@ -12,3 +12,17 @@ class AnalysisResponse(BaseModel):
     report_json: str
     session_id: str | None = None
     timing_ms: int | None = None
+
+
+class BatchItem(BaseModel):
+    """Item de un batch: id opcional (por defecto su posición) y el input del usuario."""
+
+    id: str | None = None
+    user_input: str
+
+
+class BatchAnalysisRequest(BaseModel):
+    """Solicitud de análisis por lotes."""
+
+    items: list[BatchItem]
+    concurrency: int | None = None
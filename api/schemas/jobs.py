@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+
+from api.schemas.analysis import AnalysisResponse
+
+
+class JobResponse(BaseModel):
+    """Estado de un job de análisis: queued | running | succeeded | failed | cancelled."""
+
+    job_id: str
+    status: str
+    mode: str
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: AnalysisResponse | None = None
+    error: str | None = None
@@ -0,0 +1,208 @@
+"""
+Análisis por lotes: fan-out acotado sobre `run_analysis_crew`.
+
+- Deduplica inputs idénticos tras `_norm_question` (se analizan una sola vez).
+- En turbo, agrupa inputs similares (coseno de sus embeddings, calculados en un único
+  llamado batcheado) y comparte la recuperación del grupo vía `RetrievalScope`; los reportes
+  de los alias no se escriben en el caché de reportes.
+- Rechaza ids duplicados (los resultados se identifican por id).
+- Produce un registro por item (timing incluido) y métricas agregadas de throughput.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.config import settings
+from src.rag_system.embeddings import get_embeddings
+from src.turbo_pipeline import RetrievalScope, _norm_question, set_retrieval_scope
+from api.services import crew_service
+
+
+async def _retrieval_aliases(questions: List[str], threshold: float) -> Dict[str, str]:
+    """Agrupa preguntas por similitud (greedy): cada una apunta al primer representante similar."""
+    aliases = {q: q for q in questions}
+    if len(questions) < 2:
+        return aliases
+    try:
+        vecs = np.asarray(await get_embeddings().aembed_documents(questions), dtype=np.float32)
+    except Exception:
+        return aliases
+    vecs = vecs / (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-10)
+    reps: List[int] = []
+    for i, q in enumerate(questions):
+        if reps:
+            sims = vecs[reps] @ vecs[i]
+            j = int(np.argmax(sims))
+            if float(sims[j]) >= threshold:
+                aliases[q] = questions[reps[j]]
+                continue
+        reps.append(i)
+    return aliases
+
+
+def _parse_report(result: Dict[str, Any]) -> Dict[str, Any] | None:
+    try:
+        report = json.loads(result.get("report_json") or "{}")
+        return report if isinstance(report, dict) and report else None
+    except Exception:
+        return None
+
+
+def _percentile(values: List[int], pct: float) -> int:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+async def iter_batch(
+    items: Iterable[Dict[str, Any]],
+    mode_override: Optional[str] = None,
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Analiza `items` ({"id", "user_input"}) con concurrencia acotada y emite un registro por
+    item a medida que termina; el último registro es el resumen (`{"type": "summary", ...}`).
+    """
+    items = [dict(it) for it in items]
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise ValueError(f"El batch supera el máximo de {settings.BATCH_MAX_ITEMS} items.")
+    for idx, it in enumerate(items):
+        it["id"] = str(it.get("id") or idx)
+        if not str(it.get("user_input") or "").strip():
+            raise ValueError(f"El item {it['id']} tiene un input vacío.")
+    seen: set[str] = set()
+    dup_ids = sorted({it["id"] for it in items if it["id"] in seen or seen.add(it["id"])})
+    if dup_ids:
+        # Los resultados se identifican por id: ids repetidos se pisarían en `run_batch`
+        raise ValueError(f"Ids duplicados en el batch: {', '.join(dup_ids[:10])}.")
+    want_turbo = crew_service._want_turbo(mode_override)
+    mode = "turbo" if want_turbo else "heavy"
+    concurrency = max(1, int(concurrency or settings.BATCH_MAX_CONCURRENCY))
+
+    # Deduplicación por pregunta normalizada: el primer item de cada grupo es el que se ejecuta
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for it in items:
+        groups.setdefault(_norm_question(it["user_input"]), []).append(it)
+    unique = list(groups)
+
+    t0 = time.perf_counter()
+    scope = None
+    if want_turbo:
+        # Embeddings de todos los inputs en un llamado batcheado (quedan en caché para la
+        # recuperación) y grupos de inputs similares que comparten una sola búsqueda
+        scope = RetrievalScope(await _retrieval_aliases(unique, settings.BATCH_RETRIEVAL_SHARE_THRESHOLD))
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _run(qn: str) -> List[Dict[str, Any]]:
+        first, *dups = groups[qn]
+        # Cada tarea tiene su propia copia del contexto: el scope no se filtra al caller
+        set_retrieval_scope(scope)
+        async with sem:
+            t_item = time.perf_counter()
+            # La crew heavy corre en un thread que `task.cancel()` no detiene: se le avisa con el evento
+            cancel_event = threading.Event()
+            try:
+                result = await crew_service.run_analysis_crew(first["user_input"], mode_override=mode, cancel_event=cancel_event)
+                report = _parse_report(result)
+                record = {
+                    "id": first["id"],
+                    "status": "ok" if report is not None else "error",
+                    "report": report,
+                    "missing_fields": result.get("missing_fields", []),
+                    "error": None if report is not None else "empty_report",
+                }
+            except asyncio.CancelledError:
+                cancel_event.set()
+                raise
+            except Exception as e:
+                record = {"id": first["id"], "status": "error", "report": None, "missing_fields": [], "error": str(e) or type(e).__name__}
+            record["timing_ms"] = int((time.perf_counter() - t_item) * 1000)
+        record.update(type="item", mode=mode, duplicate_of=None)
+        out = [record]
+        for dup in dups:
+            out.append({**record, "id": dup["id"], "duplicate_of": first["id"], "timing_ms": 0})
+        return out
+
+    timings: List[int] = []
+    succeeded = failed = 0
+    tasks = [asyncio.ensure_future(_run(qn)) for qn in unique]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            for record in await fut:
+                if record["duplicate_of"] is None:
+                    timings.append(record["timing_ms"])
+                if record["status"] == "ok":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield record
+    finally:
+        # Cliente desconectado / generador cerrado: no dejar análisis huérfanos
+        for t in tasks:
+            t.cancel()
+
+    wall_s = time.perf_counter() - t0
+    wall_ms = int(wall_s * 1000)
+    yield {
+        "type": "summary",
+        "mode": mode,
+        "items": len(items),
+        "unique": len(unique),
+        "duplicates": len(items) - len(unique),
+        "succeeded": succeeded,
+        "failed": failed,
+        "concurrency": concurrency,
+        "retrievals": scope.fetches if scope is not None else None,
+        "wall_ms": wall_ms,
+        "items_per_second": round(len(items) / wall_s, 3) if wall_s > 0 else None,
+        "item_ms_p50": _percentile(timings, 0.5),
+        "item_ms_p95": _percentile(timings, 0.95),
+    }
+
+
+async def run_batch(items: Iterable[Dict[str, Any]], mode_override: Optional[str] = None, concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """Versión no incremental de `iter_batch`: {"results": [...] (orden de entrada), "summary": {...}}."""
+    items = list(items)
+    records: Dict[str, Dict[str, Any]] = {}
+    summary: Dict[str, Any] = {}
+    async for record in iter_batch(items, mode_override=mode_override, concurrency=concurrency):
+        if record["type"] == "summary":
+            summary = record
+        else:
+            records[record["id"]] = record
+    order = [str(it.get("id") or idx) for idx, it in enumerate(items)]
+    return {"results": [records[i] for i in order if i in records], "summary": summary}
+
+
+def load_batch_inputs(path: str | Path) -> List[Dict[str, Any]]:
+    """
+    Carga items desde un directorio (cada *.txt es un item, id = nombre del archivo) o un
+    .jsonl (objetos con `user_input`/`text` e `id` opcional, o strings JSON).
+    """
+    p = Path(path)
+    if p.is_dir():
+        return [{"id": f.stem, "user_input": f.read_text(encoding="utf-8")} for f in sorted(p.glob("*.txt"))]
+    items: List[Dict[str, Any]] = []
+    with p.open("r", encoding="utf-8") as fh:
+        for n, line in enumerate(fh, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if isinstance(obj, str):
+                items.append({"id": str(n), "user_input": obj})
+            elif isinstance(obj, dict):
+                items.append({"id": str(obj.get("id") or n), "user_input": obj.get("user_input") or obj.get("text") or ""})
+            else:
+                raise ValueError(f"Línea {n}: se esperaba un objeto o string JSON.")
+    return items
@@ -4,13 +4,15 @@ Servicio para ejecutar la SecurityAnalysisCrew (MCP de 3 agentes).
 
 import uuid
 import asyncio
+import threading
 import json
 import time
+from typing import AsyncIterator
 
 from src.mcp_crews import SecurityAnalysisCrew, run_mcp_analysis
 from src.logging_config import setup_session_logging as setup_agent_trace_logging
 from src.config import settings
-from src.turbo_pipeline import run_turbo_pipeline
+from src.turbo_pipeline import arun_turbo_pipeline, astream_turbo_pipeline
 
 
 def _normalize_heavy_report(data: dict) -> dict:
@@ -63,29 +65,22 @@ def _normalize_heavy_report(data: dict) -> dict:
 # Eliminado: síntesis y reparaciones ad-hoc; se resuelve a nivel de prompts y validación
 
 
-from src.models import SecurityReportInput
+from src.models import FinalReport, SecurityReportInput
 
-async def run_analysis_crew(user_input: str | SecurityReportInput, mode_override: str | None = None):
-    """
-    Ejecuta la SecurityAnalysisCrew y retorna el reporte final en JSON y session_id.
-    Usa internamente run_mcp_analysis y setup_agent_trace_logging para permitir mocking en tests.
-    """
-    session_id = str(uuid.uuid4())
-    logger = setup_agent_trace_logging(session_id)
+
+def _input_text(user_input: str | SecurityReportInput) -> str:
     # Si el input es un modelo Pydantic, extraer el texto
     if isinstance(user_input, SecurityReportInput):
-        user_input_str = user_input.text
-    else:
-        user_input_str = str(user_input)
-    t0 = time.perf_counter()
-    want_turbo = (mode_override or ("turbo" if settings.is_turbo else "heavy")).lower() == "turbo"
-    if want_turbo:
-        # Pipeline rápido sin CrewAI
-        result = await asyncio.to_thread(run_turbo_pipeline, user_input_str)
-    else:
-        # Llamada al orquestador MCP (firma esperada por tests: (text, logger))
-        result = await asyncio.to_thread(run_mcp_analysis, user_input_str, logger)
-    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+        return user_input.text
+    return str(user_input)
+
+
+def _want_turbo(mode_override: str | None) -> bool:
+    return (mode_override or ("turbo" if settings.is_turbo else "heavy")).lower() == "turbo"
+
+
+def _finalize_result(result, want_turbo: bool, elapsed_ms: int) -> tuple[dict | None, list[str]]:
+    """Normaliza el resultado crudo del pipeline a dict de reporte; retorna (reporte, campos faltantes)."""
     # Normalizar a dict si vino como string/TaskOutput serializado
     normalized: dict | None = None
     if isinstance(result, dict):
@@ -114,27 +109,113 @@ async def run_analysis_crew(user_input: str | SecurityReportInput, mode_override
     # Validate expected fields for FinalReport
     expected_fields = ["application_name", "summary", "prioritized_detectors"]
     target = normalized if normalized is not None else (result if isinstance(result, dict) else None)
-    if isinstance(target, dict):
-        # Limpieza mínima del resultado segun modo
-        if want_turbo and isinstance(target, dict):
-            target.pop("cached", None)
-            target.pop("session_id", None)
-        if not want_turbo:
-            target = _normalize_heavy_report(target)
-        # Adjuntar timing dentro del propio reporte para que el frontend lo vea al parsear report_json
-        try:
-            # Usar clave sin guion bajo para consistencia con envelope
-            target.pop("_timing_ms", None)
-            target["timing_ms"] = elapsed_ms
-        except Exception:
-            pass
-        missing = [f for f in expected_fields if f not in target or not target.get(f)]
-        if missing:
-            print(f"[WARNING] FinalReport is missing fields: {missing}")
+    if not isinstance(target, dict):
+        return None, expected_fields
+    # Limpieza mínima del resultado segun modo
+    if want_turbo:
+        target.pop("cached", None)
+        target.pop("session_id", None)
+    else:
+        target = _normalize_heavy_report(target)
+    # Adjuntar timing dentro del propio reporte para que el frontend lo vea al parsear report_json
+    try:
+        # Usar clave sin guion bajo para consistencia con envelope
+        target.pop("_timing_ms", None)
+        target["timing_ms"] = elapsed_ms
+    except Exception:
+        pass
+    missing = [f for f in expected_fields if f not in target or not target.get(f)]
+    if missing:
+        print(f"[WARNING] FinalReport is missing fields: {missing}")
+    return target, missing
+
+
+async def run_analysis_crew(user_input: str | SecurityReportInput, mode_override: str | None = None, cancel_event=None):
+    """
+    Ejecuta la SecurityAnalysisCrew y retorna el reporte final en JSON y session_id.
+    Usa internamente run_mcp_analysis y setup_agent_trace_logging para permitir mocking en tests.
+    En heavy la crew corre en un thread que no se interrumpe al cancelar esta corrutina:
+    activar `cancel_event` (threading.Event) para que termine tras el paso de agente en curso.
+    """
+    session_id = str(uuid.uuid4())
+    logger = setup_agent_trace_logging(session_id)
+    user_input_str = _input_text(user_input)
+    t0 = time.perf_counter()
+    want_turbo = _want_turbo(mode_override)
+    if want_turbo:
+        # Pipeline rápido sin CrewAI, nativo async (no ocupa un thread del executor)
+        result = await arun_turbo_pipeline(user_input_str)
+    else:
+        # Llamada al orquestador MCP (firma esperada por tests: (text, logger))
+        if cancel_event is not None:
+            result = await asyncio.to_thread(run_mcp_analysis, user_input_str, logger, cancel_event=cancel_event)
+        else:
+            result = await asyncio.to_thread(run_mcp_analysis, user_input_str, logger)
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    target, missing = _finalize_result(result, want_turbo, elapsed_ms)
+    if target is not None:
         return {"report_json": json.dumps(target, ensure_ascii=False, indent=2), "session_id": session_id, "missing_fields": missing, "timing_ms": elapsed_ms}
     
     # Si no es un dict, retornar advertencia
-    return {"report_json": "{}", "session_id": session_id, "missing_fields": expected_fields, "timing_ms": elapsed_ms}
+    return {"report_json": "{}", "session_id": session_id, "missing_fields": missing, "timing_ms": elapsed_ms}
+
+
+async def _heavy_events(user_input_str: str, logger) -> AsyncIterator[tuple[str, dict]]:
+    """Ejecuta la crew en un thread y reenvía sus eventos de progreso al event loop; termina con ('result', ...)."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def on_event(name: str, payload: dict) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, (name, payload))
+
+    cancel_event = threading.Event()
+    fut = asyncio.ensure_future(
+        asyncio.to_thread(run_mcp_analysis, user_input_str, logger, on_event=on_event, cancel_event=cancel_event)
+    )
+    # Centinela: los eventos previos ya están encolados (call_soon_threadsafe preserva el orden)
+    fut.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (item := await queue.get()) is not None:
+            yield item
+        yield "result", {"result": await fut}
+    finally:
+        # Cliente desconectado: la crew termina tras el paso en curso en vez de seguir en segundo plano
+        cancel_event.set()
+
+
+async def stream_analysis_crew(user_input: str | SecurityReportInput, mode_override: str | None = None) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Versión en streaming de `run_analysis_crew`: produce (evento, datos) a medida que avanza
+    el análisis ('start', 'retrieval', 'token', 'task', ...) y termina con 'report'.
+    """
+    session_id = str(uuid.uuid4())
+    logger = setup_agent_trace_logging(session_id)
+    user_input_str = _input_text(user_input)
+    if not user_input_str.strip():
+        raise ValueError("El input no puede estar vacío.")
+    want_turbo = _want_turbo(mode_override)
+    yield "start", {"session_id": session_id, "mode": "turbo" if want_turbo else "heavy"}
+
+    t0 = time.perf_counter()
+    result = None
+    events = astream_turbo_pipeline(user_input_str) if want_turbo else _heavy_events(user_input_str, logger)
+    async for event, payload in events:
+        if event in ("report", "result"):
+            result = payload if event == "report" else payload.get("result")
+            continue
+        yield event, payload
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+
+    target, missing = _finalize_result(result, want_turbo, elapsed_ms)
+    valid = False
+    if target is not None:
+        try:
+            FinalReport.model_validate(target)
+            valid = True
+        except Exception:
+            valid = False
+    yield "report", {"report": target or {}, "session_id": session_id, "missing_fields": missing, "timing_ms": elapsed_ms, "valid": valid}
+
 
 # Exponer para tests
-__all__ = ["run_analysis_crew", "run_mcp_analysis", "setup_agent_trace_logging"]
+__all__ = ["run_analysis_crew", "stream_analysis_crew", "run_mcp_analysis", "setup_agent_trace_logging"]
@@ -0,0 +1,288 @@
+"""
+Cola de jobs para análisis largos (modo heavy).
+
+`POST /api/jobs` encola y responde de inmediato; un pool acotado de workers async
+(JOB_WORKERS) consume la cola, ejecuta `run_analysis_crew` y persiste estado y resultado.
+Backend Redis (lista `jobs:queue` + registros `job:{id}` con TTL) si REDIS_HOST/PORT
+están configurados; de lo contrario cola y registros en proceso.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, Optional
+
+from src.config import settings
+from src.cache import get_async_redis_client, ingest_stamp_scope
+from api.services import crew_service
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+TERMINAL_STATUSES = frozenset({"succeeded", "failed", "cancelled"})
+_QUEUE_KEY = "jobs:queue"
+_POLL_INTERVAL_SECONDS = 0.5
+
+
+class JobQueueFull(RuntimeError):
+    """La cola alcanzó JOB_QUEUE_MAX_SIZE; el cliente debe reintentar más tarde."""
+
+
+class _MemoryBackend:
+    """Cola y registros en proceso (un solo worker pool por proceso)."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: deque[str] = deque()
+        self._event: Optional[asyncio.Event] = None
+
+    def _wakeup(self) -> asyncio.Event:
+        if self._event is None:
+            self._event = asyncio.Event()
+        return self._event
+
+    def _prune(self) -> None:
+        # Retención: descartar jobs terminados más viejos que JOB_RESULT_TTL_SECONDS
+        cutoff = time.time() - settings.JOB_RESULT_TTL_SECONDS
+        for job_id in [k for k, j in self._jobs.items() if j["status"] in TERMINAL_STATUSES and (j.get("finished_at") or 0) < cutoff]:
+            self._jobs.pop(job_id, None)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["job_id"]] = dict(job)
+        self._prune()
+
+    async def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def enqueue(self, job_id: str) -> None:
+        if len(self._queue) >= settings.JOB_QUEUE_MAX_SIZE:
+            raise JobQueueFull("La cola de jobs está llena.")
+        self._queue.append(job_id)
+        self._wakeup().set()
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        if not self._queue:
+            event = self._wakeup()
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._queue.popleft() if self._queue else None
+
+    async def size(self) -> int:
+        return len(self._queue)
+
+    def reset(self) -> None:
+        # El Event queda ligado al loop en el que se creó
+        self._event = None
+
+
+class _RedisBackend:
+    """Cola compartida entre instancias de la API (lista Redis) y registros con TTL."""
+
+    def _client(self):
+        client = get_async_redis_client(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB)
+        if client is None:
+            raise RuntimeError("Redis no está disponible para la cola de jobs.")
+        return client
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        await self._client().setex(f"job:{job['job_id']}", settings.JOB_RESULT_TTL_SECONDS, json.dumps(job, ensure_ascii=False))
+
+    async def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self._client().get(f"job:{job_id}")
+        if raw is None:
+            return None
+        return json.loads(raw.decode("utf-8") if isinstance(raw, bytes) else raw)
+
+    async def enqueue(self, job_id: str) -> None:
+        client = self._client()
+        if await client.llen(_QUEUE_KEY) >= settings.JOB_QUEUE_MAX_SIZE:
+            raise JobQueueFull("La cola de jobs está llena.")
+        await client.lpush(_QUEUE_KEY, job_id)
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        # RPOP + espera corta (BRPOP chocaría con REDIS_SOCKET_TIMEOUT del pool compartido)
+        raw = await self._client().rpop(_QUEUE_KEY)
+        if raw is None:
+            await asyncio.sleep(timeout)
+            return None
+        return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+    async def size(self) -> int:
+        return int(await self._client().llen(_QUEUE_KEY))
+
+    def reset(self) -> None:
+        pass
+
+
+class JobManager:
+    """Pool acotado de workers async sobre el backend de cola configurado."""
+
+    def __init__(self):
+        self._memory = _MemoryBackend()
+        self._redis = _RedisBackend()
+        self._workers: list[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def backend(self):
+        return self._redis if settings.REDIS_HOST and settings.REDIS_PORT else self._memory
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers) and self._loop is asyncio.get_running_loop()
+
+    async def start(self, workers: Optional[int] = None) -> None:
+        if self.started:
+            return
+        self._memory.reset()
+        self._loop = asyncio.get_running_loop()
+        n = max(1, int(workers or settings.JOB_WORKERS))
+        self._workers = [asyncio.ensure_future(self._worker(i)) for i in range(n)]
+        logging.info(f"Job workers iniciados: {n} ({type(self.backend).__name__})")
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        for w in workers:
+            w.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+        self._loop = None
+
+    async def submit(self, user_input: str, mode_override: Optional[str] = None) -> Dict[str, Any]:
+        if not str(user_input or "").strip():
+            raise ValueError("El input no puede estar vacío.")
+        if not self.started:
+            await self.start()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "mode": "turbo" if crew_service._want_turbo(mode_override) else "heavy",
+            "user_input": user_input,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        backend = self.backend
+        await backend.save(job)
+        try:
+            await backend.enqueue(job["job_id"])
+        except Exception:
+            job.update(status="failed", error="queue_full", finished_at=time.time())
+            await backend.save(job)
+            raise
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.load(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancela un job encolado o en curso; los jobs terminados se devuelven sin cambios."""
+        backend = self.backend
+        job = await backend.load(job_id)
+        if job is None or job["status"] in TERMINAL_STATUSES:
+            return job
+        job.update(status="cancelled", finished_at=time.time())
+        await backend.save(job)
+        # En curso en este proceso: cancelar la corrutina (el worker queda libre de inmediato y
+        # `_process` activa el cancel_event: la crew heavy termina tras el paso de agente en curso).
+        # Si corre en otra instancia, ese worker respeta el estado 'cancelled' al terminar.
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return job
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            try:
+                job_id = await self.backend.dequeue(_POLL_INTERVAL_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Job worker {n}: error leyendo la cola: {e}")
+                await asyncio.sleep(_POLL_INTERVAL_SECONDS)
+                continue
+            if job_id is not None:
+                await self._process(job_id)
+
+    async def _process(self, job_id: str) -> None:
+        backend = self.backend
+        job = await backend.load(job_id)
+        if job is None or job["status"] != "queued":
+            return  # cancelado mientras esperaba o expirado
+        job.update(status="running", started_at=time.time())
+        await backend.save(job)
+        # Cancelar la corrutina no detiene el thread de CrewAI: la crew revisa este flag entre pasos
+        cancel_event = threading.Event()
+        # La tarea copia el contexto al crearse: el job lee el sello de ingesta una sola vez
+        with ingest_stamp_scope():
+            task = asyncio.ensure_future(
+                crew_service.run_analysis_crew(job["user_input"], mode_override=job["mode"], cancel_event=cancel_event)
+            )
+        self._running[job_id] = task
+        try:
+            await asyncio.wait({task}, timeout=settings.JOB_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            # Apagado del proceso: devolver el job a la cola para otra instancia/arranque
+            task.cancel()
+            job.update(status="queued", started_at=None)
+            try:
+                await backend.save(job)
+                await backend.enqueue(job_id)
+            except Exception:
+                pass
+            raise
+        finally:
+            self._running.pop(job_id, None)
+            if not task.done() or task.cancelled():
+                cancel_event.set()
+
+        if not task.done():
+            task.cancel()
+            job.update(status="failed", error="timeout")
+        elif task.cancelled():
+            job.update(status="cancelled")
+        elif task.exception() is not None:
+            logging.error(f"Job {job_id} falló: {task.exception()}")
+            job.update(status="failed", error=str(task.exception()) or type(task.exception()).__name__)
+        else:
+            job.update(status="succeeded", result=task.result())
+        job["finished_at"] = time.time()
+        current = await backend.load(job_id)
+        if current is not None and current["status"] == "cancelled":
+            return  # cancelado (p.ej. desde otra instancia): no sobrescribir
+        await backend.save(job)
+
+
+_manager = JobManager()
+
+
+async def start_workers(workers: Optional[int] = None) -> None:
+    await _manager.start(workers)
+
+
+async def stop_workers() -> None:
+    await _manager.stop()
+
+
+async def submit_job(user_input: str, mode_override: Optional[str] = None) -> Dict[str, Any]:
+    return await _manager.submit(user_input, mode_override)
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return await _manager.get(job_id)
+
+
+async def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return await _manager.cancel(job_id)
+
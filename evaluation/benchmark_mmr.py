@@ -0,0 +1,72 @@
+"""
+Micro-benchmark: MMR vectorizado (src.rag_system.mmr) vs. el loop Python previo.
+
+Uso: poetry run python evaluation/benchmark_mmr.py
+"""
+
+import json
+import math
+import random
+import time
+
+from src.rag_system.mmr import mmr_select
+
+DIM = 1536
+CASES = [(20, 5), (50, 5), (100, 10)]  # (fetch_k, top_n)
+REPEATS = 20
+
+
+def legacy_mmr(q, D, top_n=5, lambda_mult=0.5):
+    # Copia del algoritmo anterior (cosine en Python recalculado en cada iteración)
+    def cosine(a, b):
+        dot = sum(x*y for x, y in zip(a, b))
+        na = math.sqrt(sum(x*x for x in a))
+        nb = math.sqrt(sum(y*y for y in b))
+        return dot / (na * nb + 1e-10)
+
+    sims_q = [cosine(q, d) for d in D]
+    selected_idx = [max(range(len(D)), key=lambda i: sims_q[i])]
+    while len(selected_idx) < min(top_n, len(D)):
+        best_i = None; best_score = -1e9
+        for i in range(len(D)):
+            if i in selected_idx:
+                continue
+            max_sim_to_S = max(cosine(D[i], D[j]) for j in selected_idx)
+            score = lambda_mult * sims_q[i] - (1 - lambda_mult) * max_sim_to_S
+            if score > best_score:
+                best_score = score; best_i = i
+        if best_i is None:
+            break
+        selected_idx.append(best_i)
+    return selected_idx
+
+
+def _timeit(fn, *args, **kwargs) -> float:
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(*args, **kwargs)
+    return (time.perf_counter() - t0) * 1000.0 / REPEATS
+
+
+def main():
+    rnd = random.Random(42)
+    summary = {}
+    for n, k in CASES:
+        q = [rnd.gauss(0, 1) for _ in range(DIM)]
+        D = [[rnd.gauss(0, 1) for _ in range(DIM)] for _ in range(n)]
+        same = legacy_mmr(q, D, top_n=k) == mmr_select(q, D, top_n=k)[0]
+        legacy_ms = _timeit(legacy_mmr, q, D, top_n=k)
+        vector_ms = _timeit(mmr_select, q, D, top_n=k)
+        summary[f"n={n},k={k}"] = {
+            "legacy_ms": round(legacy_ms, 3),
+            "vectorized_ms": round(vector_ms, 3),
+            "speedup": round(legacy_ms / max(vector_ms, 1e-9), 1),
+            "same_selection": same,
+        }
+        print(f"n={n:>3} k={k:>2}: legacy {legacy_ms:8.2f} ms | vectorized {vector_ms:6.3f} ms")
+    print("\nSummary:")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
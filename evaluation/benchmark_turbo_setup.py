@@ -0,0 +1,77 @@
+"""
+Micro-benchmark: costo de setup por request del pipeline turbo.
+
+Compara reconstruir prompt, ChatOpenAI, parser y las tres cadenas LCEL en cada
+request (comportamiento previo) contra reutilizar el pipeline compilado
+(`get_turbo_pipeline`). No realiza llamadas de red: solo mide la construcción.
+
+Uso: poetry run python evaluation/benchmark_turbo_setup.py
+"""
+
+import json
+import time
+
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from langchain_openai import ChatOpenAI
+
+from src.config import settings
+from src.resources import openai_client_kwargs
+from src.turbo_pipeline import _FORMAT_INSTRUCTIONS, _REPAIR_TEMPLATE, _TURBO_TEMPLATE, get_turbo_pipeline
+
+REPEATS = 200
+
+
+def legacy_setup(user_input: str):
+    # Copia de la construcción previa (por request, con closures nuevas)
+    def build_context(question: str) -> str:
+        return ""
+
+    prompt = ChatPromptTemplate.from_template(_TURBO_TEMPLATE)
+    llm = ChatOpenAI(model=settings.OPENAI_MODEL_NAME, temperature=0.1, api_key=settings.OPENAI_API_KEY or "sk-bench", max_tokens=1024, **openai_client_kwargs())
+    json_parser = JsonOutputParser()
+
+    def inputs():
+        return {"context": RunnableLambda(build_context), "user_input": RunnableLambda(lambda x: user_input), "format_instructions": RunnableLambda(lambda _: _FORMAT_INSTRUCTIONS)}
+
+    chain_json = inputs() | prompt | llm | json_parser
+    chain_text = inputs() | prompt | llm | StrOutputParser()
+    repair_chain = inputs() | ChatPromptTemplate.from_template(_REPAIR_TEMPLATE) | llm | json_parser
+    return chain_json, chain_text, repair_chain
+
+
+def compiled_setup(user_input: str):
+    pipeline = get_turbo_pipeline()
+    return pipeline, {"question": user_input.lower(), "user_input": user_input}
+
+
+def _timeit(fn, *args) -> float:
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(*args)
+    return (time.perf_counter() - t0) * 1000.0 / REPEATS
+
+
+def main():
+    if not settings.OPENAI_API_KEY:
+        settings.OPENAI_API_KEY = "sk-bench"
+    question = "Somos una fintech con app móvil; ¿qué detectores priorizar?"
+    t0 = time.perf_counter()
+    get_turbo_pipeline()
+    first_build_ms = (time.perf_counter() - t0) * 1000.0
+    legacy_ms = _timeit(legacy_setup, question)
+    compiled_ms = _timeit(compiled_setup, question)
+    summary = {
+        "legacy_per_request_ms": round(legacy_ms, 3),
+        "compiled_per_request_ms": round(compiled_ms, 4),
+        "compiled_first_build_ms": round(first_build_ms, 3),
+        "speedup": round(legacy_ms / max(compiled_ms, 1e-9), 1),
+    }
+    print(f"legacy {legacy_ms:8.3f} ms/request | compiled {compiled_ms:8.4f} ms/request (first build {first_build_ms:.2f} ms)")
+    print("\nSummary:")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -133,12 +133,9 @@ Controles actuales:
           setLoading(false);
           return;
         }
-        const qs = `?mode=${encodeURIComponent(currentMode)}`;
-        response = await fetch('/api/analyze' + qs, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ user_input: userInput })
-        });
+        // Texto: streaming SSE para mostrar progreso y tokens parciales sin esperar al reporte completo
+        await streamAnalysis(userInput);
+        return;
       }
 
       if (!response.ok) {
@@ -158,9 +155,7 @@ Controles actuales:
           parsedReport.timing_ms = parsedReport._timing_ms;
         }
       } catch {}
-      reportData = parsedReport;
-      jsonOutput.textContent = JSON.stringify(parsedReport, null, 2);
-      downloadButton.disabled = false;
+      showReport(parsedReport);
     } catch (error) {
       console.error('Error during analysis:', error);
       jsonOutput.textContent = `Error al procesar la solicitud:\n\n${error.message}`;
@@ -170,6 +165,75 @@ Controles actuales:
     }
   });
 
+  function showReport(report) {
+    reportData = report;
+    jsonOutput.textContent = JSON.stringify(report, null, 2);
+    downloadButton.disabled = false;
+  }
+
+  // Streaming (SSE sobre fetch): renderiza progreso, tokens parciales y el reporte final
+  async function streamAnalysis(userInput) {
+    loadingOverlay.classList.add('hidden');  // el progreso se ve en el panel de salida
+    const qs = `?mode=${encodeURIComponent(currentMode)}`;
+    const response = await fetch('/api/analyze/stream' + qs, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+      body: JSON.stringify({ user_input: userInput })
+    });
+    if (!response.ok || !response.body) {
+      let msg = `HTTP error! status: ${response.status}`;
+      try { const err = await response.json(); if (err.detail) msg = err.detail; } catch {}
+      throw new Error(msg);
+    }
+    const progress = [];
+    let partial = '';
+    const render = () => {
+      jsonOutput.textContent = progress.join('\n') + (partial ? `\n\n${partial}` : '');
+      jsonOutput.scrollTop = jsonOutput.scrollHeight;
+    };
+    const handlers = {
+      start: (d) => { progress.push(`▶ Análisis iniciado (${d.mode})`); },
+      cache: () => { progress.push('✔ Reporte servido desde caché'); },
+      retrieval: (d) => { progress.push(`✔ Contexto DBIR recuperado (${d.docs} fragmentos, ${d.elapsed_ms} ms)`); },
+      token: (d) => { partial += d.text; },
+      repair: () => { progress.push('↻ Reintentando: la salida no validó contra FinalReport'); partial = ''; },
+      task: (d) => { progress.push(`✔ Tarea completada: ${d.task}`); },
+      report: (d) => {
+        const report = d.report || {};
+        if (typeof d.timing_ms === 'number') report.timing_ms = d.timing_ms;
+        showReport(report);
+        return true;
+      },
+      error: (d) => { throw new Error(d.detail || 'Error en el streaming'); },
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let done = false;
+    while (!done) {
+      const chunk = await reader.read();
+      if (chunk.done) break;
+      buffer += decoder.decode(chunk.value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = 'message';
+        let data = '';
+        block.split('\n').forEach((line) => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        const handler = handlers[event];
+        if (!handler) continue;
+        if (handler(data ? JSON.parse(data) : {})) { done = true; break; }
+        render();
+      }
+    }
+    if (!done) throw new Error('El stream terminó sin reporte final.');
+  }
+
   function setLoading(isLoading) {
     if (isLoading) {
       loadingOverlay.classList.remove('hidden');
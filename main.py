@@ -24,6 +24,13 @@ def main():
     p_analyze.add_argument("input_file", type=str, help="Ruta al archivo de texto a analizar.")
     p_analyze.add_argument("--output", type=str, default=None, help="Ruta para guardar el reporte (opcional).")
 
+    # Subcomando: análisis por lotes (directorio de .txt o .jsonl)
+    p_batch = sub.add_parser("analyze-batch", help="Analiza múltiples inputs (directorio de .txt o archivo .jsonl)")
+    p_batch.add_argument("source", type=str, help="Directorio con archivos .txt o archivo .jsonl.")
+    p_batch.add_argument("--output", type=str, default=None, help="Archivo JSONL de resultados (por defecto stdout).")
+    p_batch.add_argument("--concurrency", type=int, default=None, help="Análisis concurrentes (default BATCH_MAX_CONCURRENCY).")
+    p_batch.add_argument("--mode", type=str, default=None, help="Analyzer mode: heavy|turbo (default ANALYZER_MODE).")
+
     # Subcomando: pregunta directa al RAG
     p_rag = sub.add_parser("rag", help="Pregunta directa al RAG del DBIR")
     p_rag.add_argument("question", type=str, help="Pregunta a realizar al RAG.")
@@ -38,6 +45,40 @@ def main():
         print(result.get("context", "")[:1000])
         return
 
+    if args.cmd == "analyze-batch":
+        from api.services.batch_service import iter_batch, load_batch_inputs
+
+        try:
+            items = load_batch_inputs(args.source)
+        except Exception as e:
+            print(f"Error al leer los inputs: {e}")
+            sys.exit(1)
+
+        async def _run_batch():
+            out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                async for record in iter_batch(items, mode_override=args.mode, concurrency=args.concurrency):
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    if record["type"] == "item":
+                        dup = f" (duplicado de {record['duplicate_of']})" if record["duplicate_of"] else ""
+                        print(f"[{record['status']}] {record['id']}: {record['timing_ms']} ms{dup}", file=sys.stderr)
+                    else:
+                        print(
+                            f"\n{record['items']} items ({record['unique']} únicos) en {record['wall_ms']} ms "
+                            f"| {record['items_per_second']} items/s | p50 {record['item_ms_p50']} ms | p95 {record['item_ms_p95']} ms",
+                            file=sys.stderr,
+                        )
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+
+        print(f"Analizando {len(items)} inputs...", file=sys.stderr)
+        asyncio.run(_run_batch())
+        if args.output:
+            print(f"Resultados guardados en {args.output}", file=sys.stderr)
+        return
+
     # Default: analyze
     if not args.cmd or args.cmd == "analyze":
         try:
@@ -1,10 +1,9 @@
 # MCP: Definición de los 3 agentes requeridos para el challenge
 from crewai import Agent
 from src.tools.dbir_rag_tool import dbir_rag_tool
-from src.tools.mitre_tool import mitre_attack_query_tool, get_mitre_technique_details
+from src.tools.mitre_tool import mitre_attack_query_tool, mitre_batch_enrichment_tool, get_mitre_technique_details
 from src.tools.mcp_external import get_external_tools
 from src.config import settings
-from src.config import settings
 from src.llm_provider import get_llm
 
 llm = get_llm()
@@ -52,10 +51,7 @@ Observation: [tool output here]
 
 
 # 2. Agente Clasificador (RiskClassifierAgent)
-def risk_classifier_agent(llm_override=None, turbo: bool | None = None):
-    if turbo is None:
-        turbo = settings.is_turbo
-    system_template = """
+_RISK_CLASSIFIER_HEADER = """
 You are the Risk Classifier Agent, an expert in MITRE ATT&CK and risk management for the Meli Challenge 2025.
 Your task is to take the findings from the analyzer and enrich them using the MITRE ATT&CK tools, mapping each threat to relevant TTPs (Tactics, Techniques, and Procedures).
 
@@ -63,32 +59,67 @@ CRITICAL INSTRUCTIONS:
 - Use ONLY information from MITRE ATT&CK and the previous findings.
 - When using tools, you MUST follow this EXACT format (case-sensitive!):
 Thought: [your professional reasoning]
-Action: [MITRE ATT&CK Technique Query Tool OR MITRE ATT&CK Technique Details Tool]
-Action Input: {"query": "your query"} OR {"technique_id_or_name": "id or name"}
+"""
+
+_RISK_CLASSIFIER_FOOTER = """
+NEVER make up techniques or relationships. If there is not enough context, state it clearly.
+Your output must be professional, precise, and aligned with risk classification standards.
+
+IMPORTANT: If you use the wrong tool name or format, your answer will be rejected.
+"""
+
+_RISK_CLASSIFIER_LOCAL_TOOLS = """Action: [MITRE ATT&CK Batch Enrichment Tool OR MITRE ATT&CK Technique Query Tool OR MITRE ATT&CK Technique Details Tool]
+Action Input: {"findings": ["finding 1", "finding 2"]} OR {"query": "your query"} OR {"technique_id_or_name": "id or name"}
 Observation: [tool response]
 
 Available tools:
+- MITRE ATT&CK Batch Enrichment Tool: Map ALL findings to techniques in ONE call (preferred first step).
 - MITRE ATT&CK Technique Query Tool: Search for relevant techniques.
 - MITRE ATT&CK Technique Details Tool: Get details for a specific technique.
 
-NEVER make up techniques or relationships. If there is not enough context, state it clearly.
-Your output must be professional, precise, and aligned with risk classification standards.
+Start with a SINGLE call to the MITRE ATT&CK Batch Enrichment Tool passing every finding name; only use the other tools to fill gaps.
+"""
 
-IMPORTANT: If you use the wrong tool name or format, your answer will be rejected.
-EXAMPLE:
-Thought: The analyzer found a risk of credential stuffing. I will map it to MITRE ATT&CK techniques.
-Action: MITRE ATT&CK Technique Query Tool
-Action Input: {"query": "Credential Stuffing"}
+_RISK_CLASSIFIER_LOCAL_EXAMPLE = """EXAMPLE:
+Thought: The analyzer found credential stuffing, phishing and exposed API risks. I will map all of them to MITRE ATT&CK techniques at once.
+Action: MITRE ATT&CK Batch Enrichment Tool
+Action Input: {"findings": ["Credential Stuffing", "Phishing", "Exploit Public-Facing Application"]}
 Observation: [tool output here]
 """
+
+
+def _risk_classifier_template(tools: list) -> str:
+    """Prompt del clasificador según sus herramientas: locales (con batch) o las del MCP externo."""
+    if mitre_batch_enrichment_tool in tools:
+        return _RISK_CLASSIFIER_HEADER + _RISK_CLASSIFIER_LOCAL_TOOLS + _RISK_CLASSIFIER_FOOTER + _RISK_CLASSIFIER_LOCAL_EXAMPLE
+    names, lines = [], []
+    for t in tools:
+        name = str(getattr(t, "name", t))
+        desc = (str(getattr(t, "description", "") or "").strip().splitlines() or [""])[0]
+        names.append(name)
+        lines.append(f"- {name}: {desc}" if desc else f"- {name}")
+    mcp_tools = (
+        f"Action: [{' OR '.join(names) or 'the tool name'}]\n"
+        "Action Input: {the tool arguments as JSON}\n"
+        "Observation: [tool response]\n\n"
+        "Available tools:\n" + "\n".join(lines) + "\n"
+    )
+    return _RISK_CLASSIFIER_HEADER + mcp_tools + _RISK_CLASSIFIER_FOOTER
+
+
+def risk_classifier_agent(llm_override=None, turbo: bool | None = None):
+    if turbo is None:
+        turbo = settings.is_turbo
     # Herramientas para clasificación de riesgo (MITRE)
     if turbo:
         # Turbo: solo MCP externo (evitar overhead); si MCP no responde, sin fallback (mantener definición original de turbo)
         tools = list(get_external_tools())
     else:
-        # Heavy: preferir MCP externo; fallback explícito a attackcti local si no hay herramientas MCP
+        # Heavy: preferir MCP externo; sin herramientas MCP, fallback a las locales (índice STIX o
+        # attackcti) con enriquecimiento por lotes: una sola observación para todos los hallazgos
         ext = list(get_external_tools())
-        tools = ext if ext else [mitre_attack_query_tool, get_mitre_technique_details]
+        tools = ext if ext else [mitre_batch_enrichment_tool, mitre_attack_query_tool, get_mitre_technique_details]
+    system_template = _risk_classifier_template(tools)
     return Agent(
         role="Risk Classifier Agent",
         goal="Enrich the analyzer's findings using the MITRE ATT&CK tool and the external MCP to map risks to TTPs.",
@@ -1,41 +1,254 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import threading
 import time
-from typing import Optional
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterable, Mapping, Optional
 
 try:
     import redis  # type: ignore
+    import redis.asyncio as aredis  # type: ignore
 except Exception:  # pragma: no cover
     redis = None  # type: ignore
+    aredis = None  # type: ignore
 
-_memory_cache: dict[str, tuple[float, str]] = {}
+from src.config import settings
 
+# Un pool de conexiones por (host, port, db), compartido por caché y docstore
+_redis_pools: dict[tuple[str, int, int], "redis.ConnectionPool"] = {}
+_pools_lock = threading.Lock()
 
-def _get_redis_client(host: Optional[str], port: Optional[int], db: int):
-    if host and port and redis is not None:
+
+def get_redis_pool(host: Optional[str], port: Optional[int], db: int = 0):
+    """
+    Retorna el pool de conexiones Redis del proceso para (host, port, db), creándolo una sola vez.
+    Es un BlockingConnectionPool acotado: bajo ráfagas espera una conexión libre en vez de abrir nuevas.
+    """
+    if not (host and port and redis is not None):
+        return None
+    key = (str(host), int(port), int(db))
+    pool = _redis_pools.get(key)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _redis_pools.get(key)
+        if pool is None:
+            pool = redis.BlockingConnectionPool(
+                host=key[0],
+                port=key[1],
+                db=key[2],
+                max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_keepalive=True,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                retry_on_timeout=True,
+            )
+            _redis_pools[key] = pool
+    return pool
+
+
+def get_redis_client(host: Optional[str], port: Optional[int], db: int = 0):
+    """Cliente Redis liviano sobre el pool compartido (None si Redis no está configurado)."""
+    pool = get_redis_pool(host, port, db)
+    if pool is None:
+        return None
+    try:
+        return redis.StrictRedis(connection_pool=pool)
+    except Exception:
+        return None
+
+
+def close_redis_pools() -> None:
+    """Desconecta y descarta todos los pools (p.ej. en el shutdown de la API)."""
+    with _pools_lock:
+        pools = list(_redis_pools.values())
+        _redis_pools.clear()
+    for pool in pools:
         try:
-            return redis.StrictRedis(host=host, port=int(port), db=int(db), socket_timeout=1)
+            pool.disconnect()
         except Exception:
-            return None
-    return None
+            pass
+
+
+# Alias histórico
+_get_redis_client = get_redis_client
+
+
+# Pools asyncio: las conexiones quedan ligadas al event loop, por eso se guardan por loop.
+# Con claves débiles, los pools de un loop cerrado y descartado se liberan junto con él.
+_async_redis_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, int, int], aredis.ConnectionPool]]" = weakref.WeakKeyDictionary()
+_async_pools_lock = threading.Lock()
+
+
+def get_async_redis_client(host: Optional[str], port: Optional[int], db: int = 0):
+    """Cliente `redis.asyncio` sobre el pool del event loop actual para (host, port, db)."""
+    if not (host and port and aredis is not None):
+        return None
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    key = (str(host), int(port), int(db))
+    with _async_pools_lock:
+        pools = _async_redis_pools.setdefault(loop, {})
+        pool = pools.get(key)
+        if pool is None:
+            pool = aredis.BlockingConnectionPool(
+                host=key[0],
+                port=key[1],
+                db=key[2],
+                max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_keepalive=True,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                retry_on_timeout=True,
+            )
+            pools[key] = pool
+    return aredis.StrictRedis(connection_pool=pool)
+
+
+async def aclose_redis_pools() -> None:
+    """Desconecta los pools asyncio del loop actual y los pools síncronos."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _async_pools_lock:
+        pools = _async_redis_pools.pop(loop, {}) if loop is not None else {}
+    for pool in pools.values():
+        try:
+            await pool.disconnect()
+        except Exception:
+            pass
+    close_redis_pools()
+
+
+class MemoryLRUCache:
+    """
+    Tier en proceso acotado por cantidad de entradas y bytes, con TTL aplicado en lectura
+    y expulsión LRU. Thread-safe (los pipelines corren en threads del executor).
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self._data: "OrderedDict[str, tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _size(key: str, value: str) -> int:
+        return len(key.encode("utf-8")) + len(value.encode("utf-8"))
+
+    def _pop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value, _ = item
+            if expires <= time.time():
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        size = self._size(key, value)
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                return
+            self._data[key] = (time.time() + ttl_seconds, value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, old_size) = self._data.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_memory_cache = MemoryLRUCache(
+    max_entries=settings.CACHE_MEMORY_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MEMORY_MAX_BYTES,
+)
+
+
+def _l1_enabled(client) -> bool:
+    # Sin Redis la memoria es el único tier; con Redis actúa como L1 solo si se habilita
+    return client is None or settings.CACHE_L1_ENABLED
+
+
+def _l1_ttl(ttl_seconds: float) -> float:
+    return min(ttl_seconds, settings.CACHE_L1_TTL_SECONDS)
 
 
 def cache_get(key: str, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> Optional[str]:
     client = _get_redis_client(host, port, db)
+    if _l1_enabled(client):
+        val = _memory_cache.get(key)
+        if val is not None or client is None:
+            return val
     if client is not None:
         try:
             v = client.get(key)
             if v is not None:
-                return v.decode("utf-8", errors="ignore")
+                val = v.decode("utf-8", errors="ignore")
+                if settings.CACHE_L1_ENABLED:
+                    _memory_cache.set(key, val, settings.CACHE_L1_TTL_SECONDS)
+                return val
         except Exception:
             pass
-    # memory fallback
-    item = _memory_cache.get(key)
-    if item is None:
-        return None
-    _, val = item
-    return val
+        if not settings.CACHE_L1_ENABLED:
+            # memory fallback (valores escritos mientras Redis no estaba disponible)
+            return _memory_cache.get(key)
+    return None
 
 
 def cache_set(key: str, value: str, ttl_seconds: int = 86400, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> None:
@@ -43,9 +256,266 @@ def cache_set(key: str, value: str, ttl_seconds: int = 86400, host: Optional[str
     if client is not None:
         try:
             client.setex(key, ttl_seconds, value.encode("utf-8"))
+            if settings.CACHE_L1_ENABLED:
+                _memory_cache.set(key, value, _l1_ttl(ttl_seconds))
+            return
+        except Exception:
+            pass
+    # memory fallback (acotado, con TTL)
+    _memory_cache.set(key, value, ttl_seconds)
+
+
+def cache_delete(key: str, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> None:
+    _memory_cache.delete(key)
+    client = _get_redis_client(host, port, db)
+    if client is not None:
+        try:
+            client.delete(key)
+        except Exception:
+            pass
+
+
+async def acache_get(key: str, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> Optional[str]:
+    """Versión asíncrona de `cache_get` (redis.asyncio); misma semántica de tiers."""
+    client = get_async_redis_client(host, port, db)
+    if _l1_enabled(client):
+        val = _memory_cache.get(key)
+        if val is not None or client is None:
+            return val
+    if client is not None:
+        try:
+            v = await client.get(key)
+            if v is not None:
+                val = v.decode("utf-8", errors="ignore")
+                if settings.CACHE_L1_ENABLED:
+                    _memory_cache.set(key, val, settings.CACHE_L1_TTL_SECONDS)
+                return val
+        except Exception:
+            pass
+        if not settings.CACHE_L1_ENABLED:
+            return _memory_cache.get(key)
+    return None
+
+
+async def acache_set(key: str, value: str, ttl_seconds: int = 86400, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> None:
+    """Versión asíncrona de `cache_set` (redis.asyncio)."""
+    client = get_async_redis_client(host, port, db)
+    if client is not None:
+        try:
+            await client.setex(key, ttl_seconds, value.encode("utf-8"))
+            if settings.CACHE_L1_ENABLED:
+                _memory_cache.set(key, value, _l1_ttl(ttl_seconds))
+            return
+        except Exception:
+            pass
+    _memory_cache.set(key, value, ttl_seconds)
+
+
+async def acache_get_many(keys: Iterable[str], host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> list[Optional[str]]:
+    """Versión asíncrona de `cache_get_many` (un único MGET)."""
+    keys = list(keys)
+    if not keys:
+        return []
+    out: list[Optional[str]] = [None] * len(keys)
+    client = get_async_redis_client(host, port, db)
+    checked_memory = _l1_enabled(client)
+    if checked_memory:
+        out = [_memory_cache.get(k) for k in keys]
+    pending = [i for i, v in enumerate(out) if v is None]
+    if client is not None and pending:
+        try:
+            for i, v in zip(pending, await client.mget([keys[i] for i in pending])):
+                if v is not None:
+                    out[i] = v.decode("utf-8", errors="ignore")
+                    if settings.CACHE_L1_ENABLED:
+                        _memory_cache.set(keys[i], out[i], settings.CACHE_L1_TTL_SECONDS)
+        except Exception:
+            pass
+    if not checked_memory:
+        for i, k in enumerate(keys):
+            if out[i] is None:
+                out[i] = _memory_cache.get(k)
+    return out
+
+
+async def acache_set_many(items: Mapping[str, str], ttl_seconds: int = 86400, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> None:
+    """Versión asíncrona de `cache_set_many` (pipeline)."""
+    if not items:
+        return
+    client = get_async_redis_client(host, port, db)
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for k, v in items.items():
+                pipe.setex(k, ttl_seconds, v.encode("utf-8"))
+            await pipe.execute()
+            if settings.CACHE_L1_ENABLED:
+                for k, v in items.items():
+                    _memory_cache.set(k, v, _l1_ttl(ttl_seconds))
+            return
+        except Exception:
+            pass
+    for k, v in items.items():
+        _memory_cache.set(k, v, ttl_seconds)
+
+
+def cache_get_many(keys: Iterable[str], host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> list[Optional[str]]:
+    """Lectura batch: L1 en memoria primero, luego un único MGET contra Redis por los faltantes."""
+    keys = list(keys)
+    if not keys:
+        return []
+    out: list[Optional[str]] = [None] * len(keys)
+    client = get_redis_client(host, port, db)
+    checked_memory = _l1_enabled(client)
+    if checked_memory:
+        out = [_memory_cache.get(k) for k in keys]
+    pending = [i for i, v in enumerate(out) if v is None]
+    if client is not None and pending:
+        try:
+            for i, v in zip(pending, client.mget([keys[i] for i in pending])):
+                if v is not None:
+                    out[i] = v.decode("utf-8", errors="ignore")
+                    if settings.CACHE_L1_ENABLED:
+                        _memory_cache.set(keys[i], out[i], settings.CACHE_L1_TTL_SECONDS)
+        except Exception:
+            pass
+    if not checked_memory:
+        for i, k in enumerate(keys):
+            if out[i] is None:
+                out[i] = _memory_cache.get(k)
+    return out
+
+
+def cache_set_many(items: Mapping[str, str], ttl_seconds: int = 86400, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> None:
+    """Escritura batch con pipeline (un round trip); fallback a memoria si Redis falla."""
+    if not items:
+        return
+    client = get_redis_client(host, port, db)
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for k, v in items.items():
+                pipe.setex(k, ttl_seconds, v.encode("utf-8"))
+            pipe.execute()
+            if settings.CACHE_L1_ENABLED:
+                for k, v in items.items():
+                    _memory_cache.set(k, v, _l1_ttl(ttl_seconds))
             return
         except Exception:
             pass
-    # memory fallback with naive TTL tracking
-    _memory_cache[key] = (time.time() + ttl_seconds, value)
+    for k, v in items.items():
+        _memory_cache.set(k, v, ttl_seconds)
+
+
+def memory_cache_stats() -> dict:
+    """Métricas del tier en memoria (L1 o fallback)."""
+    stats = _memory_cache.stats()
+    stats["mode"] = "l1" if settings.CACHE_L1_ENABLED else "fallback"
+    return stats
+
+
+# --- Sello de ingesta (invalida cachés derivadas cuando cambia la colección) ---
+INGEST_STAMP_TTL_SECONDS = 365 * 86400
+
+
+def _ingest_stamp_key(collection_name: str) -> str:
+    return f"ingest:stamp:{collection_name}"
+
 
+def ingest_stamp_path(collection_name: str) -> Path:
+    """Archivo del sello junto al manifest de ingesta: visible para todos los procesos sin Redis."""
+    return Path(settings.CHROMA_DB_PATH) / f"{collection_name}.ingest_stamp"
+
+
+def _read_stamp_file(collection_name: str) -> str:
+    try:
+        return ingest_stamp_path(collection_name).read_text(encoding="utf-8").strip()
+    except OSError:
+        return ""
+
+
+def _write_stamp_file(collection_name: str, stamp: str) -> None:
+    path = ingest_stamp_path(collection_name)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Escritura atómica: un worker nunca lee un sello a medias
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(stamp, encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+# Memo por request: varios caminos (caché de reportes, single-flight, crew) consultan el sello
+_INGEST_STAMP_MEMO: ContextVar[Optional[dict]] = ContextVar("ingest_stamp_memo", default=None)
+
+
+@contextmanager
+def ingest_stamp_scope():
+    """Memoiza el sello de ingesta dentro del bloque (un request o job): un único GET a Redis."""
+    token = _INGEST_STAMP_MEMO.set({})
+    try:
+        yield
+    finally:
+        _INGEST_STAMP_MEMO.reset(token)
+
+
+def _memo_stamp(key: str, stamp: str) -> str:
+    memo = _INGEST_STAMP_MEMO.get()
+    if memo is not None:
+        memo[key] = stamp
+    return stamp
+
+
+def get_ingest_stamp(collection_name: str, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> str:
+    """
+    Retorna el sello de la última ingesta de la colección ("" si nunca se registró).
+    Se lee directo de Redis, sin pasar por el L1: un sello viejo en memoria haría que este
+    worker siga sirviendo reportes de la ingesta anterior.
+    """
+    key = _ingest_stamp_key(collection_name)
+    memo = _INGEST_STAMP_MEMO.get()
+    if memo is not None and key in memo:
+        return memo[key]
+    client = _get_redis_client(host, port, db)
+    if client is not None:
+        try:
+            v = client.get(key)
+            return _memo_stamp(key, v.decode("utf-8", errors="ignore") if v else "")
+        except Exception:
+            pass
+    # Sin Redis (o caído): archivo compartido entre procesos (API, workers, job de ingesta)
+    return _memo_stamp(key, _read_stamp_file(collection_name))
+
+
+async def aget_ingest_stamp(collection_name: str, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> str:
+    """Versión asíncrona de `get_ingest_stamp`."""
+    key = _ingest_stamp_key(collection_name)
+    memo = _INGEST_STAMP_MEMO.get()
+    if memo is not None and key in memo:
+        return memo[key]
+    client = get_async_redis_client(host, port, db)
+    if client is not None:
+        try:
+            v = await client.get(key)
+            return _memo_stamp(key, v.decode("utf-8", errors="ignore") if v else "")
+        except Exception:
+            pass
+    return _memo_stamp(key, _read_stamp_file(collection_name))
+
+
+def bump_ingest_stamp(collection_name: str, host: Optional[str] = None, port: Optional[int] = None, db: int = 0) -> str:
+    """
+    Registra una nueva ingesta de la colección; las claves que incluyen el sello quedan obsoletas.
+    Se escribe en Redis (si está configurado) y siempre en el archivo de sello, que es lo que leen
+    los procesos sin Redis o con Redis caído.
+    """
+    stamp = f"{time.time():.6f}"
+    _write_stamp_file(collection_name, stamp)
+    client = _get_redis_client(host, port, db)
+    if client is not None:
+        try:
+            client.setex(_ingest_stamp_key(collection_name), INGEST_STAMP_TTL_SECONDS, stamp.encode("utf-8"))
+        except Exception:
+            pass
+    return stamp
@@ -15,6 +15,13 @@ class Settings(BaseSettings):
     MCP_EXTERNAL_HOST: str = "mitre-mcp"
     MCP_EXTERNAL_PORT: int = 8080
     MCP_EXTERNAL_PROTOCOL: str = "http"
+    # Enriquecimiento MITRE por lotes: threads para las búsquedas y máximo de hallazgos por llamada
+    MITRE_ENRICH_MAX_WORKERS: int = 8
+    MITRE_BATCH_MAX_FINDINGS: int = 5
+    # Fuente de técnicas MITRE: "auto" (índice local si hay bundles STIX, si no attackcti/TAXII),
+    # "local" o "taxii". MITRE_STIX_PATH: archivo o directorio con {enterprise,mobile,ics}-attack.json
+    MITRE_ATTACK_SOURCE: str = "auto"
+    MITRE_STIX_PATH: str | None = "data/mitre"
     # Configuración de ChromaDB remoto (por defecto usa el servicio docker 'chromadb')
     CHROMA_DB_HOST: str | None = "chromadb"
     CHROMA_DB_PORT: int | None = 8000
@@ -31,6 +38,29 @@ class Settings(BaseSettings):
     # Configuración de OpenAI
     OPENAI_API_KEY: str
     OPENAI_MODEL_NAME: str = "gpt-4.1-mini"
+    OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    # Proveedor de embeddings: "openai" o "local" (sentence-transformers en CPU, sin red).
+    # El modelo queda registrado en la metadata de la colección: cambiarlo exige re-ingestar
+    EMBEDDING_PROVIDER: str = "openai"
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    LOCAL_EMBEDDING_DEVICE: str = "cpu"
+    LOCAL_EMBEDDING_BATCH_SIZE: int = 64
+    LOCAL_EMBEDDING_NORMALIZE: bool = True
+    # Caché de embeddings (LRU en proceso; Redis como respaldo si está configurado y, si no,
+    # un sqlite en CHROMA_DB_PATH que persiste entre reinicios)
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 4096
+    EMBEDDING_CACHE_DISK_ENABLED: bool = True
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES: int = 200_000
+    # Batching de embed_documents: tamaño por request, requests en paralelo y reintentos (con
+    # reintentos > 0 el cliente OpenAI va con max_retries=0; los 429 los reintenta el limitador)
+    EMBEDDING_BATCH_SIZE: int = 128
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 3
+
+    # Pool HTTP compartido por los clientes OpenAI (chat + embeddings)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_TIMEOUT_SECONDS: float = 60.0
 
     # Configuración de Cohere (opcional para re-ranking)
     COHERE_API_KEY: str | None = None
@@ -42,11 +72,87 @@ class Settings(BaseSettings):
     # Configuración del sistema RAG
     CHROMA_DB_PATH: str = "vector_db"
     COLLECTION_NAME: str = "dbir_2025"
+    # Directorio de PDFs a ingestar (ingesta incremental; manifest en CHROMA_DB_PATH)
+    INGEST_INPUT_DIR: str = "data/input"
+    # Pipeline de ingesta: procesos de parseo (1 = secuencial; requiere pypdf para partir el PDF),
+    # páginas por tarea, hijos por upsert en bulk y upserts concurrentes (embeddings en paralelo)
+    INGEST_PARSE_WORKERS: int = 4
+    INGEST_PAGES_PER_TASK: int = 8
+    INGEST_UPSERT_BATCH: int = 256
+    INGEST_UPSERT_WORKERS: int = 2
+    # MMR local (heavy sin Cohere): diversidad vs relevancia, docs finales y candidatos
+    MMR_LAMBDA: float = 0.5
+    MMR_TOP_N: int = 5
+    MMR_FETCH_K: int = 20
+    # Reranker local (cross-encoder) para heavy sin Cohere; reemplaza a MMR si está habilitado.
+    # RERANKER_BACKEND: "torch" (sentence-transformers; RERANKER_QUANTIZE = int8 dinámico) u "onnx"
+    # (onnxruntime; RERANKER_MODEL = directorio exportado con el tokenizer y RERANKER_ONNX_FILE)
+    RERANKER_ENABLED: bool = False
+    RERANKER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANKER_BACKEND: str = "torch"
+    RERANKER_ONNX_FILE: str = "model.onnx"
+    RERANKER_QUANTIZE: bool = False
+    RERANKER_BATCH_SIZE: int = 32
+    RERANKER_MAX_LENGTH: int = 512
+    RERANKER_NUM_THREADS: int = 0
+    # Recuperación: "dense" (solo Chroma) o "hybrid" (BM25 construido en la ingesta + denso, fusión RRF).
+    # En hybrid heavy omite MultiQuery salvo HYBRID_MULTIQUERY; *_K = 0 usa el k del modo (10 turbo / 20 heavy)
+    RETRIEVAL_MODE: str = "dense"
+    HYBRID_RRF_K: int = 60
+    HYBRID_DENSE_K: int = 0
+    HYBRID_SPARSE_K: int = 0
+    HYBRID_MULTIQUERY: bool = False
+    # Heavy: si la similitud coseno entre la pregunta y el top1 (vectores almacenados) supera este
+    # umbral, se aplica MMR sobre esos candidatos y se omiten MultiQuery y rerank
+    HEAVY_EARLY_EXIT_THRESHOLD: float = 0.55
 
     # Redis Docstore (opcional)
     REDIS_HOST: str | None = None
     REDIS_PORT: int | None = None
     REDIS_DB: int = 0
+    # Pool de conexiones Redis compartido (caché + docstore)
+    REDIS_POOL_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 2.0
+    REDIS_SOCKET_TIMEOUT: float = 1.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    # Tier de caché en memoria: fallback sin Redis, o L1 delante de Redis si CACHE_L1_ENABLED
+    CACHE_MEMORY_MAX_ENTRIES: int = 1024
+    CACHE_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_L1_ENABLED: bool = False
+    CACHE_L1_TTL_SECONDS: int = 300
+
+    # Limitador de llamadas a OpenAI (chat + embeddings) por modelo; overrides en LLM_MODEL_LIMITS,
+    # p.ej. {"gpt-4.1-nano": {"max_concurrency": 4, "rpm": 500}}. rpm 0 = sin límite de tasa.
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_MODEL_LIMITS: dict[str, dict[str, int]] = {}
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    LLM_429_MAX_RETRIES: int = 3
+    LLM_429_BACKOFF_SECONDS: float = 1.0
+    # Load-shedding: la API responde 503 si hay al menos este número de llamadas en cola (0 = nunca)
+    LLM_SHED_QUEUE_THRESHOLD: int = 64
+
+    # Single-flight: requests idénticos concurrentes esperan un único cómputo (en proceso + lock Redis)
+    SINGLEFLIGHT_ENABLED: bool = True
+    SINGLEFLIGHT_LOCK_TTL_SECONDS: float = 300.0
+    SINGLEFLIGHT_RESULT_TTL_SECONDS: int = 60
+    SINGLEFLIGHT_POLL_INTERVAL: float = 0.25
+
+    # Caché de reportes turbo (read-through, versionado por CACHE_VERSION + ingesta)
+    REPORT_CACHE_ENABLED: bool = True
+    REPORT_CACHE_TTL_SECONDS: int = 86400
+
+    # Cola de jobs (POST /api/jobs): workers concurrentes, tope de la cola y retención de resultados
+    JOB_WORKERS: int = 2
+    JOB_QUEUE_MAX_SIZE: int = 1000
+    JOB_RESULT_TTL_SECONDS: int = 86400
+    JOB_TIMEOUT_SECONDS: float = 900.0
+
+    # Análisis por lotes (/api/analyze/batch, main.py analyze-batch)
+    BATCH_MAX_CONCURRENCY: int = 4
+    BATCH_MAX_ITEMS: int = 500
+    # Similitud coseno mínima entre inputs para compartir la recuperación (turbo)
+    BATCH_RETRIEVAL_SHARE_THRESHOLD: float = 0.95
 
     # Cargar desde el archivo .env en la raíz del proyecto
     model_config = SettingsConfigDict(
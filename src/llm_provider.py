@@ -1,14 +1,49 @@
 """
-Proveedor de LLM para la aplicación.
+Proveedor de LLM y de embeddings para la aplicación.
 
-Este módulo gestiona la inicialización del modelo de lenguaje (LLM)
+Este módulo gestiona la inicialización del modelo de lenguaje (LLM) y del backend de
+embeddings (OpenAI o sentence-transformers local, según EMBEDDING_PROVIDER)
 utilizando la configuración definida en `src/config.py`.
 """
 
+import asyncio
 import logging
-from langchain_openai import ChatOpenAI
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_ollama.llms import OllamaLLM
+from pydantic import SecretStr
 from src.config import settings
+from src.resources import get_async_http_client, get_http_client, openai_client_kwargs, register_shutdown_hook
+
+
+def _route_litellm_through_pool() -> None:
+    """
+    CrewAI convierte el ChatOpenAI de los agentes en su propio LLM (litellm) y descarta el
+    http_client; litellm usa `client_session` / `aclient_session` para sus clientes OpenAI,
+    así que se apuntan al pool compartido y las llamadas pasan por el limitador (429, métricas).
+    """
+    try:
+        import litellm  # type: ignore
+    except Exception:
+        return
+    litellm.client_session = get_http_client()
+    litellm.aclient_session = get_async_http_client()
+
+
+def _reset_litellm_sessions() -> None:
+    # Al cerrar los recursos, no dejar a litellm con clientes HTTP cerrados
+    try:
+        import litellm  # type: ignore
+    except Exception:
+        return
+    litellm.client_session = None
+    litellm.aclient_session = None
+
+
+register_shutdown_hook(_reset_litellm_sessions)
 
 
 def get_llm():
@@ -27,10 +62,12 @@ def get_llm():
         # Permitir que el modelo sea exactamente el que se pasa en settings (ej: gpt-4.1-nano)
         model_name = getattr(settings, "OPENAI_MODEL_NAME", "gpt-4.1-nano")
         logging.info(f"Inicializando LLM OpenAI con el modelo '{model_name}'")
+        _route_litellm_through_pool()
         return ChatOpenAI(
             api_key=settings.OPENAI_API_KEY,
             model=model_name,
             temperature=settings.TEMPERATURE,
+            **openai_client_kwargs(),
         )
     elif provider in ("ollama", "local"):
         if not settings.OLLAMA_BASE_URL or not settings.OLLAMA_MODEL:
@@ -49,3 +86,128 @@ def get_llm():
         raise ValueError(
             f"Proveedor de LLM no soportado: {provider}. Usa 'openai' o 'ollama'."
         )
+
+
+# --- Embeddings ---
+
+# Dimensiones conocidas de los modelos OpenAI (guard de colección sin llamar a la API)
+_OPENAI_EMBEDDING_DIMS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+
+_ST_MODELS: Dict[tuple, Any] = {}
+_ST_LOCK = threading.Lock()
+register_shutdown_hook(_ST_MODELS.clear)
+
+
+def embedding_provider() -> str:
+    """'openai' (por defecto) o 'local' (sentence-transformers en CPU)."""
+    provider = (settings.EMBEDDING_PROVIDER or "openai").lower().strip()
+    return "local" if provider in ("local", "sentence-transformers", "huggingface") else provider
+
+
+def default_embedding_model() -> str:
+    return settings.LOCAL_EMBEDDING_MODEL if embedding_provider() == "local" else settings.OPENAI_EMBEDDING_MODEL
+
+
+def embedding_model_id(model: Optional[str] = None) -> str:
+    """Identificador estable del modelo (clave de caché y metadata de la colección Chroma)."""
+    model = model or default_embedding_model()
+    return f"local:{model}" if embedding_provider() == "local" else model
+
+
+def _load_sentence_transformer(model_name: str, device: str):
+    key = (model_name, device)
+    model = _ST_MODELS.get(key)
+    if model is not None:
+        return model
+    with _ST_LOCK:
+        model = _ST_MODELS.get(key)
+        if model is None:
+            from sentence_transformers import SentenceTransformer  # type: ignore
+
+            logging.info(f"Cargando modelo de embeddings local '{model_name}' en {device}")
+            model = SentenceTransformer(model_name, device=device)
+            _ST_MODELS[key] = model
+    return model
+
+
+class LocalEmbeddings(Embeddings):
+    """Embeddings con sentence-transformers en CPU; el modelo se carga una vez por proceso."""
+
+    def __init__(self, model_name: str, device: str = "cpu", batch_size: int = 64, normalize: bool = True):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = max(1, int(batch_size))
+        self.normalize = normalize
+
+    @property
+    def model(self):
+        return _load_sentence_transformer(self.model_name, self.device)
+
+    def dimension(self) -> int:
+        return int(self.model.get_sentence_embedding_dimension())
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Inferencia CPU: fuera del event loop
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+def get_embeddings_backend(model: Optional[str] = None, api_key: Optional[str] = None, max_retries: Optional[int] = None) -> Embeddings:
+    """
+    Backend de embeddings sin caché según EMBEDDING_PROVIDER. Usar `src.rag_system.embeddings.get_embeddings`,
+    que agrega batching y caché encima. `max_retries` (solo OpenAI) reemplaza los reintentos del cliente.
+    """
+    provider = embedding_provider()
+    model = model or default_embedding_model()
+    if provider == "local":
+        return LocalEmbeddings(
+            model,
+            device=settings.LOCAL_EMBEDDING_DEVICE,
+            batch_size=settings.LOCAL_EMBEDDING_BATCH_SIZE,
+            normalize=settings.LOCAL_EMBEDDING_NORMALIZE,
+        )
+    if provider == "openai":
+        api_key = api_key or settings.OPENAI_API_KEY
+        extra = {"max_retries": max_retries} if max_retries is not None else {}
+        return OpenAIEmbeddings(model=model, api_key=SecretStr(str(api_key)), **openai_client_kwargs(), **extra)
+    raise ValueError(f"Proveedor de embeddings no soportado: {provider}. Usa 'openai' o 'local'.")
+
+
+def embedding_dimension(model: Optional[str] = None) -> Optional[int]:
+    """Dimensión del modelo configurado si se conoce sin llamar a una API (None si no)."""
+    model = model or default_embedding_model()
+    if embedding_provider() == "local":
+        try:
+            return LocalEmbeddings(model, device=settings.LOCAL_EMBEDDING_DEVICE).dimension()
+        except Exception as e:
+            logging.warning(f"No se pudo obtener la dimensión del modelo local '{model}': {e}")
+            return None
+    return _OPENAI_EMBEDDING_DIMS.get(model)
+
+
+def warm_embeddings() -> None:
+    """Con provider local, carga el modelo antes del primer request."""
+    if embedding_provider() != "local":
+        return
+    try:
+        get_embeddings_backend().embed_query("warmup")
+    except Exception as e:
+        logging.warning(f"Warmup del modelo de embeddings local falló: {e}")
@@ -17,12 +17,56 @@ from src.agents import reporting_agent, risk_classifier_agent, threat_analyzer_a
 from src.llm_provider import get_llm
 from src.models import EnrichedFindings, FinalReport, ThreatFindings
 from src.trace import set_trace_logger
+from src import singleflight
+from src.turbo_pipeline import _norm_question, _report_cache_key
 
 
 
 llm = get_llm()
 
 
+def _safe_preview(obj):
+    try:
+        if isinstance(obj, BaseModel):
+            return obj.model_dump()  # serializable
+    except Exception:
+        pass
+    try:
+        return str(obj)[:2000]
+    except Exception:
+        return None
+
+
+def _task_callback(on_event, task_name: str):
+    """Callback de CrewAI que notifica `on_event('task', ...)` al completar cada tarea (best-effort)."""
+    if on_event is None:
+        return None
+
+    def _cb(output):
+        try:
+            payload = getattr(output, "pydantic", None) or getattr(output, "raw", None) or output
+            on_event("task", {"task": task_name, "output": _safe_preview(payload)})
+        except Exception:
+            pass
+    return _cb
+
+
+class CrewCancelled(singleflight.LeaderCancelled, TimeoutError):
+    """La ejecución se abandonó (timeout o cancelación del job). Es TimeoutError para que CrewAI
+    no reintente la tarea."""
+
+
+def _cancel_check(cancel_event):
+    """`step_callback` de CrewAI: corta la crew tras el paso en curso si `cancel_event` está activo."""
+    if cancel_event is None:
+        return None
+
+    def _cb(_step):
+        if cancel_event.is_set():
+            raise CrewCancelled("Análisis cancelado.")
+    return _cb
+
+
 # --- Crew principal de 3 agentes MCP ---
 class SecurityAnalysisCrew:
     def __init__(self, agent_trace_logger: logging.Logger, llm_instance=None, turbo: bool | None = None):
@@ -34,13 +78,22 @@ class SecurityAnalysisCrew:
         self.classifier = risk_classifier_agent(llm_override=self.llm, turbo=self.turbo)
         self.reporter = reporting_agent(llm_override=self.llm, turbo=self.turbo)
 
-    def run(self, user_input: str):
+    def run(self, user_input: str, on_event=None, cancel_event=None):
+        """
+        Ejecuta las 3 tareas en secuencia. `on_event(nombre, datos)` (opcional) recibe un
+        evento 'task' al completarse cada tarea, para streaming de progreso.
+        `cancel_event` (threading.Event, opcional) se revisa entre pasos de los agentes: si se
+        activa, la crew termina con `CrewCancelled` (la llamada al LLM o tool en curso no se interrumpe).
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            raise CrewCancelled("Análisis cancelado.")
         # 1. Task: Threat analysis
         analysis_task = Task(
             description=f"Analyze the user's input and find up to 5 relevant threats using DBIR: {user_input}",
             expected_output="List of threats (ThreatFinding) in JSON.",
             agent=self.analyzer,
             output_pydantic=ThreatFindings,
+            callback=_task_callback(on_event, "analysis"),
         )
         # 2. Task: Risk classification
         classification_task = Task(
@@ -49,6 +102,7 @@ class SecurityAnalysisCrew:
             agent=self.classifier,
             context=[analysis_task],
             output_pydantic=EnrichedFindings,
+            callback=_task_callback(on_event, "classification"),
         )
         # 3. Task: Final report generation
         reporting_task = Task(
@@ -57,12 +111,14 @@ class SecurityAnalysisCrew:
             agent=self.reporter,
             context=[classification_task],
             output_pydantic=FinalReport,
+            callback=_task_callback(on_event, "reporting"),
         )
         crew = Crew(
             agents=[self.analyzer, self.classifier, self.reporter],
             tasks=[analysis_task, classification_task, reporting_task],
             process=Process.sequential,
-            verbose=True
+            verbose=True,
+            step_callback=_cancel_check(cancel_event),
         )
         # Establecer trace logger global y ejecutar
         set_trace_logger(self.agent_trace_logger)
@@ -71,17 +127,6 @@ class SecurityAnalysisCrew:
             logger = self.agent_trace_logger or logging.getLogger("agent_trace")
             session_id = logger.name.replace("agent_trace_", "") if logger.name.startswith("agent_trace_") else None
             # Log de inputs/outputs de cada tarea (best-effort) usando JsonFormatter extras
-            def _safe_preview(obj):
-                try:
-                    if isinstance(obj, BaseModel):
-                        return obj.model_dump()  # serializable
-                except Exception:
-                    pass
-                try:
-                    return str(obj)[:2000]
-                except Exception:
-                    return None
-
             logger.info(
                 "task_analysis_completed",
                 extra={
@@ -158,14 +203,25 @@ class SecurityAnalysisCrew:
 
 
 # Wrapper para compatibilidad con tests E2E legacy
-def run_mcp_analysis(user_input: str, agent_trace_logger=None, llm_instance=None, turbo: bool | None = None):
+def run_mcp_analysis(user_input: str, agent_trace_logger=None, llm_instance=None, turbo: bool | None = None, on_event=None, cancel_event=None):
     """
     Ejecuta el análisis MCP de 3 agentes y retorna el reporte final en JSON (string).
-    Permite inyectar un LLM simulado para testing.
+    Permite inyectar un LLM simulado para testing, un callback `on_event` de progreso y un
+    `cancel_event` para abandonar la crew entre pasos (ver `SecurityAnalysisCrew.run`).
+    Requests idénticos concurrentes (misma pregunta normalizada) comparten una única ejecución;
+    si el líder se cancela, un seguidor la retoma.
     """
+    if llm_instance is not None:
+        return _run_mcp_analysis(user_input, agent_trace_logger, llm_instance, turbo, on_event, cancel_event)
+    key = _report_cache_key(_norm_question(user_input), mode="heavy")
+    return singleflight.do(key, lambda: _run_mcp_analysis(user_input, agent_trace_logger, llm_instance, turbo, on_event, cancel_event))
+
+
+def _run_mcp_analysis(user_input: str, agent_trace_logger=None, llm_instance=None, turbo: bool | None = None, on_event=None, cancel_event=None):
     logger = agent_trace_logger or logging.getLogger("mcp_analysis")
     crew = SecurityAnalysisCrew(agent_trace_logger=logger, llm_instance=llm_instance, turbo=bool(turbo))
-    result = crew.run(user_input)
+    kwargs = {k: v for k, v in (("on_event", on_event), ("cancel_event", cancel_event)) if v is not None}
+    result = crew.run(user_input, **kwargs)
     # Normalizar a dict JSON si es posible
     try:
         if hasattr(result, 'model_dump'):
@@ -0,0 +1,193 @@
+"""
+Índice léxico BM25 sobre los mismos chunks hijos que indexa Chroma.
+
+Las preguntas sobre el DBIR están llenas de términos exactos ("ransomware", "T1110",
+"third-party") que la búsqueda densa diluye. El índice se construye al final de la
+ingesta a partir de la colección (ids, textos, metadatos), se persiste junto a la base
+vectorial y se carga una vez por proceso (se recarga si el archivo cambia). Si no existe,
+se construye bajo demanda desde Chroma.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import settings
+
+# Conserva ids y compuestos ("t1110.003", "third-party", "2fa") como un único término
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with what how".split()
+)
+_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    toks = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        if tok in _STOPWORDS:
+            continue
+        toks.append(tok)
+        # Los compuestos también aportan sus partes ("third-party" → third, party)
+        if "-" in tok:
+            toks.extend(p for p in tok.split("-") if p and p not in _STOPWORDS)
+    return toks
+
+
+class BM25Index:
+    """BM25 (Okapi) en memoria con postings NumPy por término."""
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[dict] | None = None,
+                 k1: float = 1.5, b: float = 0.75):
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = [dict(m or {}) for m in (metadatas or [{}] * len(self.ids))]
+        self.k1, self.b = k1, b
+        n = len(self.ids)
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = np.zeros(n, dtype=np.float32)
+        for i, text in enumerate(self.texts):
+            counts = Counter(tokenize(text))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                rows, tfs = postings.setdefault(term, ([], []))
+                rows.append(i)
+                tfs.append(tf)
+        self._doc_len = lengths
+        self._avgdl = float(lengths.mean()) if n else 0.0
+        self._postings = {
+            term: (np.asarray(rows, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for term, (rows, tfs) in postings.items()
+        }
+        self._idf = {
+            term: math.log(1.0 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for term, (rows, _) in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[int, float]]:
+        """Top-k (índice de chunk, score) con score > 0, de mayor a menor."""
+        if not self.ids or k <= 0:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * self._doc_len / (self._avgdl or 1.0))
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows, tfs = posting
+            scores[rows] += self._idf[term] * tfs * (self.k1 + 1.0) / (tfs + norm[rows])
+        hits = np.flatnonzero(scores > 0)
+        if hits.size == 0:
+            return []
+        if hits.size > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        order = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.texts[i], metadata=dict(self.metadatas[i]), id=self.ids[i])
+
+    def search_documents(self, query: str, k: int = 20) -> List[Document]:
+        return [self.document(i) for i, _ in self.search(query, k)]
+
+    def save(self, path: str | os.PathLike) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"version": _FORMAT_VERSION, "ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}, fh, ensure_ascii=False)
+        os.replace(tmp, path)  # escritura atómica: los lectores nunca ven un archivo a medias
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("version") != _FORMAT_VERSION:
+            raise ValueError(f"Formato de índice BM25 no soportado: {data.get('version')}")
+        return cls(data["ids"], data["texts"], data.get("metadatas"))
+
+
+def index_path(collection_name: Optional[str] = None, chroma_path: Optional[str] = None) -> Path:
+    """Archivo del índice junto a la base vectorial: `{CHROMA_DB_PATH}/{colección}.bm25.json`."""
+    return Path(chroma_path or settings.CHROMA_DB_PATH) / f"{collection_name or settings.COLLECTION_NAME}.bm25.json"
+
+
+def build_bm25_index(vectorstore, collection_name: Optional[str] = None, chroma_path: Optional[str] = None) -> BM25Index:
+    """Construye el índice desde la colección Chroma (chunks hijos) y lo persiste."""
+    got = vectorstore.get(include=["documents", "metadatas"])
+    ids = got.get("ids") or []
+    texts = got.get("documents") or [""] * len(ids)
+    metas = got.get("metadatas") or [{}] * len(ids)
+    index = BM25Index(ids, [t or "" for t in texts], [m or {} for m in metas])
+    path = index_path(collection_name, chroma_path)
+    try:
+        index.save(path)
+    except Exception as e:
+        logging.warning(f"No se pudo persistir el índice BM25 en {path}: {e}")
+    logging.info(f"Índice BM25 construido: {len(index)} chunks")
+    _CACHE.pop(str(path), None)
+    return index
+
+
+# Índices cargados por archivo: (mtime, índice)
+_CACHE: Dict[str, Tuple[float, BM25Index]] = {}
+_LOCK = threading.Lock()
+
+
+def get_bm25_index(vectorstore=None, collection_name: Optional[str] = None, chroma_path: Optional[str] = None) -> Optional[BM25Index]:
+    """
+    Índice del proceso para la colección: se carga una vez y se recarga si la ingesta
+    reescribió el archivo. Sin archivo, se construye desde `vectorstore` (si se pasa).
+    """
+    path = index_path(collection_name, chroma_path)
+    key = str(path)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        mtime = None
+    cached = _CACHE.get(key)
+    if cached is not None and (mtime is None or cached[0] == mtime):
+        return cached[1]
+    with _LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None and (mtime is None or cached[0] == mtime):
+            return cached[1]
+        index = None
+        if mtime is not None:
+            try:
+                index = BM25Index.load(path)
+            except Exception as e:
+                logging.warning(f"Índice BM25 inválido en {path} ({e}); se reconstruye")
+        if index is None:
+            if vectorstore is None:
+                return None
+            try:
+                index = build_bm25_index(vectorstore, collection_name, chroma_path)
+            except Exception as e:
+                logging.warning(f"No se pudo construir el índice BM25: {e}")
+                return None
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                mtime = -1.0
+        _CACHE[key] = (mtime, index)
+        return index
+
+
+def reset_bm25_cache() -> None:
+    with _LOCK:
+        _CACHE.clear()
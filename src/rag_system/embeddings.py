@@ -0,0 +1,540 @@
+"""
+Caché de embeddings direccionado por contenido.
+
+`CachedEmbeddings` envuelve cualquier `Embeddings` de LangChain (OpenAI o local, ver
+`src.llm_provider.get_embeddings_backend`) y memoriza cada vector por (modelo, sha256(texto)): primero en un LRU en proceso y luego
+en Redis (vía `src.cache`, con pool compartido) si está configurado; sin Redis, en un sqlite bajo
+CHROMA_DB_PATH (`DiskVectorCache`) que sobrevive a reinicios.
+`BatchedEmbeddings` agrupa los textos faltantes en requests `embed_documents` acotados,
+despachados en paralelo y con reintentos (el único nivel de reintento además de los 429 del transporte).
+`ensure_collection_embedding` registra el modelo en la metadata de la colección Chroma y
+rechaza mezclar vectores de modelos (y dimensiones) distintos.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from src.cache import acache_get_many, acache_set_many, cache_get_many, cache_set_many
+from src.config import settings
+from src.llm_provider import (
+    default_embedding_model,
+    embedding_dimension,
+    embedding_model_id,
+    embedding_provider,
+    get_embeddings_backend,
+)
+from src.resources import register_shutdown_hook
+
+
+def _encode_vector(vec: List[float]) -> str:
+    # float32 + base64: ~8 KB por vector de 1536 dims (vs ~30 KB en JSON)
+    return base64.b64encode(array("f", vec).tobytes()).decode("ascii")
+
+
+def _decode_vector(raw: str) -> List[float]:
+    arr = array("f")
+    arr.frombytes(base64.b64decode(raw))
+    return arr.tolist()
+
+
+class DiskVectorCache:
+    """
+    Tier persistente de vectores en sqlite (float32 crudo por clave) para despliegues sin Redis.
+    Acotado a `max_entries`: al superarlo se descartan las entradas escritas hace más tiempo.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+            self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        rows: Dict[str, bytes] = {}
+        with self._lock:
+            # sqlite limita la cantidad de parámetros por sentencia
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                cur = self._conn.execute(f"SELECT key, vec FROM vectors WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                rows.update(cur.fetchall())
+        out: List[Optional[List[float]]] = []
+        for k in keys:
+            raw = rows.get(k)
+            if raw is None:
+                out.append(None)
+                continue
+            arr = array("f")
+            arr.frombytes(raw)
+            out.append(arr.tolist())
+        return out
+
+    def set_many(self, entries: Dict[str, List[float]]) -> None:
+        if not entries:
+            return
+        with self._lock:
+            # INSERT OR REPLACE re-inserta la fila: el rowid refleja el orden de escritura
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, vec) VALUES (?, ?)",
+                [(k, array("f", v).tobytes()) for k, v in entries.items()],
+            )
+            self._writes += len(entries)
+            if self._writes >= 1000:
+                # Poda amortizada: contar la tabla en cada escritura sería costoso
+                self._writes = 0
+                self._conn.execute(
+                    "DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+
+_DISK_CACHE: Optional[DiskVectorCache] = None
+_DISK_CACHE_LOCK = threading.Lock()
+
+
+def _get_disk_cache() -> Optional[DiskVectorCache]:
+    """`DiskVectorCache` compartido en CHROMA_DB_PATH (None si está deshabilitado o no se puede abrir)."""
+    global _DISK_CACHE
+    if not settings.EMBEDDING_CACHE_DISK_ENABLED:
+        return None
+    if _DISK_CACHE is None:
+        with _DISK_CACHE_LOCK:
+            if _DISK_CACHE is None:
+                try:
+                    _DISK_CACHE = DiskVectorCache(
+                        os.path.join(settings.CHROMA_DB_PATH, "embedding_cache.sqlite3"),
+                        max_entries=settings.EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+                    )
+                except Exception as e:
+                    logging.warning(f"Caché de embeddings en disco no disponible: {e}")
+                    return None
+    return _DISK_CACHE
+
+
+def _close_disk_cache() -> None:
+    global _DISK_CACHE
+    with _DISK_CACHE_LOCK:
+        if _DISK_CACHE is not None:
+            _DISK_CACHE.close()
+            _DISK_CACHE = None
+
+
+register_shutdown_hook(_close_disk_cache)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Agrupa textos en batches por cantidad y tamaño, los despacha en paralelo cuando hay
+    más de uno y reintenta cada batch con backoff exponencial + jitter.
+    """
+
+    def __init__(self, underlying: Embeddings, batch_size: int = 128, max_batch_chars: int = 400_000,
+                 max_concurrency: int = 4, max_retries: int = 3, backoff_seconds: float = 0.5):
+        self.underlying = underlying
+        self.batch_size = max(1, int(batch_size))
+        self.max_batch_chars = max(1, int(max_batch_chars))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = backoff_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        batches: List[List[str]] = []
+        current: List[str] = []
+        chars = 0
+        for t in texts:
+            if current and (len(current) >= self.batch_size or chars + len(t) > self.max_batch_chars):
+                batches.append(current)
+                current, chars = [], 0
+            current.append(t)
+            chars += len(t)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _should_retry(self, e: Exception, attempt: int) -> bool:
+        # Único nivel de reintento: el cliente OpenAI va con max_retries=0 (ver `get_embeddings`)
+        # y los 429 ya los reintenta LimitedTransport
+        return attempt < self.max_retries and getattr(e, "status_code", None) != 429
+
+    def _delay(self, e: Exception, attempt: int) -> float:
+        delay = self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+        logging.warning(f"Embedding batch falló ({e}); reintento {attempt + 1}/{self.max_retries} en {delay:.2f}s")
+        return delay
+
+    def _with_retry(self, fn, arg):
+        attempt = 0
+        while True:
+            try:
+                return fn(arg)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._delay(e, attempt))
+                attempt += 1
+
+    def _embed_with_retry(self, batch: List[str]) -> List[List[float]]:
+        return self._with_retry(self.underlying.embed_documents, batch)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed-batch")
+        return self._executor
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = self._batches(list(texts))
+        if not batches:
+            return []
+        if len(batches) == 1 or self.max_concurrency == 1:
+            results = [self._embed_with_retry(b) for b in batches]
+        else:
+            results = list(self._get_executor().map(self._embed_with_retry, batches))
+        return [v for batch in results for v in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._with_retry(self.underlying.embed_query, text)
+
+    async def _awith_retry(self, fn, arg, sem: Optional[asyncio.Semaphore] = None):
+        attempt = 0
+        while True:
+            try:
+                if sem is None:
+                    return await fn(arg)
+                async with sem:
+                    return await fn(arg)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._delay(e, attempt))
+                attempt += 1
+
+    async def _aembed_with_retry(self, batch: List[str], sem: asyncio.Semaphore) -> List[List[float]]:
+        return await self._awith_retry(self.underlying.aembed_documents, batch, sem)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = self._batches(list(texts))
+        if not batches:
+            return []
+        sem = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self._aembed_with_retry(b, sem) for b in batches))
+        return [v for batch in results for v in batch]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._awith_retry(self.underlying.aembed_query, text)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings con caché L1 (LRU en proceso) + L2 (Redis, o `disk` sin Redis) por modelo y hash del texto."""
+
+    def __init__(self, underlying: Embeddings, model_name: str, max_entries: int = 4096, ttl_seconds: int = 30 * 86400,
+                 disk: Optional[DiskVectorCache] = None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.disk = disk
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"emb:{self.model_name}:{digest}"
+
+    def _lru_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+            return vec
+
+    def _lru_put(self, key: str, vec: List[float]) -> None:
+        with self._lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    @staticmethod
+    def _redis_enabled() -> bool:
+        return bool(settings.REDIS_HOST and settings.REDIS_PORT)
+
+    def _lookup(self, texts: List[str]) -> tuple[List[str], List[Optional[List[float]]]]:
+        keys = [self._key(t) for t in texts]
+        found: List[Optional[List[float]]] = [self._lru_get(k) for k in keys]
+        pending = [i for i, v in enumerate(found) if v is None]
+        if pending and self._redis_enabled():
+            try:
+                raws = cache_get_many([keys[i] for i in pending], host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+                for i, raw in zip(pending, raws):
+                    if raw:
+                        vec = _decode_vector(raw)
+                        found[i] = vec
+                        self._lru_put(keys[i], vec)
+            except Exception:
+                pass
+        elif pending and self.disk is not None:
+            self._disk_fill(keys, found, pending)
+        return keys, found
+
+    def _disk_fill(self, keys: List[str], found: List[Optional[List[float]]], pending: List[int]) -> None:
+        try:
+            for i, vec in zip(pending, self.disk.get_many([keys[i] for i in pending])):  # type: ignore[union-attr]
+                if vec is not None:
+                    found[i] = vec
+                    self._lru_put(keys[i], vec)
+        except Exception as e:
+            logging.warning(f"Lectura del caché de embeddings en disco falló: {e}")
+
+    def _disk_store(self, entries: Dict[str, List[float]]) -> None:
+        try:
+            self.disk.set_many(entries)  # type: ignore[union-attr]
+        except Exception as e:
+            logging.warning(f"Escritura del caché de embeddings en disco falló: {e}")
+
+    def _store(self, entries: Dict[str, List[float]]) -> None:
+        for k, v in entries.items():
+            self._lru_put(k, v)
+        if entries and self._redis_enabled():
+            try:
+                cache_set_many(
+                    {k: _encode_vector(v) for k, v in entries.items()},
+                    ttl_seconds=self.ttl_seconds,
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                )
+            except Exception:
+                pass
+        elif entries and self.disk is not None:
+            self._disk_store(entries)
+
+    async def _alookup(self, texts: List[str]) -> tuple[List[str], List[Optional[List[float]]]]:
+        keys = [self._key(t) for t in texts]
+        found: List[Optional[List[float]]] = [self._lru_get(k) for k in keys]
+        pending = [i for i, v in enumerate(found) if v is None]
+        if pending and self._redis_enabled():
+            try:
+                raws = await acache_get_many([keys[i] for i in pending], host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+                for i, raw in zip(pending, raws):
+                    if raw:
+                        vec = _decode_vector(raw)
+                        found[i] = vec
+                        self._lru_put(keys[i], vec)
+            except Exception:
+                pass
+        elif pending and self.disk is not None:
+            await asyncio.to_thread(self._disk_fill, keys, found, pending)
+        return keys, found
+
+    async def _astore(self, entries: Dict[str, List[float]]) -> None:
+        for k, v in entries.items():
+            self._lru_put(k, v)
+        if entries and self._redis_enabled():
+            try:
+                await acache_set_many(
+                    {k: _encode_vector(v) for k, v in entries.items()},
+                    ttl_seconds=self.ttl_seconds,
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                )
+            except Exception:
+                pass
+        elif entries and self.disk is not None:
+            await asyncio.to_thread(self._disk_store, entries)
+
+    def _missing(self, keys: List[str], texts: List[str], found: List[Optional[List[float]]]) -> Dict[str, str]:
+        # Deduplicar textos faltantes para no pagar dos veces el mismo embedding
+        missing: Dict[str, str] = {}
+        for k, t, v in zip(keys, texts, found):
+            if v is None and k not in missing:
+                missing[k] = t
+        with self._lock:
+            self.hits += len(texts) - sum(1 for v in found if v is None)
+            self.misses += len(missing)
+        return missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        keys, found = self._lookup(texts)
+        missing = self._missing(keys, texts, found)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            found = [v if v is not None else fresh[k] for k, v in zip(keys, found)]
+        return [list(v) for v in found]  # type: ignore[arg-type]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found = self._lookup([text])
+        if found[0] is not None:
+            with self._lock:
+                self.hits += 1
+            return list(found[0])
+        with self._lock:
+            self.misses += 1
+        vec = self.underlying.embed_query(text)
+        self._store({keys[0]: vec})
+        return list(vec)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        keys, found = await self._alookup(texts)
+        missing = self._missing(keys, texts, found)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            await self._astore(fresh)
+            found = [v if v is not None else fresh[k] for k, v in zip(keys, found)]
+        return [list(v) for v in found]  # type: ignore[arg-type]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found = await self._alookup([text])
+        if found[0] is not None:
+            with self._lock:
+                self.hits += 1
+            return list(found[0])
+        with self._lock:
+            self.misses += 1
+        vec = await self.underlying.aembed_query(text)
+        await self._astore({keys[0]: vec})
+        return list(vec)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"model": self.model_name, "entries": len(self._lru), "hits": self.hits, "misses": self.misses}
+
+
+_EMBEDDINGS: Dict[str, CachedEmbeddings] = {}
+_EMBEDDINGS_LOCK = threading.Lock()
+register_shutdown_hook(_EMBEDDINGS.clear)
+
+
+def get_embeddings(api_key: Optional[str] = None, model: Optional[str] = None) -> CachedEmbeddings:
+    """
+    Retorna el cliente de embeddings (con caché) compartido para (proveedor, modelo, api_key).
+    Usar en lugar de instanciar `OpenAIEmbeddings` directamente.
+    """
+    model = model or default_embedding_model()
+    local = embedding_provider() == "local"
+    api_key = None if local else (api_key or settings.OPENAI_API_KEY)
+    model_id = embedding_model_id(model)
+    key = f"{model_id}:{hashlib.sha1(str(api_key).encode('utf-8')).hexdigest()[:8]}"
+    emb = _EMBEDDINGS.get(key)
+    if emb is not None:
+        return emb
+    with _EMBEDDINGS_LOCK:
+        emb = _EMBEDDINGS.get(key)
+        if emb is None:
+            # Con reintentos en BatchedEmbeddings, el cliente OpenAI no reintenta por su cuenta
+            retries = max(0, int(settings.EMBEDDING_MAX_RETRIES))
+            underlying = BatchedEmbeddings(
+                get_embeddings_backend(model=model, api_key=api_key, max_retries=0 if retries else None),
+                batch_size=settings.LOCAL_EMBEDDING_BATCH_SIZE if local else settings.EMBEDDING_BATCH_SIZE,
+                max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+                max_retries=retries,
+            )
+            emb = CachedEmbeddings(
+                underlying,
+                model_name=model_id,
+                max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                disk=_get_disk_cache(),
+            )
+            _EMBEDDINGS[key] = emb
+    return emb
+
+
+class EmbeddingMismatchError(RuntimeError):
+    """La colección fue indexada con otro modelo/dimensión de embeddings que el configurado."""
+
+
+def _stored_dimension(collection) -> Optional[int]:
+    try:
+        got = collection.peek(1)
+        vecs = got.get("embeddings") if isinstance(got, dict) else None
+        if vecs is not None and len(vecs):
+            return len(vecs[0])
+    except Exception:
+        pass
+    return None
+
+
+def ensure_collection_embedding(collection, writing: bool = False) -> None:
+    """
+    Guard de compatibilidad entre la colección Chroma y el modelo de embeddings configurado.
+    La metadata `embedding_model` / `embedding_dim` se escribe al ingestar (`writing=True`);
+    en consultas sobre colecciones sin metadata se compara la dimensión de un vector almacenado.
+    Lanza `EmbeddingMismatchError` si no coinciden.
+    """
+    if collection is None:
+        return
+    model_id = embedding_model_id()
+    meta = dict(getattr(collection, "metadata", None) or {})
+    stored_model = meta.get("embedding_model")
+    try:
+        count = collection.count()
+    except Exception:
+        count = 0
+    if stored_model and stored_model != model_id and count:
+        raise EmbeddingMismatchError(
+            f"La colección '{getattr(collection, 'name', '?')}' fue indexada con '{stored_model}' "
+            f"y el modelo configurado es '{model_id}'. Re-ingestar en otra colección (COLLECTION_NAME) "
+            f"o volver a EMBEDDING_PROVIDER/modelo original."
+        )
+    dim = embedding_dimension()
+    stored_dim = meta.get("embedding_dim") or (_stored_dimension(collection) if count else None)
+    if dim and stored_dim and int(stored_dim) != int(dim):
+        raise EmbeddingMismatchError(
+            f"Dimensión de embeddings incompatible en '{getattr(collection, 'name', '?')}': "
+            f"la colección tiene {stored_dim} y '{model_id}' produce {dim}."
+        )
+    if writing and stored_model != model_id:
+        # Las claves hnsw:* son configuración del índice y no se pueden re-escribir
+        meta = {k: v for k, v in meta.items() if not str(k).startswith("hnsw:")}
+        meta["embedding_model"] = model_id
+        if dim or stored_dim:
+            meta["embedding_dim"] = int(dim or stored_dim)
+        collection.modify(metadata=meta)
+
+
+def embedding_cache_stats() -> List[dict]:
+    return [e.stats() for e in list(_EMBEDDINGS.values())]
@@ -0,0 +1,92 @@
+"""
+Recuperación híbrida: BM25 (términos exactos) + densa (Chroma) fusionadas con RRF.
+
+Reciprocal Rank Fusion sólo usa las posiciones de cada ranking (score = Σ 1/(k + rank)),
+así que no hace falta calibrar BM25 contra la similitud coseno. Con docstore (Redis) los
+chunks hijos fusionados se mapean a sus padres, igual que `ParentDocumentRetriever`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.rag_system.bm25 import get_bm25_index
+from src.rag_system.redis_docstore import as_document
+
+
+def rrf_fuse(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fusiona rankings de claves con RRF; retorna (clave, score) de mayor a menor."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(dict.fromkeys(ranking), 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    # sorted es estable: ante empate gana el primero visto (el ranking denso va primero)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def _doc_key(doc: Document) -> str:
+    doc_id = getattr(doc, "id", None)
+    if doc_id:
+        return str(doc_id)
+    return "sha1:" + hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever BM25 + denso con fusión RRF sobre los chunks hijos de la colección."""
+
+    vectorstore: Any
+    docstore: Any = None
+    id_key: str = "doc_id"
+    dense_k: int = 20
+    sparse_k: int = 20
+    rrf_k: int = 60
+    top_k: int = 20
+    collection_name: Optional[str] = None
+    chroma_path: Optional[str] = None
+
+    def _bm25(self):
+        return get_bm25_index(self.vectorstore, self.collection_name, self.chroma_path)
+
+    def _fuse(self, dense: List[Document], sparse: List[Document]) -> List[Document]:
+        by_key: Dict[str, Document] = {}
+        for doc in dense + sparse:
+            by_key.setdefault(_doc_key(doc), doc)
+        fused = rrf_fuse([[_doc_key(d) for d in dense], [_doc_key(d) for d in sparse]], k=self.rrf_k)
+        return [by_key[key] for key, _ in fused]
+
+    def _parent_ids(self, children: List[Document]) -> List[str]:
+        ids: List[str] = []
+        for d in children:
+            pid = (d.metadata or {}).get(self.id_key)
+            if pid is not None and pid not in ids:
+                ids.append(pid)
+        return ids
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense = self.vectorstore.similarity_search(query, k=self.dense_k)
+        index = self._bm25()
+        sparse = index.search_documents(query, self.sparse_k) if index is not None else []
+        fused = self._fuse(list(dense), sparse)
+        if self.docstore is None:
+            return fused[: self.top_k]
+        parents = self.docstore.mget(self._parent_ids(fused))
+        return [d for d in map(as_document, parents) if d is not None][: self.top_k]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        dense = await self.vectorstore.asimilarity_search(query, k=self.dense_k)
+        # La primera carga del índice lee disco: fuera del event loop
+        index = await asyncio.to_thread(self._bm25)
+        sparse = index.search_documents(query, self.sparse_k) if index is not None else []
+        fused = self._fuse(list(dense), sparse)
+        if self.docstore is None:
+            return fused[: self.top_k]
+        amget = getattr(self.docstore, "amget", None)
+        ids = self._parent_ids(fused)
+        parents = await amget(ids) if amget is not None else await asyncio.to_thread(self.docstore.mget, ids)
+        return [d for d in map(as_document, parents) if d is not None][: self.top_k]
@@ -1,18 +1,48 @@
-import os
+"""
+Ingesta incremental e idempotente de los reportes PDF de `data/input/`.
+
+Cada PDF se agrupa por página; cada página se divide jerárquicamente (padre 2000c,
+hijo 400c) y cada chunk recibe como id un hash de su contenido. Un manifest
+(`{CHROMA_DB_PATH}/{colección}.manifest.json`) guarda por fuente el hash del archivo y por
+página su hash y los ids de sus chunks, de modo que re-ejecutar la ingesta:
+- omite los PDFs sin cambios (sin parsear),
+- solo embebe las páginas nuevas o modificadas,
+- borra los chunks de páginas / PDFs que ya no existen.
+
+Pipeline en streaming:
+- parseo por rangos de páginas en un pool de procesos (INGEST_PARSE_WORKERS; cada worker
+  ejecuta Unstructured, `clean_metadata` y el splitting de su rango),
+- upserts en bulk a Chroma y al docstore (INGEST_UPSERT_BATCH hijos) despachados en threads
+  (INGEST_UPSERT_WORKERS) mientras se siguen parseando rangos; los embeddings de cada bulk
+  se calculan en batches concurrentes y con rate limiting (`BatchedEmbeddings` + `src.rate_limit`),
+- el manifest se guarda tras cada bulk como checkpoint: una corrida interrumpida retoma
+  sin volver a embeber las páginas ya indexadas.
+"""
+
+import argparse
+import hashlib
+import json
 import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
 from langchain_community.document_loaders import UnstructuredPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
+from src.rag_system.embeddings import EmbeddingMismatchError, ensure_collection_embedding, get_embeddings
+from src.llm_provider import embedding_dimension, embedding_model_id
 from langchain_chroma import Chroma
-try:
-    from langchain_chroma import Settings as ChromaSettings
-except Exception:
-    ChromaSettings = None
-from langchain.retrievers import ParentDocumentRetriever
 from langchain.storage import InMemoryStore
-from pydantic import SecretStr
 from src.rag_system.redis_docstore import RedisDocStore
+from src.rag_system.bm25 import build_bm25_index
 from src.config import settings
+from src.cache import bump_ingest_stamp
+from src.resources import get_chroma_client
 
 
 # Configuración de logging
@@ -21,68 +51,227 @@ logging.basicConfig(
 )
 
 # --- Constantes de Configuración ---
-DBIR_PDF_PATH = "data/input/2025-dbir-data-breach-investigations-report.pdf"
+PARENT_CHUNK = (2000, 200)
+CHILD_CHUNK = (400, 50)
+ID_KEY = "doc_id"  # clave de metadata hijo → padre (la misma que usa ParentDocumentRetriever)
+MANIFEST_VERSION = 2  # 2: chunks con title/section/category de Unstructured
+# Metadatos de los elementos que se conservan por chunk (los usa el contexto y los detectores)
+SECTION_KEYS = ("section", "subsection")
+
+# (página, hash de la página, chunks de `split_page`)
+PageChunks = Tuple[int, str, Dict[str, Any]]
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
 
+def list_source_pdfs(input_dir: Optional[str] = None) -> List[Path]:
+    base = Path(input_dir or settings.INGEST_INPUT_DIR)
+    if not base.is_dir():
+        return []
+    return sorted(p for p in base.iterdir() if p.is_file() and p.suffix.lower() == ".pdf")
 
-def ingest_dbir_report():
 
+def _group_pages(elements: List[Document], path: Path) -> Dict[int, Document]:
     """
-    Procesa el informe DBIR en PDF, lo divide jerárquicamente y lo indexa usando ParentDocumentRetriever.
+    Agrupa los elementos de Unstructured por página. Además del texto, la página lleva en
+    `_spans` (offset, category, título, sección) de cada elemento para que `split_page`
+    asigne a cada chunk el encabezado, la categoría y la sección que le corresponden.
     """
-    if not os.path.exists(DBIR_PDF_PATH):
-        logging.error(f"El informe DBIR no se encuentra en la ruta: {DBIR_PDF_PATH}")
-        return
+    pages: Dict[int, Tuple[List[str], List[Tuple[int, Any, Any, Dict[str, str]]]]] = {}
+    for el in elements:
+        meta = clean_metadata(el.metadata) if isinstance(getattr(el, "metadata", None), dict) else {}
+        text = (el.page_content or "").strip()
+        if not text:
+            continue
+        texts, spans = pages.setdefault(int(meta.get("page_number") or 0), ([], []))
+        offset = sum(len(t) + 2 for t in texts)
+        category = meta.get("category")
+        title = meta.get("title") or (text[:200] if category == "Title" else None)
+        sections = {k: str(meta[k]) for k in SECTION_KEYS if meta.get(k)}
+        texts.append(text)
+        spans.append((offset, category, title, sections))
+    return {
+        page: Document(
+            page_content="\n\n".join(texts),
+            metadata={"source": str(path), "filename": path.name, "filetype": "application/pdf",
+                      "page_number": page, "_spans": spans},
+        )
+        for page, (texts, spans) in sorted(pages.items())
+    }
+
 
-    logging.info(f"Iniciando la ingesta jerárquica del documento: {DBIR_PDF_PATH}")
+def load_pdf_pages(path: Path) -> Dict[int, Document]:
+    """Parsea el PDF completo con Unstructured en el proceso actual y lo agrupa por página."""
+    loader = UnstructuredPDFLoader(file_path=str(path), mode="elements")
+    return _group_pages(loader.load(), path)
 
 
-    # 1. Cargar el documento PDF usando Unstructured
+def _count_pages(path: Path) -> Optional[int]:
     try:
-        loader = UnstructuredPDFLoader(file_path=DBIR_PDF_PATH, mode="elements")
-        documents = loader.load()
-        logging.info(f"Documento cargado exitosamente. {len(documents)} elementos extraídos.")
-    except Exception as e:
-        logging.error(f"Error al cargar el PDF con Unstructured: {e}")
+        from pypdf import PdfReader  # type: ignore
+
+        return len(PdfReader(str(path)).pages)
+    except Exception:
+        return None
+
+
+def _page_ranges(n_pages: int, size: int) -> List[Tuple[int, int]]:
+    size = max(1, int(size))
+    return [(start, min(start + size, n_pages)) for start in range(0, n_pages, size)]
+
+
+def _load_range_elements(path: Path, start: int, end: int) -> List[Document]:
+    """Extrae las páginas [start, end) a un PDF temporal y lo parsea conservando la numeración original."""
+    from pypdf import PdfReader, PdfWriter  # type: ignore
+
+    reader = PdfReader(str(path))
+    writer = PdfWriter()
+    for i in range(start, end):
+        writer.add_page(reader.pages[i])
+    fd, tmp = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            writer.write(fh)
+        loader = UnstructuredPDFLoader(file_path=tmp, mode="elements", starting_page_number=start + 1)
+        return loader.load()
+    finally:
+        os.remove(tmp)
+
+
+def _parse_range(path: str, start: int, end: int) -> List[PageChunks]:
+    """Tarea del pool de procesos: parseo + clean_metadata + splitting de un rango de páginas."""
+    src_path = Path(path)
+    pages = _group_pages(_load_range_elements(src_path, start, end), src_path)
+    return [(page, _sha256(doc.page_content), split_page(doc, src_path.name, page)) for page, doc in pages.items()]
+
+
+def _parse_pool(workers: int):
+    # spawn: el proceso padre tiene threads (pools, Redis) y fork no es seguro con ellos
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def iter_page_chunks(path: Path, n_pages: Optional[int] = None) -> Iterator[PageChunks]:
+    """
+    Produce (página, hash, chunks) a medida que se parsea el PDF. Con INGEST_PARSE_WORKERS > 1 y
+    pypdf disponible reparte rangos de INGEST_PAGES_PER_TASK páginas en un pool de procesos y
+    entrega cada rango al terminar (orden de finalización); si no, parsea en el proceso actual.
+    """
+    workers = int(settings.INGEST_PARSE_WORKERS)
+    per_task = max(1, int(settings.INGEST_PAGES_PER_TASK))
+    n_pages = n_pages if n_pages is not None else _count_pages(path)
+    if workers <= 1 or not n_pages or n_pages <= per_task:
+        for page, doc in load_pdf_pages(path).items():
+            yield page, _sha256(doc.page_content), split_page(doc, path.name, page)
         return
+    ranges = _page_ranges(n_pages, per_task)
+    pool = _parse_pool(min(workers, len(ranges)))
+    try:
+        futures = [pool.submit(_parse_range, str(path), start, end) for start, end in ranges]
+        for fut in as_completed(futures):
+            yield from fut.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
 
-    # 1b. Filtrar metadatos complejos para compatibilidad con ChromaDB
-    for doc in documents:
-        if hasattr(doc, 'metadata') and isinstance(doc.metadata, dict):
-            doc.metadata = clean_metadata(doc.metadata)
-
-    # 1c. Validar dimensiones del modelo de embedding vs Chroma
-    # (Esto se valida automáticamente en Chroma/OpenAIEmbeddings, pero se puede loggear)
-    embedding_model = "text-embedding-3-small"
-    embedding = OpenAIEmbeddings(model=embedding_model, api_key=SecretStr(settings.OPENAI_API_KEY))
-    expected_dim = 1536
-    logging.info(f"Usando modelo de embedding '{embedding_model}' con dimensión esperada: {expected_dim}")
-
-    # 2. Definir los splitters jerárquicos
-    parent_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-    child_splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50)
-
-    # 3. Configurar el vectorstore y el docstore (remoto si hay host/port)
-    chroma_host = getattr(settings, "CHROMA_DB_HOST", None)
-    chroma_port = getattr(settings, "CHROMA_DB_PORT", None)
-    if chroma_host and chroma_port and ChromaSettings:
-        client_settings = ChromaSettings(
-            chroma_api_impl="rest",
-            chroma_server_host=chroma_host,
-            chroma_server_http_port=chroma_port,
-            anonymized_telemetry=False
-        )
-        vectorstore = Chroma(
-            collection_name=settings.COLLECTION_NAME,
-            embedding_function=embedding,
-            client_settings=client_settings
-        )
-    else:
-        vectorstore = Chroma(
-            collection_name=settings.COLLECTION_NAME,
-            embedding_function=embedding,
-            persist_directory=settings.CHROMA_DB_PATH
-        )
-    # Docstore: Redis si está configurado, de lo contrario memoria
+
+def _splitters() -> Tuple[RecursiveCharacterTextSplitter, RecursiveCharacterTextSplitter]:
+    return (
+        RecursiveCharacterTextSplitter(chunk_size=PARENT_CHUNK[0], chunk_overlap=PARENT_CHUNK[1], add_start_index=True),
+        RecursiveCharacterTextSplitter(chunk_size=CHILD_CHUNK[0], chunk_overlap=CHILD_CHUNK[1], add_start_index=True),
+    )
+
+
+def _span_metadata(spans: List[Tuple[int, Any, Any, Dict[str, str]]], start: int, end: int) -> Dict[str, Any]:
+    """title/section del último encabezado que abre el chunk (o del primero dentro de él) y category del elemento inicial."""
+    meta: Dict[str, Any] = {}
+    before = [sp for sp in spans if sp[0] <= start]
+    inside = [sp for sp in spans if start < sp[0] < end]
+    if before and before[-1][1]:
+        meta["category"] = before[-1][1]
+    titled_before = [sp for sp in before if sp[2]]
+    titled_inside = [sp for sp in inside if sp[2]]
+    if titled_before:
+        meta["title"] = titled_before[-1][2]
+    elif titled_inside:
+        meta["title"] = titled_inside[0][2]
+    for sp in reversed(before):
+        if sp[3]:
+            meta.update(sp[3])
+            break
+    return meta
+
+
+def split_page(page_doc: Document, source: str, page: int, splitters=None) -> Dict[str, Any]:
+    """
+    Divide una página en padres/hijos con ids por hash de contenido (estables entre corridas).
+    El ordinal dentro de la página desambigua chunks de texto idéntico. Cada chunk hereda
+    title/section/category de los elementos de Unstructured que cubre (ver `_group_pages`).
+    """
+    parent_splitter, child_splitter = splitters or _splitters()
+    base_meta = dict(page_doc.metadata or {})
+    spans = base_meta.pop("_spans", None) or []
+    page_doc = Document(page_content=page_doc.page_content, metadata=base_meta)
+    parents, parent_ids, children, child_ids = [], [], [], []
+    for i, parent in enumerate(parent_splitter.split_documents([page_doc])):
+        p_start = int(parent.metadata.pop("start_index", 0) or 0)
+        parent.metadata.update(_span_metadata(spans, p_start, p_start + len(parent.page_content)))
+        pid = _sha256(f"{source}|{page}|{i}|{parent.page_content}")[:32]
+        parents.append(parent)
+        parent_ids.append(pid)
+        for j, child in enumerate(child_splitter.split_documents([parent])):
+            c_start = p_start + int(child.metadata.pop("start_index", 0) or 0)
+            child.metadata.update(_span_metadata(spans, c_start, c_start + len(child.page_content)))
+            child.metadata[ID_KEY] = pid
+            children.append(child)
+            child_ids.append(_sha256(f"{pid}|{j}|{child.page_content}")[:32])
+    return {"parents": parents, "parent_ids": parent_ids, "children": children, "child_ids": child_ids}
+
+
+def manifest_path(collection_name: Optional[str] = None, chroma_path: Optional[str] = None) -> Path:
+    return Path(chroma_path or settings.CHROMA_DB_PATH) / f"{collection_name or settings.COLLECTION_NAME}.manifest.json"
+
+
+def _ingest_config() -> Dict[str, Any]:
+    # Si cambia el chunking, todas las páginas se re-ingestan. Un cambio de modelo de embeddings
+    # lo detecta el guard de la colección (`ensure_collection_embedding`): requiere --force
+    return {"parent_chunk": list(PARENT_CHUNK), "child_chunk": list(CHILD_CHUNK)}
+
+
+def load_manifest(path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    path = path or manifest_path()
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        return data if data.get("version") == MANIFEST_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(manifest: Dict[str, Any], path: Optional[Path] = None) -> None:
+    path = path or manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _open_stores():
+    """Vectorstore (cliente Chroma compartido: REST si hay host/port) y docstore (Redis o memoria)."""
+    vectorstore = Chroma(
+        client=get_chroma_client(),
+        collection_name=settings.COLLECTION_NAME,
+        embedding_function=get_embeddings(),
+    )
     redis_host = getattr(settings, "REDIS_HOST", None)
     redis_port = getattr(settings, "REDIS_PORT", None)
     redis_db = getattr(settings, "REDIS_DB", 0)
@@ -91,17 +280,246 @@ def ingest_dbir_report():
         logging.info(f"Usando RedisDocStore en {redis_host}:{redis_port}/{redis_db}")
     else:
         store = InMemoryStore()
+    return vectorstore, store
 
-    # 4. Instanciar y poblar el ParentDocumentRetriever
-    retriever = ParentDocumentRetriever(
-        vectorstore=vectorstore,
-        docstore=store,
-        child_splitter=child_splitter,
-        parent_splitter=parent_splitter,
-    )
-    logging.info("Añadiendo documentos al retriever. Este proceso realizará la división y vectorización...")
-    retriever.add_documents(documents)
-    logging.info("--- Ingesta jerárquica completada exitosamente! ---")
+
+def _delete_ids(vectorstore, store, child_ids: List[str], parent_ids: List[str]) -> None:
+    if child_ids:
+        vectorstore.delete(ids=list(child_ids))
+    if parent_ids:
+        if hasattr(store, "mdelete"):
+            store.mdelete(list(parent_ids))
+        else:
+            store.delete(list(parent_ids))
+
+
+def _upsert_pages(vectorstore, store, batch: List[Tuple[str, str, Dict[str, Any], Tuple[List[str], List[str]]]]) -> None:
+    """Bulk de páginas: borra ids obsoletos y hace un único mset + un único upsert (embebido en batches)."""
+    stale_children = [i for *_, (children, _) in batch for i in children]
+    stale_parents = [i for *_, (_, parents) in batch for i in parents]
+    _delete_ids(vectorstore, store, stale_children, stale_parents)
+    pairs = [kv for _, _, chunks, _ in batch for kv in zip(chunks["parent_ids"], chunks["parents"])]
+    if pairs:
+        store.mset(pairs)
+    children = [d for _, _, chunks, _ in batch for d in chunks["children"]]
+    if children:
+        # Ids deterministas: Chroma hace upsert, re-ejecutar un bulk interrumpido no duplica
+        vectorstore.add_documents(children, ids=[i for _, _, chunks, _ in batch for i in chunks["child_ids"]])
+
+
+class _BulkUpserter:
+    """
+    Despacha bulks de páginas a un pool de threads con backpressure (a lo sumo 2 bulks por worker
+    en vuelo). `on_done` corre en el thread que consume el parseo, así el manifest no necesita lock.
+    """
+
+    def __init__(self, vectorstore, store, on_done: Callable[[list], None], workers: int):
+        self.vectorstore = vectorstore
+        self.store = store
+        self.on_done = on_done
+        self.max_pending = max(1, int(workers)) * 2
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="ingest-upsert")
+        self.pending: Dict[Any, list] = {}
+        self.error: Optional[BaseException] = None
+
+    def submit(self, batch: list) -> None:
+        if self.error is not None:
+            raise self.error
+        fut = self.executor.submit(_upsert_pages, self.vectorstore, self.store, batch)
+        self.pending[fut] = batch
+        if len(self.pending) >= self.max_pending:
+            self._collect(FIRST_COMPLETED)
+
+    def _collect(self, return_when) -> None:
+        done, _ = wait(list(self.pending), return_when=return_when)
+        for fut in done:
+            batch = self.pending.pop(fut)
+            if fut.exception() is not None:
+                self.error = self.error or fut.exception()
+            else:
+                self.on_done(batch)
+        if self.error is not None:
+            raise self.error
+
+    def close(self) -> None:
+        """Espera los bulks en vuelo (los completados quedan registrados aunque otro falle)."""
+        try:
+            if self.pending:
+                self._collect(ALL_COMPLETED)
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def _drop_unmanaged_vectors(vectorstore) -> int:
+    """Colección con vectores pero sin manifest (ingesta previa con ids aleatorios): se vacía."""
+    try:
+        ids = vectorstore.get(include=[]).get("ids") or []
+    except Exception:
+        return 0
+    for start in range(0, len(ids), 5000):
+        vectorstore.delete(ids=ids[start:start + 5000])
+    return len(ids)
+
+
+def _drop_source(vectorstore, store, entry: Dict[str, Any], summary: Dict[str, Any], keys=None) -> None:
+    pages = entry.get("pages", {})
+    for key in list(pages if keys is None else keys):
+        gone = pages.pop(key)
+        _delete_ids(vectorstore, store, gone.get("child_ids", []), gone.get("parent_ids", []))
+        summary["pages_deleted"] += 1
+        summary["chunks_deleted"] += len(gone.get("child_ids", []))
+
+
+def _ingest_source(pdf: Path, entry: Dict[str, Any], vectorstore, store, summary: Dict[str, Any],
+                   checkpoint: Callable[[], None]) -> None:
+    """Indexa las páginas nuevas/modificadas de un PDF; `entry["pages"]` se actualiza por bulk completado."""
+    name = pdf.name
+    pages: Dict[str, Any] = entry["pages"]
+    n_pages = _count_pages(pdf)
+    started = time.monotonic()
+    progress = {"indexed": 0, "chunks": 0}
+
+    def on_done(batch: list) -> None:
+        for key, page_hash, chunks, (stale_children, _) in batch:
+            pages[key] = {"hash": page_hash, "parent_ids": chunks["parent_ids"], "child_ids": chunks["child_ids"]}
+            summary["pages_added"] += 1
+            summary["chunks_added"] += len(chunks["child_ids"])
+            summary["chunks_deleted"] += len(stale_children)
+            progress["indexed"] += 1
+            progress["chunks"] += len(chunks["child_ids"])
+        checkpoint()
+        elapsed = time.monotonic() - started
+        logging.info(
+            f"{name}: {progress['indexed']} páginas indexadas"
+            f"{f' de {n_pages}' if n_pages else ''}, {progress['chunks']} chunks "
+            f"({progress['chunks'] / max(elapsed, 1e-6):.1f} chunks/s, {elapsed:.0f}s)"
+        )
+
+    upserter = _BulkUpserter(vectorstore, store, on_done, settings.INGEST_UPSERT_WORKERS)
+    seen = set()
+    batch: list = []
+    batch_children = 0
+    parsed = iter_page_chunks(pdf, n_pages)
+    try:
+        for page, page_hash, chunks in parsed:
+            key = str(page)
+            seen.add(key)
+            old = pages.get(key)
+            if old and old.get("hash") == page_hash:
+                summary["pages_unchanged"] += 1
+                continue
+            stale = ([], [])
+            if old:
+                new_children, new_parents = set(chunks["child_ids"]), set(chunks["parent_ids"])
+                stale = ([i for i in old.get("child_ids", []) if i not in new_children],
+                         [i for i in old.get("parent_ids", []) if i not in new_parents])
+            batch.append((key, page_hash, chunks, stale))
+            batch_children += len(chunks["child_ids"])
+            if batch_children >= settings.INGEST_UPSERT_BATCH:
+                upserter.submit(batch)
+                batch, batch_children = [], 0
+        if batch:
+            upserter.submit(batch)
+    finally:
+        parsed.close()  # cancela los rangos pendientes del pool si se cortó el consumo
+        upserter.close()
+    # Solo con el PDF completo: páginas que ya no existen
+    _drop_source(vectorstore, store, entry, summary, keys=[k for k in pages if k not in seen])
+
+
+def ingest_reports(input_dir: Optional[str] = None, force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Ingesta incremental de todos los PDFs de `input_dir` (INGEST_INPUT_DIR por defecto).
+    Retorna un resumen con páginas/chunks agregados, sin cambios y eliminados.
+    """
+    pdfs = list_source_pdfs(input_dir)
+    if not pdfs:
+        logging.error(f"No hay PDFs para ingestar en: {input_dir or settings.INGEST_INPUT_DIR}")
+        return None
+    logging.info(f"Usando modelo de embedding '{embedding_model_id()}' con dimensión esperada: {embedding_dimension() or 'desconocida'}")
+
+    vectorstore, store = _open_stores()
+    path = manifest_path()
+    config = _ingest_config()
+    manifest = load_manifest(path)
+    summary = {"sources": len(pdfs), "sources_skipped": 0, "sources_failed": 0, "pages_added": 0,
+               "pages_unchanged": 0, "pages_deleted": 0, "chunks_added": 0, "chunks_deleted": 0}
+    if manifest is not None and (force or manifest.get("config") != config):
+        logging.warning("Re-ingesta completa (--force o cambio de chunking): se eliminan los chunks indexados")
+        for entry in manifest.get("sources", {}).values():
+            _drop_source(vectorstore, store, entry, summary)
+        manifest = None
+    try:
+        ensure_collection_embedding(getattr(vectorstore, "_collection", None), writing=True)
+    except EmbeddingMismatchError as e:
+        if not force:
+            logging.error(f"{e} Con --force se reconstruye la colección con el modelo actual.")
+            return None
+        # Vectores de otro modelo: no sirven para el nuevo, se recrea la colección vacía
+        logging.warning(f"{e} --force: se recrea la colección '{settings.COLLECTION_NAME}'.")
+        vectorstore.reset_collection()
+        ensure_collection_embedding(getattr(vectorstore, "_collection", None), writing=True)
+    if manifest is None:
+        dropped = _drop_unmanaged_vectors(vectorstore)
+        if dropped:
+            logging.warning(f"Colección sin manifest: se eliminaron {dropped} vectores previos para re-ingestar con ids por contenido")
+            summary["chunks_deleted"] += dropped
+        manifest = {"version": MANIFEST_VERSION, "config": config, "sources": {}}
+    sources: Dict[str, Any] = manifest.setdefault("sources", {})
+
+    def checkpoint() -> None:
+        save_manifest(manifest, path)
+
+    for pdf in pdfs:
+        name = pdf.name
+        file_hash = _file_sha256(pdf)
+        entry = sources.get(name) or {"file_hash": None, "pages": {}}
+        if entry.get("file_hash") == file_hash:
+            summary["sources_skipped"] += 1
+            summary["pages_unchanged"] += len(entry.get("pages", {}))
+            logging.info(f"{name}: sin cambios, se omite")
+            continue
+        logging.info(f"{name}: procesando (hash {file_hash[:12]})")
+        # Fuente en curso: sin file_hash hasta completarla, así un corte la retoma en la próxima corrida
+        entry["file_hash"] = None
+        entry.setdefault("pages", {})
+        sources[name] = entry
+        checkpoint()
+        try:
+            _ingest_source(pdf, entry, vectorstore, store, summary, checkpoint)
+        except Exception as e:
+            summary["sources_failed"] += 1
+            logging.error(f"Error al ingestar {name} ({e}); se retoma desde el último checkpoint en la próxima corrida")
+            checkpoint()
+            continue
+        entry["file_hash"] = file_hash
+        checkpoint()
+
+    # PDFs que ya no están en data/input
+    present = {p.name for p in pdfs}
+    for name in [n for n in sources if n not in present]:
+        _drop_source(vectorstore, store, sources.pop(name), summary)
+        logging.info(f"{name}: eliminado de la colección")
+    checkpoint()
+
+    if summary["chunks_added"] or summary["chunks_deleted"]:
+        # Índice BM25 sobre los mismos chunks hijos (recuperación híbrida, RETRIEVAL_MODE=hybrid)
+        try:
+            build_bm25_index(vectorstore, settings.COLLECTION_NAME, settings.CHROMA_DB_PATH)
+        except Exception as e:
+            logging.warning(f"No se pudo construir el índice BM25: {e}")
+        # Invalidar reportes cacheados que dependían de la colección anterior
+        bump_ingest_stamp(settings.COLLECTION_NAME, host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+    logging.info(f"--- Ingesta completada: {summary} ---")
+    return summary
+
+
+def ingest_dbir_report(force: bool = False):
+    """
+    Procesa los informes PDF de `data/input/` (DBIR incluido), los divide jerárquicamente y
+    los indexa de forma incremental (ver `ingest_reports`).
+    """
+    return ingest_reports(force=force)
 
 
 # --- Filtro robusto de metadatos para ChromaDB ---
@@ -121,4 +539,7 @@ def clean_metadata(metadata: dict) -> dict:
     return clean
 
 if __name__ == "__main__":
-    ingest_dbir_report()
+    parser = argparse.ArgumentParser(description="Ingesta incremental de los reportes PDF de data/input/.")
+    parser.add_argument("--force", action="store_true", help="Ignora el manifest y re-ingesta todo.")
+    args = parser.parse_args()
+    ingest_dbir_report(force=args.force)
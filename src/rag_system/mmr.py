@@ -0,0 +1,58 @@
+"""
+Motor MMR (Maximal Marginal Relevance) vectorizado con NumPy.
+
+Normaliza los vectores una vez, calcula todas las similitudes con un único producto
+matricial y mantiene incrementalmente la similitud máxima de cada candidato contra
+el conjunto ya seleccionado: O(n·d + k·n) en NumPy en lugar de O(k·n·d) en Python.
+"""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / (norms + 1e-10)
+
+
+def cosine_scores(query_vec: Sequence[float], doc_vecs: Sequence[Sequence[float]]) -> np.ndarray:
+    """Similitud coseno de la query contra cada documento (vector de tamaño n)."""
+    if len(doc_vecs) == 0:
+        return np.zeros(0, dtype=np.float32)
+    q = _normalize(np.asarray(query_vec, dtype=np.float32))
+    D = _normalize(np.asarray(doc_vecs, dtype=np.float32))
+    return D @ q
+
+
+def mmr_select(query_vec, doc_vecs, top_n: int = 5, lambda_mult: float = 0.5) -> tuple[list[int], list[float]]:
+    """
+    Selección MMR sobre vectores ya calculados.
+    Retorna (índices seleccionados en orden, similitud de cada doc con la query).
+    """
+    n = len(doc_vecs)
+    if n == 0:
+        return [], []
+    q = _normalize(np.asarray(query_vec, dtype=np.float32))
+    D = _normalize(np.asarray(doc_vecs, dtype=np.float32))
+    sims_q = D @ q
+    k = min(int(top_n), n)
+    if k <= 0:
+        return [], sims_q.tolist()
+
+    sims_dd = D @ D.T
+    selected = [int(np.argmax(sims_q))]
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    # Máxima similitud de cada candidato con el conjunto seleccionado (actualización incremental)
+    max_sim = sims_dd[selected[0]].copy()
+    while len(selected) < k:
+        scores = lambda_mult * sims_q - (1.0 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, sims_dd[best], out=max_sim)
+    return selected, sims_q.tolist()
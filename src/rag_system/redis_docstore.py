@@ -3,23 +3,36 @@ from __future__ import annotations
 import json
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-import redis
+from src.cache import get_redis_client
 try:
     from langchain_core.documents import Document  # type: ignore
 except Exception:
     Document = None  # type: ignore
 
 
+def as_document(value: Any) -> Any:
+    """Normaliza lo que devuelve un docstore (Document o payload JSON {page_content, metadata})."""
+    if value is None or Document is None or isinstance(value, Document):
+        return value
+    if isinstance(value, dict):
+        return Document(page_content=str(value.get("page_content") or ""), metadata=dict(value.get("metadata") or {}))
+    return Document(page_content=str(value))
+
+
 class RedisDocStore:
     """
     DocStore compatible con ParentDocumentRetriever basado en Redis.
 
-    Guarda por clave (doc_id) un JSON con page_content y metadata opcional.
+    Guarda por clave (doc_id) un JSON con page_content y metadata opcional; `get`/`mget`
+    lo devuelven como `Document`.
     Implementa métodos mínimos usados por LangChain: mset, mget, set, get, delete, yield_keys.
+    Usa el pool de conexiones compartido de `src.cache` (respuestas en bytes).
     """
 
-    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, prefix: str = "doc:"):
-        self._r = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, prefix: str = "doc:", client=None):
+        self._r = client if client is not None else get_redis_client(host, port, db)
+        if self._r is None:
+            raise RuntimeError(f"Redis no disponible para RedisDocStore en {host}:{port}/{db}")
         self._prefix = prefix
 
     def _k(self, key: str) -> str:
@@ -29,25 +42,24 @@ class RedisDocStore:
         payload = self._to_payload(value)
         self._r.set(self._k(key), payload)
 
-    def mset(self, kvs: Dict[str, Any]) -> None:
-        if not kvs:
+    def mset(self, kvs: Dict[str, Any] | Iterable[Tuple[str, Any]]) -> None:
+        # Acepta dict o secuencia de pares (key, value) como los stores de LangChain
+        items = list(kvs.items() if isinstance(kvs, dict) else kvs)
+        if not items:
             return
-        pipe = self._r.pipeline()
-        for k, v in kvs.items():
+        pipe = self._r.pipeline(transaction=False)
+        for k, v in items:
             pipe.set(self._k(k), self._to_payload(v))
         pipe.execute()
 
-    def get(self, key: str) -> Optional[Dict[str, Any]]:
+    def get(self, key: str) -> Optional[Any]:
         raw = self._r.get(self._k(key))
-        return json.loads(raw) if raw else None
+        return self._with_id(self._from_payload(raw), key) if raw else None
 
-    def mget(self, keys: Iterable[str]) -> List[Optional[Dict[str, Any]]]:
-        ks = [self._k(k) for k in keys]
-        vals = self._r.mget(ks)
-        out: List[Optional[Dict[str, Any]]] = []
-        for v in vals:
-            out.append(json.loads(v) if v else None)
-        return out
+    def mget(self, keys: Iterable[str]) -> List[Optional[Any]]:
+        keys = list(keys)
+        vals = self._r.mget([self._k(k) for k in keys])
+        return [self._with_id(self._from_payload(v), k) if v else None for k, v in zip(keys, vals)]
 
     def delete(self, keys: Iterable[str]) -> None:
         ks = [self._k(k) for k in keys]
@@ -57,8 +69,22 @@ class RedisDocStore:
     def yield_keys(self, prefix: str = "") -> Iterable[str]:
         patt = self._k(prefix) + "*"
         for k in self._r.scan_iter(match=patt):
+            if isinstance(k, bytes):
+                k = k.decode("utf-8", errors="ignore")
             yield k.removeprefix(self._prefix)
 
+    @staticmethod
+    def _from_payload(raw: Any) -> Any:
+        # Los retrievers esperan Documents (como InMemoryStore), no el JSON guardado
+        return as_document(json.loads(raw))
+
+    @staticmethod
+    def _with_id(doc: Any, key: str) -> Any:
+        # El id del padre es su clave (= `doc_id` de sus hijos en Chroma): permite ubicar sus vectores
+        if Document is not None and isinstance(doc, Document) and not doc.id:
+            doc.id = key
+        return doc
+
     @staticmethod
     def _to_payload(value: Any) -> str:
         # Value puede ser string, Document o dict similar
@@ -0,0 +1,184 @@
+"""
+Reranker local con cross-encoder: alternativa a CohereRerank sin API key ni red.
+
+El modelo se carga una vez por proceso (caché por configuración) y puntúa los pares
+(pregunta, documento) en batches en CPU. Backends:
+- "torch": `sentence_transformers.CrossEncoder` (opcionalmente con cuantización dinámica int8),
+- "onnx": `onnxruntime` sobre un modelo exportado (RERANKER_MODEL = directorio con el
+  tokenizer y RERANKER_ONNX_FILE, p.ej. una variante cuantizada `model_qint8_avx512.onnx`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+
+from src.config import settings
+from src.rag_system.redis_docstore import as_document
+from src.resources import register_shutdown_hook
+
+logger = logging.getLogger(__name__)
+
+_MODELS: Dict[Tuple, Any] = {}
+_LOCK = threading.Lock()
+
+
+def _backend() -> str:
+    return (settings.RERANKER_BACKEND or "torch").lower().strip()
+
+
+def local_reranker_available() -> bool:
+    """True si el reranker local está habilitado y sus dependencias están instaladas."""
+    if not settings.RERANKER_ENABLED:
+        return False
+    if _backend() == "onnx":
+        return all(importlib.util.find_spec(m) is not None for m in ("onnxruntime", "transformers"))
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+class _OnnxCrossEncoder:
+    """Cross-encoder sobre onnxruntime con la misma interfaz `predict` que sentence-transformers."""
+
+    def __init__(self, model_path: str, onnx_file: str, max_length: int, num_threads: int = 0):
+        import onnxruntime as ort  # type: ignore
+        from transformers import AutoTokenizer  # type: ignore
+
+        path = Path(model_path)
+        model_file = path / onnx_file if path.is_dir() else path
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            opts.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(str(model_file), opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(path if path.is_dir() else path.parent))
+        self.max_length = max_length
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, **_: Any) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start:start + batch_size]
+            enc = self.tokenizer(
+                [q for q, _ in chunk], [d for _, d in chunk],
+                padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._inputs}
+            logits = self.session.run(None, feeds)[0]
+            # 1 logit (ms-marco) o 2 clases: la última columna es la de relevancia
+            scores.append(logits[:, -1] if logits.ndim == 2 else logits)
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+
+def _load_torch_model(model_name: str, max_length: int, quantize: bool, num_threads: int):
+    from sentence_transformers import CrossEncoder  # type: ignore
+
+    model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+    try:
+        import torch  # type: ignore
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        if quantize:
+            model.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+    except Exception as e:
+        logger.warning(f"No se pudo aplicar la configuración torch del reranker ({e}); se usa el modelo sin cuantizar")
+    return model
+
+
+def _load_model(key: Tuple) -> Any:
+    backend, model_name, onnx_file, quantize, max_length, num_threads = key
+    if backend == "onnx":
+        return _OnnxCrossEncoder(model_name, onnx_file, max_length, num_threads)
+    return _load_torch_model(model_name, max_length, quantize, num_threads)
+
+
+def get_cross_encoder() -> Any:
+    """Modelo del proceso para la configuración actual (se carga una única vez)."""
+    key = (
+        _backend(),
+        settings.RERANKER_MODEL,
+        settings.RERANKER_ONNX_FILE,
+        bool(settings.RERANKER_QUANTIZE),
+        int(settings.RERANKER_MAX_LENGTH),
+        int(settings.RERANKER_NUM_THREADS),
+    )
+    model = _MODELS.get(key)
+    if model is not None:
+        return model
+    with _LOCK:
+        model = _MODELS.get(key)
+        if model is None:
+            model = _load_model(key)
+            _MODELS[key] = model
+            logger.info(f"Reranker local cargado: {key[1]} ({key[0]})")
+    return model
+
+
+def reset_cross_encoder() -> None:
+    with _LOCK:
+        _MODELS.clear()
+
+
+register_shutdown_hook(reset_cross_encoder)
+
+
+def warm_reranker() -> None:
+    """Carga el modelo por adelantado (arranque de la API) para no pagarlo en el primer request."""
+    if not local_reranker_available():
+        return
+    try:
+        get_cross_encoder().predict([("warmup", "warmup")], batch_size=1, show_progress_bar=False)
+    except Exception as e:
+        logger.warning(f"Warmup del reranker local falló: {e}")
+
+
+def rerank_documents(query: str, documents: Sequence[Document], top_n: Optional[int] = None) -> List[Document]:
+    """
+    Ordena `documents` por score del cross-encoder y retorna los `top_n` mejores con
+    `relevance_score` en metadata (como CohereRerank). Si el modelo falla, conserva el orden.
+    """
+    # Padres de un docstore Redis pueden llegar como payload JSON: normalizar antes de puntuar
+    docs = [d for d in map(as_document, documents) if d is not None]
+    top_n = top_n or settings.MMR_TOP_N
+    if not docs:
+        return []
+    try:
+        pairs = [(query, d.page_content) for d in docs]
+        scores = np.asarray(
+            get_cross_encoder().predict(pairs, batch_size=settings.RERANKER_BATCH_SIZE, show_progress_bar=False),
+            dtype=np.float32,
+        ).reshape(-1)
+        if scores.shape[0] != len(docs):
+            raise ValueError(f"{scores.shape[0]} scores para {len(docs)} documentos")
+    except Exception as e:
+        logger.warning(
+            f"Reranker local falló ({type(e).__name__}: {e}); se conserva el orden de recuperación de {len(docs)} documentos",
+            exc_info=logger.isEnabledFor(logging.DEBUG),
+        )
+        return docs[:top_n]
+    order = np.argsort(-scores, kind="stable")[:top_n]
+    return [
+        Document(page_content=docs[i].page_content, metadata={**(docs[i].metadata or {}), "relevance_score": float(scores[i])}, id=getattr(docs[i], "id", None))
+        for i in order
+    ]
+
+
+class LocalCrossEncoderRerank(BaseDocumentCompressor):
+    """Compresor para `ContextualCompressionRetriever` (drop-in de CohereRerank)."""
+
+    top_n: int = 5
+
+    def compress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        return rerank_documents(query, documents, self.top_n)
+
+    async def acompress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        # Inferencia CPU: fuera del event loop
+        return await asyncio.to_thread(rerank_documents, query, documents, self.top_n)
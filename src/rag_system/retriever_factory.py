@@ -1,25 +1,27 @@
-try:
-    from langchain_chroma import Settings as ChromaSettings  # type: ignore
-except Exception:
-    ChromaSettings = None  # type: ignore
 try:
     from langchain_cohere import CohereRerank
 except Exception:
     CohereRerank = None
 
-import math
 import logging
+import numpy as np
 from langchain_chroma import Chroma    
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import ChatOpenAI
 from langchain.retrievers.multi_query import MultiQueryRetriever
 from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda
+from langchain_core.runnables import RunnableLambda
 from src.config import settings
 from langchain.retrievers import ParentDocumentRetriever
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from src.rag_system.redis_docstore import RedisDocStore
+from src.rag_system.embeddings import EmbeddingMismatchError, ensure_collection_embedding, get_embeddings
+from src.rag_system.mmr import cosine_scores, mmr_select
+from src.rag_system.hybrid import HybridRetriever
+from src.rag_system.bm25 import reset_bm25_cache
+from src.rag_system.reranker import LocalCrossEncoderRerank, local_reranker_available
+from src.resources import get_chroma_client, openai_client_kwargs, register_shutdown_hook
 from langchain.cache import InMemoryCache
 from langchain.globals import set_llm_cache
 
@@ -32,6 +34,17 @@ except Exception:
 # Caches globales (por modo)
 _CACHED_ADVANCED_RETRIEVER: dict[str, any] = {}
 _CACHED_RAG_CHAIN: dict[str, any] = {}
+_CACHED_VECTORSTORE: dict[tuple, any] = {}
+
+
+def _reset_caches() -> None:
+    _CACHED_ADVANCED_RETRIEVER.clear()
+    _CACHED_RAG_CHAIN.clear()
+    _CACHED_VECTORSTORE.clear()
+    reset_bm25_cache()
+
+
+register_shutdown_hook(_reset_caches)
 
 
 def is_valid_api_key(value) -> bool:
@@ -47,30 +60,99 @@ def is_valid_api_key(value) -> bool:
         return False
 
 def _build_vectorstore(chroma_path, collection_name, embedding_fn):
-    chroma_host = getattr(settings, "CHROMA_DB_HOST", None)
-    chroma_port = getattr(settings, "CHROMA_DB_PORT", None)
-
-    if chroma_host and chroma_port and ChromaSettings:
-        try:
-            client_settings = ChromaSettings(
-                chroma_api_impl="rest",
-                chroma_server_host=chroma_host,
-                chroma_server_http_port=chroma_port,
-                anonymized_telemetry=False,
-            )
-            return Chroma(
-                collection_name=collection_name,
-                embedding_function=embedding_fn,
-                client_settings=client_settings,
-            )
-        except Exception:
-            pass  # Fallback a uso local si falla la config REST
-
-    return Chroma(
-        persist_directory=chroma_path,
+    # El cliente Chroma (REST o persistente en chroma_path) lo provee el registro de recursos
+    vs = Chroma(
+        client=get_chroma_client(),
         collection_name=collection_name,
         embedding_function=embedding_fn,
     )
+    # Guard: no consultar una colección indexada con otro modelo/dimensión de embeddings
+    try:
+        ensure_collection_embedding(getattr(vs, "_collection", None))
+    except EmbeddingMismatchError:
+        raise
+    except Exception as e:
+        logging.debug(f"No se pudo verificar la metadata de embeddings de la colección: {e}")
+    return vs
+
+
+def get_vectorstore(chroma_path=None, collection_name=None, openai_api_key=None):
+    """Vectorstore Chroma compartido por (path, colección); evita reconstruir el cliente por request."""
+    chroma_path = chroma_path or settings.CHROMA_DB_PATH
+    collection_name = collection_name or settings.COLLECTION_NAME
+    key = (chroma_path, collection_name)
+    vs = _CACHED_VECTORSTORE.get(key)
+    if vs is None:
+        vs = _build_vectorstore(chroma_path, collection_name, get_embeddings(api_key=openai_api_key))
+        _CACHED_VECTORSTORE[key] = vs
+    return vs
+
+
+def _child_vectors_by_parent(vs, parent_ids: list) -> dict:
+    """Centroide normalizado de los vectores hijos almacenados de cada padre (metadata `doc_id`)."""
+    got = vs.get(where={"doc_id": {"$in": list(parent_ids)}}, include=["embeddings", "metadatas"])
+    embeddings = got.get("embeddings") if got.get("embeddings") is not None else []
+    grouped: dict = {}
+    for meta, emb in zip(got.get("metadatas") or [], embeddings):
+        pid = (meta or {}).get("doc_id")
+        if pid is not None and emb is not None:
+            grouped.setdefault(pid, []).append(emb)
+    out = {}
+    for pid, vecs in grouped.items():
+        centroid = np.mean(np.asarray(vecs, dtype=np.float32), axis=0)
+        norm = float(np.linalg.norm(centroid))
+        out[pid] = (centroid / norm if norm else centroid).tolist()
+    return out
+
+
+def get_doc_embeddings(docs, vectorstore=None) -> list:
+    """
+    Vectores de los documentos recuperados, reutilizando los almacenados en Chroma
+    (`include=["embeddings"]`, por id) en lugar de re-embeber cada chunk. Los padres del
+    docstore (id = `doc_id` de sus hijos) usan el centroide de los vectores de sus hijos.
+    Solo los documentos sin id ni vectores almacenados se embeben, en un único batch cacheado.
+    """
+    docs = list(docs)
+    vectors: list = [None] * len(docs)
+    ids = [getattr(d, "id", None) for d in docs]
+    wanted = [i for i in ids if i]
+    if wanted:
+        try:
+            vs = vectorstore or get_vectorstore()
+            got = vs.get(ids=list(dict.fromkeys(wanted)), include=["embeddings"])
+            stored = {i: e for i, e in zip(got.get("ids") or [], got.get("embeddings") if got.get("embeddings") is not None else []) if e is not None}
+            parents = [doc_id for doc_id in dict.fromkeys(wanted) if doc_id not in stored]
+            if parents:
+                stored.update(_child_vectors_by_parent(vs, parents))
+            for pos, doc_id in enumerate(ids):
+                if doc_id in stored:
+                    vectors[pos] = list(stored[doc_id])
+        except Exception as e:
+            logging.debug(f"No se pudieron leer embeddings almacenados en Chroma: {e}")
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        texts = [getattr(docs[i], 'page_content', str(docs[i]))[:2000] for i in missing]
+        for i, v in zip(missing, get_embeddings().embed_documents(texts)):
+            vectors[i] = v
+    return vectors
+
+
+def mmr_rerank(question: str, docs, top_n: int | None = None, lambda_mult: float | None = None, vectorstore=None, fetch_k: int | None = None):
+    """MMR con un único embedding (la pregunta); los vectores de los docs salen de Chroma."""
+    top_n = top_n or settings.MMR_TOP_N
+    lambda_mult = settings.MMR_LAMBDA if lambda_mult is None else lambda_mult
+    # Limitar documentos (fetch_k) para costo controlado
+    docs = list(docs)[: (fetch_k or settings.MMR_FETCH_K)]
+    if not docs:
+        return []
+    try:
+        q = get_embeddings().embed_query(question)
+        D = get_doc_embeddings(docs, vectorstore)
+        selected_idx, _ = mmr_select(q, D, top_n=top_n, lambda_mult=lambda_mult)
+        return [docs[i] for i in selected_idx]
+    except Exception:
+        # Si falla el reranking, devolver top 5 por similitud
+        return docs[:top_n]
 
 
 def _make_base_retriever(vectorstore, is_turbo: bool | None = None):
@@ -81,21 +163,44 @@ def _make_base_retriever(vectorstore, is_turbo: bool | None = None):
     return vectorstore.as_retriever(search_kwargs={"k": k})
 
 
+def is_hybrid_retrieval() -> bool:
+    return (settings.RETRIEVAL_MODE or "dense").lower().strip() == "hybrid"
+
+
+def _make_hybrid_retriever(vectorstore, collection_name, chroma_path, is_turbo: bool, docstore=None):
+    """BM25 + denso (RRF) sobre los chunks hijos; con docstore devuelve los padres."""
+    k = 10 if is_turbo else 20
+    return HybridRetriever(
+        vectorstore=vectorstore,
+        docstore=docstore,
+        dense_k=settings.HYBRID_DENSE_K or k,
+        sparse_k=settings.HYBRID_SPARSE_K or k,
+        rrf_k=settings.HYBRID_RRF_K,
+        top_k=k,
+        collection_name=collection_name,
+        chroma_path=chroma_path,
+    )
+
+
 def create_advanced_retriever(chroma_path, collection_name, openai_api_key, cohere_api_key, force_turbo: bool = False):
     is_turbo_mode = True if force_turbo else settings.is_turbo
-    mode_key = 'turbo' if is_turbo_mode else 'heavy'
+    hybrid = is_hybrid_retrieval()
+    mode_key = ('turbo' if is_turbo_mode else 'heavy') + (':hybrid' if hybrid else '') + (':rerank' if local_reranker_available() else '')
     cached = _CACHED_ADVANCED_RETRIEVER.get(mode_key)
     if cached is not None:
         return cached
-    # 1. Vectorstore
-    embedding_fn = OpenAIEmbeddings(model="text-embedding-3-small", api_key=openai_api_key)
-    vectorstore = _build_vectorstore(chroma_path, collection_name, embedding_fn)
+    # 1. Vectorstore (compartido entre modos)
+    vectorstore = get_vectorstore(chroma_path, collection_name, openai_api_key)
 
     # 2. Base retriever: ParentDocumentRetriever si Redis está configurado, si no retriever simple
     redis_host = getattr(settings, "REDIS_HOST", None)
     redis_port = getattr(settings, "REDIS_PORT", None)
     redis_db = getattr(settings, "REDIS_DB", 0)
-    if redis_host and redis_port is not None:
+    if hybrid:
+        docstore = RedisDocStore(host=redis_host, port=int(redis_port), db=int(redis_db)) if redis_host and redis_port is not None else None
+        base_retriever = _make_hybrid_retriever(vectorstore, collection_name, chroma_path, is_turbo_mode, docstore)
+        logging.info("Usando retriever híbrido BM25 + denso (RRF).")
+    elif redis_host and redis_port is not None:
         docstore = RedisDocStore(host=redis_host, port=int(redis_port), db=int(redis_db))
         parent_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
         child_splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50)
@@ -110,11 +215,12 @@ def create_advanced_retriever(chroma_path, collection_name, openai_api_key, cohe
         base_retriever = _make_base_retriever(vectorstore, is_turbo_mode)
         logging.info("Usando retriever de vectorstore simple (sin docstore persistente).")
 
-    # 3. MultiQueryRetriever para expansión de consultas (deshabilitado en TURBO)
-    if is_turbo_mode:
+    # 3. MultiQueryRetriever para expansión de consultas (deshabilitado en TURBO; en híbrido
+    #    BM25 ya cubre los términos exactos, salvo HYBRID_MULTIQUERY)
+    if is_turbo_mode or (hybrid and not settings.HYBRID_MULTIQUERY):
         advanced_retriever = base_retriever
     else:
-        llm = ChatOpenAI(model="gpt-4.1-nano", temperature=0, api_key=openai_api_key)
+        llm = ChatOpenAI(model="gpt-4.1-nano", temperature=0, api_key=openai_api_key, **openai_client_kwargs())
         advanced_retriever = MultiQueryRetriever.from_llm(retriever=base_retriever, llm=llm)
 
     # 4. ContextualCompressionRetriever con CohereRerank (opcional; deshabilitado en TURBO)
@@ -130,6 +236,13 @@ def create_advanced_retriever(chroma_path, collection_name, openai_api_key, cohe
             base_compressor=compressor,
             base_retriever=advanced_retriever,
         )
+    elif (not is_turbo_mode) and local_reranker_available():
+        # Sin Cohere: cross-encoder local (sin red ni API key) en lugar de MMR
+        ret = ContextualCompressionRetriever(
+            base_compressor=LocalCrossEncoderRerank(top_n=5),
+            base_retriever=advanced_retriever,
+        )
+        logging.info(f"Usando reranker local ({settings.RERANKER_MODEL}).")
     else:
         if not settings.is_turbo:
             logging.warning(
@@ -139,13 +252,26 @@ def create_advanced_retriever(chroma_path, collection_name, openai_api_key, cohe
     _CACHED_ADVANCED_RETRIEVER[mode_key] = ret
     return ret
 
-def get_rag_chain(force_turbo: bool = False):
-    is_turbo_mode = True if force_turbo else settings.is_turbo
-    mode_key = 'turbo' if is_turbo_mode else 'heavy'
-    cached = _CACHED_RAG_CHAIN.get(mode_key)
-    if cached is not None:
-        return cached
+def _early_exit_candidates(question: str):
+    """
+    Candidatos del early-exit heavy: los MMR_FETCH_K hijos más cercanos a la pregunta y su
+    coseno exacto contra ella, calculado con los vectores almacenados en Chroma (no con el
+    relevance score, que depende del espacio de distancia de la colección: en L2 es 1 - d/√2).
+    Retorna (vector de la pregunta, docs, vectores, cosenos).
+    """
+    vs = get_vectorstore()
+    q = get_embeddings().embed_query(question)
+    docs = vs.similarity_search_by_vector(q, k=settings.MMR_FETCH_K)
+    vectors = get_doc_embeddings(docs, vs) if docs else []
+    return q, docs, vectors, cosine_scores(q, vectors)
 
+
+def retrieve_context_docs(question: str, force_turbo: bool = False) -> list:
+    """
+    Recuperación + rerank del RAG (lo que ve el LLM): early-exit con score en heavy,
+    retriever avanzado en caso contrario y MMR si no hay Cohere. Retorna a lo sumo MMR_TOP_N docs.
+    """
+    is_turbo_mode = True if force_turbo else settings.is_turbo
     advanced_retriever = create_advanced_retriever(
         chroma_path=settings.CHROMA_DB_PATH,
         collection_name=settings.COLLECTION_NAME,
@@ -153,6 +279,48 @@ def get_rag_chain(force_turbo: bool = False):
         cohere_api_key=(None if is_turbo_mode else getattr(settings, "COHERE_API_KEY", None)),
         force_turbo=is_turbo_mode,
     )
+    docs = []
+    early_exit = False
+    try:
+        if not is_turbo_mode:
+            # Early-exit: si el coseno del top1 supera el umbral se evitan MultiQuery y rerank;
+            # como en el flujo original, MMR elige entre los candidatos (vectores ya leídos)
+            q, candidates, vectors, sims = _early_exit_candidates(question)
+            if len(sims) and float(sims[0]) >= settings.HEAVY_EARLY_EXIT_THRESHOLD:
+                selected, _ = mmr_select(q, vectors, top_n=settings.MMR_TOP_N, lambda_mult=settings.MMR_LAMBDA)
+                docs = [candidates[i] for i in selected]
+                early_exit = True
+        if not docs:
+            if hasattr(advanced_retriever, "invoke"):
+                docs = advanced_retriever.invoke(question)
+            else:
+                docs = advanced_retriever.get_relevant_documents(question)
+    except Exception:
+        docs = []
+    # Sin MMR en TURBO (ni de nuevo tras el early-exit); en heavy mantenemos MMR si no hay Cohere
+    if not is_turbo_mode and docs and not early_exit:
+        use_cohere = bool(getattr(settings, "COHERE_API_KEY", None)) and CohereRerank is not None
+        # El reranker (Cohere o local) ya seleccionó los mejores: MMR solo si no hay ninguno
+        if not use_cohere and not local_reranker_available():
+            docs = mmr_rerank(question, docs)
+    return list(docs)[:settings.MMR_TOP_N]
+
+
+def format_context(docs) -> str:
+    """Contexto como texto concatenado (mismo formato para el prompt y para el preview)."""
+    return "\n---\n".join(getattr(d, 'page_content', str(d)) for d in list(docs)[:settings.MMR_TOP_N])
+
+
+def get_rag_chain(force_turbo: bool = False):
+    """
+    Cadena RAG cacheada por modo. `invoke(question)` recupera y responde;
+    `invoke({"question": q, "docs": docs})` responde sobre documentos ya recuperados.
+    """
+    is_turbo_mode = True if force_turbo else settings.is_turbo
+    mode_key = 'turbo' if is_turbo_mode else 'heavy'
+    cached = _CACHED_RAG_CHAIN.get(mode_key)
+    if cached is not None:
+        return cached
 
     template = """
     You are a senior cybersecurity analyst. Your task is to answer the user's question based ONLY on the following context from the Verizon DBIR 2025 report.
@@ -172,91 +340,22 @@ def get_rag_chain(force_turbo: bool = False):
         temperature=0.1,
         api_key=settings.OPENAI_API_KEY,
         max_tokens=256 if is_turbo_mode else None,
+        **openai_client_kwargs(),
     )
 
-    def cosine(a, b):
-        dot = sum(x*y for x, y in zip(a, b))
-        na = math.sqrt(sum(x*x for x in a))
-        nb = math.sqrt(sum(y*y for y in b))
-        return dot / (na * nb + 1e-10)
+    def build_context(inp):
+        # Acepta la pregunta (str) o {"question", "docs"} con documentos ya recuperados
+        if isinstance(inp, dict):
+            if inp.get("docs") is not None:
+                return format_context(inp["docs"])
+            inp = inp.get("question", "")
+        return format_context(retrieve_context_docs(inp, force_turbo=is_turbo_mode))
 
-    def mmr_rerank(question: str, docs, top_n: int = 5, lambda_mult: float = 0.5):
-        try:
-            emb = OpenAIEmbeddings(model="text-embedding-3-small", api_key=settings.OPENAI_API_KEY)
-            q = emb.embed_query(question)
-            # Limitar documentos a 20 para costo controlado
-            docs = list(docs)[:20]
-            D = [emb.embed_query(getattr(d, 'page_content', str(d))[:2000]) for d in docs]
-            sims_q = [cosine(q, d) for d in D]
-            selected = []
-            selected_idx = []
-            if not docs:
-                return []
-            # Primero: el más similar a la query
-            first = max(range(len(docs)), key=lambda i: sims_q[i])
-            selected.append(docs[first]); selected_idx.append(first)
-            while len(selected) < min(top_n, len(docs)):
-                best_i = None
-                best_score = -1e9
-                for i in range(len(docs)):
-                    if i in selected_idx:
-                        continue
-                    max_sim_to_S = max(cosine(D[i], D[j]) for j in selected_idx) if selected_idx else 0.0
-                    score = lambda_mult * sims_q[i] - (1 - lambda_mult) * max_sim_to_S
-                    if score > best_score:
-                        best_score = score; best_i = i
-                if best_i is None:
-                    break
-                selected.append(docs[best_i]); selected_idx.append(best_i)
-            return selected
-        except Exception:
-            # Si falla el reranking, devolver top 5 por similitud
-            try:
-                return docs[:5]
-            except Exception:
-                return docs
-
-    def build_context(question: str):
-        # Early-exit: si top1 muy alto, evitar fan-out pesado en heavy
-        docs = []
-        try:
-            if not is_turbo_mode:
-                # base retriever top1
-                emb = OpenAIEmbeddings(model="text-embedding-3-small", api_key=settings.OPENAI_API_KEY)
-                qv = emb.embed_query(question)
-                vectorstore = _build_vectorstore(settings.CHROMA_DB_PATH, settings.COLLECTION_NAME, emb)
-                base = _make_base_retriever(vectorstore, is_turbo_mode)
-                top1 = base.get_relevant_documents(question)
-                def cosine(a, b):
-                    import math
-                    dot = sum(x*y for x, y in zip(a, b)); na = math.sqrt(sum(x*x for x in a)); nb = math.sqrt(sum(y*y for y in b)); return dot/(na*nb+1e-10)
-                score = None
-                if top1:
-                    dv = emb.embed_query(getattr(top1[0], 'page_content', '')[:2000])
-                    score = cosine(qv, dv)
-                if score is not None and score >= 0.55:
-                    docs = base.get_relevant_documents(question)
-            if not docs:
-                if hasattr(advanced_retriever, "invoke"):
-                    docs = advanced_retriever.invoke(question)
-                else:
-                    docs = advanced_retriever.get_relevant_documents(question)
-        except Exception:
-            docs = []
-        # Sin MMR en TURBO; en heavy mantenemos MMR si no hay Cohere
-        if not is_turbo_mode and docs:
-            use_cohere = bool(getattr(settings, "COHERE_API_KEY", None)) and CohereRerank is not None
-            if not use_cohere:
-                docs = mmr_rerank(question, docs, top_n=5)
-        # Construir el contexto como texto concatenado
-        texts = []
-        for d in docs[:5]:
-            content = getattr(d, 'page_content', str(d))
-            texts.append(content)
-        return "\n---\n".join(texts) if texts else ""
+    def question_of(inp):
+        return inp.get("question", "") if isinstance(inp, dict) else inp
 
     rag_chain = (
-        {"context": RunnableLambda(build_context), "question": RunnablePassthrough()}
+        {"context": RunnableLambda(build_context), "question": RunnableLambda(question_of)}
         | prompt
         | llm
         | StrOutputParser()
@@ -0,0 +1,385 @@
+"""
+Limitador compartido de llamadas salientes a OpenAI (chat y embeddings).
+
+Se aplica como transporte httpx de los clientes compartidos (`src.resources`), de modo
+que todo `ChatOpenAI` / `OpenAIEmbeddings` construido con `openai_client_kwargs()` pasa
+por él. Por modelo combina:
+- token bucket de requests por minuto (LLM_REQUESTS_PER_MINUTE, 0 = sin límite),
+- semáforo FIFO de concurrencia compartido entre threads y corrutinas (LLM_MAX_CONCURRENCY),
+- reintento con jitter ante 429 (respeta Retry-After),
+y expone métricas de cola. `is_overloaded()` alimenta el load-shedding (503) de la API.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from src.config import settings
+
+_ENDPOINT_KINDS = (("/chat/completions", "chat"), ("/embeddings", "embeddings"), ("/completions", "chat"))
+
+
+class _Gate:
+    """Semáforo FIFO usable desde threads (`acquire`) y desde el event loop (`aacquire`)."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.in_use = 0
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _fast_path(self) -> bool:
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return True
+        return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._fast_path():
+                return True
+            ev = threading.Event()
+            waiter = ("thread", ev)
+            self._waiters.append(waiter)
+        if ev.wait(timeout):
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return False
+            except ValueError:
+                return True  # el slot fue cedido justo al vencer el timeout
+
+    async def aacquire(self, timeout: Optional[float] = None) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._fast_path():
+                return True
+            fut = loop.create_future()
+            waiter = ("async", loop, fut)
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    granted = False
+                except ValueError:
+                    granted = True
+            if granted:
+                # El slot llegó en paralelo a la cancelación/timeout: devolverlo
+                fut.add_done_callback(lambda _: self.release())
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    def _grant(self, fut: asyncio.Future) -> None:
+        if fut.done():
+            self.release()
+        else:
+            fut.set_result(True)
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # Ceder el slot directamente al siguiente en la cola (FIFO)
+                waiter = self._waiters.popleft()
+                if waiter[0] == "thread":
+                    waiter[1].set()
+                else:
+                    _, loop, fut = waiter
+                    try:
+                        loop.call_soon_threadsafe(self._grant, fut)
+                    except RuntimeError:
+                        self.in_use -= 1  # loop cerrado
+                return
+            self.in_use = max(0, self.in_use - 1)
+
+
+class ModelLimiter:
+    """Límites y métricas de un modelo (token bucket + concurrencia)."""
+
+    def __init__(self, model: str, kind: str, max_concurrency: int, rpm: int):
+        self.model = model
+        self.kind = kind
+        self.rpm = max(0, int(rpm))
+        self._gate = _Gate(max_concurrency)
+        self._lock = threading.Lock()
+        self._capacity = float(max(1, int(max_concurrency)))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self.requests = 0
+        self.queue_ms_total = 0.0
+        self.queue_ms_max = 0.0
+        self.retries_429 = 0
+        self.rejected = 0
+
+    def _reserve(self) -> float:
+        """Reserva un token; retorna cuánto esperar (s) hasta que esté disponible."""
+        if self.rpm <= 0:
+            return 0.0
+        rate = self.rpm / 60.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else -self._tokens / rate
+
+    def _record(self, queued_s: float) -> None:
+        ms = queued_s * 1000.0
+        with self._lock:
+            self.requests += 1
+            self.queue_ms_total += ms
+            self.queue_ms_max = max(self.queue_ms_max, ms)
+
+    def _reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+        raise httpx.PoolTimeout(f"Cola del limitador de '{self.model}' excedió LLM_QUEUE_TIMEOUT_SECONDS")
+
+    def acquire(self) -> None:
+        t0 = time.monotonic()
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        if not self._gate.acquire(timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS):
+            self._reject()
+        self._record(time.monotonic() - t0)
+
+    async def aacquire(self) -> None:
+        t0 = time.monotonic()
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if not await self._gate.aacquire(timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS):
+            self._reject()
+        self._record(time.monotonic() - t0)
+
+    def release(self) -> None:
+        self._gate.release()
+
+    def note_429(self) -> None:
+        with self._lock:
+            self.retries_429 += 1
+
+    @property
+    def waiting(self) -> int:
+        return self._gate.waiting
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.requests
+            return {
+                "model": self.model,
+                "kind": self.kind,
+                "max_concurrency": self._gate.limit,
+                "rpm": self.rpm,
+                "in_flight": self._gate.in_use,
+                "waiting": self._gate.waiting,
+                "requests": requests,
+                "queue_ms_avg": round(self.queue_ms_total / requests, 2) if requests else 0.0,
+                "queue_ms_max": round(self.queue_ms_max, 2),
+                "retries_429": self.retries_429,
+                "rejected": self.rejected,
+            }
+
+
+_LIMITERS: Dict[str, ModelLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+_SHED = {"count": 0}
+
+
+def get_limiter(model: str, kind: str = "chat") -> ModelLimiter:
+    """Limitador del proceso para `model`; LLM_MODEL_LIMITS permite overrides por modelo."""
+    lim = _LIMITERS.get(model)
+    if lim is not None:
+        return lim
+    with _LIMITERS_LOCK:
+        lim = _LIMITERS.get(model)
+        if lim is None:
+            override = (settings.LLM_MODEL_LIMITS or {}).get(model, {})
+            lim = ModelLimiter(
+                model,
+                kind,
+                max_concurrency=int(override.get("max_concurrency", settings.LLM_MAX_CONCURRENCY)),
+                rpm=int(override.get("rpm", settings.LLM_REQUESTS_PER_MINUTE)),
+            )
+            _LIMITERS[model] = lim
+    return lim
+
+
+def reset_limiters() -> None:
+    with _LIMITERS_LOCK:
+        _LIMITERS.clear()
+    _SHED["count"] = 0
+
+
+def queued_requests() -> int:
+    return sum(lim.waiting for lim in list(_LIMITERS.values()))
+
+
+def is_overloaded() -> bool:
+    """True si las llamadas en cola superan LLM_SHED_QUEUE_THRESHOLD (0 = nunca)."""
+    threshold = settings.LLM_SHED_QUEUE_THRESHOLD
+    return threshold > 0 and queued_requests() >= threshold
+
+
+def note_shed() -> None:
+    _SHED["count"] += 1
+
+
+def limiter_stats() -> Dict[str, Any]:
+    return {
+        "queued": queued_requests(),
+        "shed_threshold": settings.LLM_SHED_QUEUE_THRESHOLD,
+        "shed": _SHED["count"],
+        "models": [lim.stats() for lim in list(_LIMITERS.values())],
+    }
+
+
+def _classify(request: httpx.Request) -> Tuple[Optional[str], Optional[str]]:
+    if request.method != "POST":
+        return None, None
+    path = request.url.path
+    kind = next((k for suffix, k in _ENDPOINT_KINDS if path.endswith(suffix)), None)
+    if kind is None:
+        return None, None
+    try:
+        model = json.loads(request.content or b"{}").get("model")
+    except Exception:
+        model = None
+    return (str(model) if model else "unknown"), kind
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    try:
+        retry_after = float(response.headers.get("retry-after", ""))
+        if retry_after >= 0:
+            return retry_after + random.uniform(0, settings.LLM_429_BACKOFF_SECONDS)
+    except ValueError:
+        pass
+    # Backoff exponencial con jitter completo
+    return random.uniform(0, settings.LLM_429_BACKOFF_SECONDS * (2 ** attempt))
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Libera el slot del limitador cuando se termina/cierra el cuerpo de la respuesta."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+def _wrap(response: httpx.Response, stream) -> httpx.Response:
+    return httpx.Response(
+        status_code=response.status_code,
+        headers=response.headers,
+        stream=stream,
+        extensions=response.extensions,
+    )
+
+
+class LimitedTransport(httpx.BaseTransport):
+    """Transporte httpx síncrono que aplica el limitador por modelo y reintenta 429."""
+
+    def __init__(self, inner: httpx.BaseTransport):
+        self._inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        model, kind = _classify(request)
+        if model is None:
+            return self._inner.handle_request(request)
+        limiter = get_limiter(model, kind)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                response = self._inner.handle_request(request)
+            except BaseException:
+                limiter.release()
+                raise
+            if response.status_code != 429 or attempt >= settings.LLM_429_MAX_RETRIES:
+                return _wrap(response, _ReleasingStream(response.stream, limiter.release))
+            response.close()
+            limiter.release()
+            limiter.note_429()
+            time.sleep(_retry_delay(response, attempt))
+            attempt += 1
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    """Variante asíncrona de `LimitedTransport`."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        model, kind = _classify(request)
+        if model is None:
+            return await self._inner.handle_async_request(request)
+        limiter = get_limiter(model, kind)
+        attempt = 0
+        while True:
+            await limiter.aacquire()
+            try:
+                response = await self._inner.handle_async_request(request)
+            except BaseException:
+                limiter.release()
+                raise
+            if response.status_code != 429 or attempt >= settings.LLM_429_MAX_RETRIES:
+                return _wrap(response, _AsyncReleasingStream(response.stream, limiter.release))
+            await response.aclose()
+            limiter.release()
+            limiter.note_429()
+            await asyncio.sleep(_retry_delay(response, attempt))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
@@ -0,0 +1,195 @@
+"""
+Registro de recursos compartidos del proceso.
+
+Centraliza los clientes costosos de construir (cliente Chroma, pool HTTP para OpenAI)
+para que modos, endpoints e ingesta reutilicen una única instancia por configuración.
+`startup_resources` / `shutdown_resources` se enganchan al ciclo de vida de FastAPI.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Callable, List, Optional
+
+import httpx
+
+from src.config import settings
+from src.rate_limit import AsyncLimitedTransport, LimitedTransport
+
+_lock = threading.RLock()
+_chroma_client = None
+_chroma_kind: Optional[str] = None
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_shutdown_hooks: List[Callable[[], None]] = []
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Cliente HTTP síncrono compartido (keep-alive + pool) para los clientes OpenAI.
+    Su transporte aplica el limitador por modelo de `src.rate_limit`.
+    """
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                transport = LimitedTransport(httpx.HTTPTransport(limits=_http_limits()))
+                _http_client = httpx.Client(transport=transport, timeout=settings.HTTP_TIMEOUT_SECONDS)
+    return _http_client
+
+
+class _LoopLocalAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Un pool de conexiones por event loop: las conexiones async quedan ligadas al loop que
+    las abrió, y el cliente compartido (guardado en los ChatOpenAI/embeddings cacheados)
+    se usa desde varios `asyncio.run` (CLI). Con claves débiles, el pool de un loop
+    descartado se libera junto con él.
+    """
+
+    def __init__(self, factory: Callable[[], httpx.AsyncBaseTransport]):
+        self._factory = factory
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncBaseTransport]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _current(self) -> httpx.AsyncBaseTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = self._factory()
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._current().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        # Solo el pool del loop actual puede cerrarse aquí; los de otros loops mueren con ellos
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Cliente HTTP asíncrono compartido (mismos límites y limitador que el síncrono).
+    El pool de conexiones subyacente es por event loop (`_LoopLocalAsyncTransport`).
+    """
+    global _async_http_client
+    if _async_http_client is None:
+        with _lock:
+            if _async_http_client is None:
+                transport = _LoopLocalAsyncTransport(
+                    lambda: AsyncLimitedTransport(httpx.AsyncHTTPTransport(limits=_http_limits()))
+                )
+                _async_http_client = httpx.AsyncClient(transport=transport, timeout=settings.HTTP_TIMEOUT_SECONDS)
+    return _async_http_client
+
+
+def openai_client_kwargs() -> dict:
+    """Kwargs para `ChatOpenAI` / `OpenAIEmbeddings` que reutilizan el pool HTTP compartido."""
+    return {"http_client": get_http_client(), "http_async_client": get_async_http_client()}
+
+
+def get_chroma_client():
+    """
+    Cliente Chroma único: REST si CHROMA_DB_HOST/PORT están configurados y responde,
+    de lo contrario cliente persistente local sobre CHROMA_DB_PATH.
+    """
+    global _chroma_client, _chroma_kind
+    if _chroma_client is not None:
+        return _chroma_client
+    with _lock:
+        if _chroma_client is not None:
+            return _chroma_client
+        import chromadb  # type: ignore
+        from chromadb.config import Settings as _ChromaCfg  # type: ignore
+
+        cfg = _ChromaCfg(anonymized_telemetry=False)
+        if settings.CHROMA_DB_HOST and settings.CHROMA_DB_PORT:
+            try:
+                _chroma_client = chromadb.HttpClient(host=settings.CHROMA_DB_HOST, port=int(settings.CHROMA_DB_PORT), settings=cfg)
+                _chroma_kind = "http"
+                return _chroma_client
+            except Exception as e:
+                logging.warning(f"Chroma REST no disponible ({e}); usando cliente persistente local.")
+        _chroma_client = chromadb.PersistentClient(path=str(settings.CHROMA_DB_PATH), settings=cfg)
+        _chroma_kind = "persistent"
+        return _chroma_client
+
+
+def chroma_client_kind() -> Optional[str]:
+    """'http' | 'persistent' | None (si aún no se creó el cliente)."""
+    return _chroma_kind
+
+
+def register_shutdown_hook(fn: Callable[[], None]) -> None:
+    """Registra una función a invocar en `shutdown_resources` (p.ej. limpiar caches de módulos)."""
+    with _lock:
+        if fn not in _shutdown_hooks:
+            _shutdown_hooks.append(fn)
+
+
+def startup_resources() -> None:
+    """Crea por adelantado los clientes compartidos (evita el costo en el primer request)."""
+    try:
+        get_http_client()
+        get_async_http_client()
+        get_chroma_client()
+    except Exception as e:
+        logging.warning(f"No se pudieron inicializar todos los recursos compartidos: {e}")
+
+
+async def ashutdown_resources() -> None:
+    """Cierre asíncrono: además de lo síncrono, cierra el cliente HTTP async en su event loop."""
+    global _async_http_client
+    client = _async_http_client
+    _async_http_client = None
+    if client is not None:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+    try:
+        from src.cache import aclose_redis_pools
+
+        await aclose_redis_pools()
+    except Exception:
+        pass
+    shutdown_resources()
+
+
+def shutdown_resources() -> None:
+    """Libera clientes y pools compartidos y ejecuta los hooks registrados."""
+    global _chroma_client, _chroma_kind, _http_client, _async_http_client
+    with _lock:
+        hooks = list(_shutdown_hooks)
+        http_client, _http_client = _http_client, None
+        _async_http_client = None
+        _chroma_client, _chroma_kind = None, None
+    for fn in hooks:
+        try:
+            fn()
+        except Exception as e:
+            logging.debug(f"Shutdown hook falló: {e}")
+    if http_client is not None:
+        try:
+            http_client.close()
+        except Exception:
+            pass
+    try:
+        from src.cache import close_redis_pools
+
+        close_redis_pools()
+    except Exception:
+        pass
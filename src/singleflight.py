@@ -0,0 +1,290 @@
+"""
+Single-flight: coalescencia de cómputos idénticos concurrentes.
+
+Las solicitudes concurrentes con la misma clave esperan un único cómputo en curso
+(tabla de vuelos en proceso, sync y async). Si Redis está configurado, un lock
+distribuido `sf:lock:{key}` coordina además a workers de distintos procesos: el líder
+publica el resultado en `sf:result:{key}` (TTL corto) y los demás lo leen en vez de
+recomputar. Ante cualquier fallo de Redis se computa localmente.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from src.config import settings
+from src.cache import get_async_redis_client, get_redis_client
+
+_RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+_MISSING = object()
+
+_STATS: Dict[str, int] = {"leaders": 0, "coalesced_local": 0, "coalesced_remote": 0, "remote_timeouts": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _STATS_LOCK:
+        _STATS[name] = _STATS.get(name, 0) + 1
+
+
+def singleflight_stats() -> Dict[str, Any]:
+    """Snapshot de los contadores (líderes, coalescidos en proceso / vía Redis)."""
+    with _STATS_LOCK:
+        stats: Dict[str, Any] = dict(_STATS)
+    stats["in_flight"] = len(_sync_calls) + len(_async_calls)
+    stats["enabled"] = settings.SINGLEFLIGHT_ENABLED
+    return stats
+
+
+def _lock_key(key: str) -> str:
+    return f"sf:lock:{key}"
+
+
+def _result_key(key: str) -> str:
+    return f"sf:result:{key}"
+
+
+def _dumps(result: Any) -> Optional[str]:
+    try:
+        return json.dumps(result, ensure_ascii=False)
+    except Exception:
+        return None
+
+
+def _loads(raw: Any) -> Any:
+    return json.loads(raw.decode("utf-8") if isinstance(raw, bytes) else raw)
+
+
+class _LeaderGone(Exception):
+    """El líder en proceso terminó sin resultado ni error propio (cancelado, generador cerrado):
+    los seguidores reintentan (uno pasa a ser líder)."""
+
+
+class LeaderCancelled(Exception):
+    """Base para cancelaciones cooperativas del líder (p.ej. job cancelado): sus seguidores no
+    reciben el error, reintentan como ante `_LeaderGone`."""
+
+
+# --- Variante síncrona (threads: CLI, pipelines en asyncio.to_thread) ---
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.exc: Optional[BaseException] = None
+
+
+_sync_calls: Dict[str, _Call] = {}
+_sync_lock = threading.Lock()
+
+
+def _sync_distributed(key: str, fn: Callable[[], Any]) -> Any:
+    client = get_redis_client(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB)
+    if client is None:
+        return fn()
+    token = uuid.uuid4().hex
+    ttl = settings.SINGLEFLIGHT_LOCK_TTL_SECONDS
+    try:
+        acquired = bool(client.set(_lock_key(key), token, nx=True, px=int(ttl * 1000)))
+        if acquired:
+            client.delete(_result_key(key))
+    except Exception:
+        return fn()
+    if acquired:
+        try:
+            result = fn()
+            payload = _dumps(result)
+            if payload is not None:
+                try:
+                    client.setex(_result_key(key), settings.SINGLEFLIGHT_RESULT_TTL_SECONDS, payload)
+                except Exception:
+                    pass
+            return result
+        finally:
+            try:
+                client.eval(_RELEASE_SCRIPT, 1, _lock_key(key), token)
+            except Exception:
+                pass
+    # Otro worker está computando: esperar su resultado mientras mantenga el lock
+    deadline = time.time() + ttl
+    try:
+        while time.time() < deadline:
+            raw = client.get(_result_key(key))
+            if raw is not None:
+                _count("coalesced_remote")
+                return _loads(raw)
+            if not client.exists(_lock_key(key)):
+                break
+            time.sleep(settings.SINGLEFLIGHT_POLL_INTERVAL)
+        else:
+            _count("remote_timeouts")
+    except Exception:
+        pass
+    return fn()
+
+
+def do(key: str, fn: Callable[[], Any]) -> Any:
+    """Ejecuta `fn()` una sola vez por `key` entre llamadas concurrentes; los seguidores reciben una copia."""
+    if not settings.SINGLEFLIGHT_ENABLED:
+        return fn()
+    with _sync_lock:
+        call = _sync_calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _sync_calls[key] = call
+    if not leader:
+        _count("coalesced_local")
+        call.event.wait()
+        if isinstance(call.exc, _LeaderGone):
+            return do(key, fn)
+        if call.exc is not None:
+            raise call.exc
+        return copy.deepcopy(call.result)
+    _count("leaders")
+    try:
+        result = _sync_distributed(key, fn)
+        # Snapshot para los seguidores: el caller del líder puede mutar su resultado
+        call.result = copy.deepcopy(result)
+        return result
+    except BaseException as e:
+        call.exc = e if isinstance(e, Exception) and not isinstance(e, LeaderCancelled) else _LeaderGone()
+        raise
+    finally:
+        with _sync_lock:
+            _sync_calls.pop(key, None)
+        call.event.set()
+
+
+# --- Variante asíncrona (event loop de la API) ---
+
+_async_calls: Dict[Tuple[int, str], asyncio.Future] = {}
+
+
+class Flight:
+    """Vuelo liderado por el caller: debe cerrarse con `finish(result)` o `fail(exc)`."""
+
+    def __init__(self, key: str, fut: asyncio.Future, client=None, token: Optional[str] = None):
+        self.key = key
+        self._fut = fut
+        self._client = client
+        self._token = token
+
+    async def _release(self) -> None:
+        if self._client is not None and self._token is not None:
+            try:
+                await self._client.eval(_RELEASE_SCRIPT, 1, _lock_key(self.key), self._token)
+            except Exception:
+                pass
+
+    def _close(self) -> None:
+        _async_calls.pop((id(asyncio.get_running_loop()), self.key), None)
+
+    async def finish(self, result: Any) -> None:
+        if self._client is not None and self._token is not None:
+            payload = _dumps(result)
+            if payload is not None:
+                try:
+                    await self._client.setex(_result_key(self.key), settings.SINGLEFLIGHT_RESULT_TTL_SECONDS, payload)
+                except Exception:
+                    pass
+        await self._release()
+        self._close()
+        if not self._fut.done():
+            self._fut.set_result(copy.deepcopy(result))
+
+    async def fail(self, exc: BaseException) -> None:
+        await self._release()
+        self._close()
+        if not self._fut.done():
+            # Cancelación, GeneratorExit (cliente SSE desconectado), KeyboardInterrupt...: no son
+            # errores del cómputo; los seguidores reintentan y uno de ellos pasa a liderar
+            self._fut.set_exception(exc if isinstance(exc, Exception) else _LeaderGone())
+
+
+async def _await_remote(client, key: str) -> Any:
+    deadline = time.time() + settings.SINGLEFLIGHT_LOCK_TTL_SECONDS
+    try:
+        while time.time() < deadline:
+            raw = await client.get(_result_key(key))
+            if raw is not None:
+                _count("coalesced_remote")
+                return _loads(raw)
+            if not await client.exists(_lock_key(key)):
+                return _MISSING
+            await asyncio.sleep(settings.SINGLEFLIGHT_POLL_INTERVAL)
+        _count("remote_timeouts")
+    except Exception:
+        pass
+    return _MISSING
+
+
+async def ajoin(key: str) -> Tuple[bool, Any]:
+    """
+    Si hay un vuelo en curso para `key` (en proceso u otro worker vía Redis), lo espera y
+    retorna (True, resultado). Si no, registra al caller como líder y retorna (False, Flight).
+    """
+    loop = asyncio.get_running_loop()
+    table_key = (id(loop), key)
+    while True:
+        fut = _async_calls.get(table_key)
+        if fut is None:
+            break
+        _count("coalesced_local")
+        try:
+            return True, copy.deepcopy(await asyncio.shield(fut))
+        except _LeaderGone:
+            continue  # reintentar: otro seguidor (o este) pasa a liderar
+
+    fut = loop.create_future()
+    # Evitar "exception was never retrieved" si nadie espera al líder
+    fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _async_calls[table_key] = fut
+    _count("leaders")
+    flight = Flight(key, fut)
+
+    client = get_async_redis_client(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB)
+    if client is None:
+        return False, flight
+    token = uuid.uuid4().hex
+    try:
+        ttl_ms = int(settings.SINGLEFLIGHT_LOCK_TTL_SECONDS * 1000)
+        if await client.set(_lock_key(key), token, nx=True, px=ttl_ms):
+            await client.delete(_result_key(key))
+            return False, Flight(key, fut, client, token)
+    except Exception as e:
+        logging.debug(f"single-flight: lock Redis no disponible ({e}); coalescencia solo en proceso")
+        return False, flight
+    # Otro worker lidera: sus resultados también sirven a los seguidores locales
+    try:
+        result = await _await_remote(client, key)
+    except BaseException as e:
+        await flight.fail(e)
+        raise
+    if result is _MISSING:
+        return False, flight
+    await flight.finish(result)
+    return True, copy.deepcopy(result)
+
+
+async def ado(key: str, afn: Callable[[], Awaitable[Any]]) -> Any:
+    """Versión async de `do`: `await afn()` una sola vez por `key` entre requests concurrentes."""
+    if not settings.SINGLEFLIGHT_ENABLED:
+        return await afn()
+    joined, value = await ajoin(key)
+    if joined:
+        return value
+    try:
+        result = await afn()
+    except BaseException as e:
+        await value.fail(e)
+        raise
+    await value.finish(result)
+    return result
@@ -0,0 +1,189 @@
+"""
+Índice local en memoria de técnicas MITRE ATT&CK a partir de bundles STIX en disco.
+
+Carga una única vez los JSON `{enterprise,mobile,ics}-attack.json` (los mismos que
+pre-descarga `docker/Dockerfile.mitre-mcp`) y construye:
+- id externo (T1110, T1110.003) → técnica,
+- nombre (lowercase) → técnica,
+- índice invertido token → técnicas sobre nombre + descripción.
+
+Expone la misma interfaz que usan las herramientas sobre `attackcti.attack_client`
+(`get_techniques_by_content`, `get_technique_by_id`), sin red y en microsegundos.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_DOMAINS = ("enterprise", "mobile", "ics")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _version_key(path: Path) -> tuple:
+    # Directorios tipo v17.1/ (layout de mitre-attack-mcp): preferir la versión más nueva
+    return tuple(int(n) for n in re.findall(r"\d+", path.parent.name)) or (0,)
+
+
+def find_bundle_files(root: Optional[str] = None) -> List[Path]:
+    """Bundles STIX bajo `root` (archivo o directorio); uno por dominio, la versión más nueva."""
+    base = Path(root or settings.MITRE_STIX_PATH or "")
+    if not str(base) or not base.exists():
+        return []
+    if base.is_file():
+        return [base]
+    latest: Dict[str, Path] = {}
+    for path in base.rglob("*-attack.json"):
+        current = latest.get(path.name)
+        if current is None or _version_key(path) > _version_key(current):
+            latest[path.name] = path
+    order = {f"{d}-attack.json": i for i, d in enumerate(_DOMAINS)}
+    return sorted(latest.values(), key=lambda p: (order.get(p.name, len(order)), p.name))
+
+
+def _to_technique(obj: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Convierte un `attack-pattern` STIX al dict que consumen las herramientas MITRE."""
+    external_id = None
+    references = []
+    for ref in obj.get("external_references", []) or []:
+        if ref.get("source_name") in ("mitre-attack", "mitre-mobile-attack", "mitre-ics-attack") and not external_id:
+            external_id = ref.get("external_id")
+        if ref.get("url"):
+            references.append({"source_name": ref.get("source_name"), "url": ref["url"]})
+    if not external_id:
+        return None
+    return {
+        "id": external_id,
+        "stix_id": obj.get("id"),
+        "name": obj.get("name", ""),
+        "description": obj.get("description", "") or "",
+        "tactics": [{"name": p.get("phase_name")} for p in obj.get("kill_chain_phases", []) or [] if p.get("phase_name")],
+        "platforms": obj.get("x_mitre_platforms", []) or [],
+        "data_sources": obj.get("x_mitre_data_sources", []) or [],
+        "detection": obj.get("x_mitre_detection") or "No detection guidance available.",
+        "references": references,
+        "is_subtechnique": bool(obj.get("x_mitre_is_subtechnique")),
+    }
+
+
+class AttackIndex:
+    """Índice de técnicas en memoria; compatible con el subconjunto de `attack_client` que usamos."""
+
+    is_local = True
+
+    def __init__(self, techniques: Iterable[Dict[str, Any]]):
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self._texts: Dict[str, str] = {}
+        self._inverted: Dict[str, set] = {}
+        self._order: Dict[str, int] = {}
+        for tech in techniques:
+            tid = tech["id"].upper()
+            if tid in self.by_id:
+                continue
+            self.by_id[tid] = tech
+            self.by_name.setdefault(tech["name"].lower(), tech)
+            self._order[tid] = len(self._order)
+            text = f"{tid}\n{tech['name']}\n{tech['description']}".lower()
+            self._texts[tid] = text
+            for tok in set(_tokens(text)):
+                self._inverted.setdefault(tok, set()).add(tid)
+        self._vocab = sorted(self._inverted)
+        self._postings = lru_cache(maxsize=4096)(self._postings_uncached)
+
+    @classmethod
+    def from_bundles(cls, paths: Iterable[Path]) -> "AttackIndex":
+        techniques = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as fh:
+                bundle = json.load(fh)
+            for obj in bundle.get("objects", []):
+                if obj.get("type") != "attack-pattern" or obj.get("revoked") or obj.get("x_mitre_deprecated"):
+                    continue
+                tech = _to_technique(obj)
+                if tech is not None:
+                    techniques.append(tech)
+        return cls(techniques)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def _postings_uncached(self, token: str) -> frozenset:
+        exact = self._inverted.get(token)
+        if exact is not None:
+            return frozenset(exact)
+        # Semántica de substring de attackcti ("phish" ⊂ "phishing"): unir tokens que lo contienen
+        ids: set = set()
+        for word in self._vocab:
+            if token in word:
+                ids |= self._inverted[word]
+        return frozenset(ids)
+
+    def get_techniques_by_content(self, content: str) -> List[Dict[str, Any]]:
+        """Técnicas cuyo nombre o descripción contienen `content` (case-insensitive)."""
+        needle = (content or "").lower().strip()
+        toks = _tokens(needle)
+        if not toks:
+            return []
+        candidates = None
+        for tok in sorted(set(toks), key=len, reverse=True):
+            posting = self._postings(tok)
+            candidates = posting if candidates is None else candidates & posting
+            if not candidates:
+                return []
+        hits = [tid for tid in candidates if needle in self._texts[tid]]
+
+        def _rank(tid: str):
+            name = self.by_id[tid]["name"].lower()
+            return (name != needle, needle not in name, -self._texts[tid].count(needle), self._order[tid])
+
+        return [self.by_id[tid] for tid in sorted(hits, key=_rank)]
+
+    def get_technique_by_id(self, technique_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get((technique_id or "").strip().upper())
+
+    def get_technique_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.by_name.get((name or "").strip().lower())
+
+
+_index: Optional[AttackIndex] = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_attack_index() -> Optional[AttackIndex]:
+    """Índice del proceso (carga perezosa, una sola vez); None si no hay bundles STIX en disco."""
+    global _index, _index_loaded
+    if _index_loaded:
+        return _index
+    with _index_lock:
+        if not _index_loaded:
+            paths = find_bundle_files()
+            if paths:
+                try:
+                    _index = AttackIndex.from_bundles(paths)
+                    logger.info(f"Índice ATT&CK local: {len(_index)} técnicas desde {[p.name for p in paths]}")
+                except Exception as e:
+                    logger.warning(f"No se pudo cargar el índice ATT&CK local ({e}); se usará attackcti")
+                    _index = None
+            _index_loaded = True
+    return _index
+
+
+def reset_attack_index() -> None:
+    global _index, _index_loaded
+    with _index_lock:
+        _index, _index_loaded = None, False
@@ -1,8 +1,13 @@
 from crewai.tools import tool
-from typing import Any
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import threading
 from attackcti import attack_client
+from src.config import settings
 from src.logging_config import logging
 import json
+from src.resources import register_shutdown_hook
+from src.tools.attack_index import get_attack_index
 from src.trace import get_trace_logger
 
 
@@ -11,6 +16,9 @@ logger = logging.getLogger(__name__)
 
 # Inicializa el cliente para la API de MITRE ATT&CK.
 _attack = None
+_attack_lock = threading.Lock()
+# Pool de threads para resolver búsquedas por keyword en paralelo (batch de hallazgos)
+_pool: Optional[ThreadPoolExecutor] = None
 
 def normalize_query(query):
     # Recursively extract 'description' if present, until a string or None
@@ -28,16 +36,94 @@ def normalize_query(query):
 
 
 def get_attack_client():
+    """
+    Cliente MITRE según MITRE_ATTACK_SOURCE: 'auto' usa el índice local (bundles STIX en
+    MITRE_STIX_PATH) si existe y si no attackcti (TAXII); 'local' / 'taxii' fuerzan uno.
+    """
     global _attack
     if _attack is None:
-        _attack = attack_client()
+        # Lock: el batch puede pedir el cliente desde varios threads a la vez
+        with _attack_lock:
+            if _attack is None:
+                source = (settings.MITRE_ATTACK_SOURCE or "auto").lower()
+                index = get_attack_index() if source in ("auto", "local") else None
+                if index is None and source == "local":
+                    raise RuntimeError(f"MITRE_ATTACK_SOURCE=local pero no hay bundles STIX en '{settings.MITRE_STIX_PATH}'")
+                if index is None:
+                    if source == "auto":
+                        # Camino lento (descarga TAXII en el primer uso): dejarlo visible en los logs
+                        logger.warning(
+                            f"MITRE_ATTACK_SOURCE=auto sin bundles STIX en '{settings.MITRE_STIX_PATH}': "
+                            "se usa attackcti (TAXII, requiere red)"
+                        )
+                    index = attack_client()
+                _attack = index
     return _attack
 
 
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _attack_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=max(1, settings.MITRE_ENRICH_MAX_WORKERS),
+                    thread_name_prefix="mitre-enrich",
+                )
+    return _pool
+
+
+def _shutdown_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+register_shutdown_hook(_shutdown_pool)
+
+
 def _generate_keywords(query: str) -> list:
     # Hook para integración futura de LLM para generar keywords más efectivas
-    # Por ahora, solo retorna la query original y su lower
-    return [query, query.lower()]
+    # Por ahora, solo retorna la query original y su lower (sin repetir ni vacías)
+    return [kw for kw in dict.fromkeys([query, query.lower()]) if kw]
+
+
+def _search_keyword(client, kw: str) -> list:
+    try:
+        return client.get_techniques_by_content(kw) or []
+    except Exception as e:
+        logger.warning(f"Error searching with keyword '{kw}': {e}")
+        return []
+
+
+def _search_keywords(client, keywords: List[str]) -> Dict[str, list]:
+    """Resultados por keyword; con más de una keyword las búsquedas corren en el pool."""
+    keywords = list(dict.fromkeys(keywords))
+    # El índice local responde en memoria: el fan-out a threads solo suma overhead
+    if len(keywords) <= 1 or getattr(client, "is_local", False):
+        return {kw: _search_keyword(client, kw) for kw in keywords}
+    results = _get_pool().map(lambda kw: _search_keyword(client, kw), keywords)
+    return dict(zip(keywords, results))
+
+
+def _unique_techniques(results: List[list], limit: int = 5) -> list:
+    # Remove duplicates by ID preserving first occurrence
+    unique_map = {}
+    for batch in results:
+        for tech in batch:
+            if isinstance(tech, dict) and "id" in tech and tech["id"] not in unique_map:
+                unique_map[tech["id"]] = tech
+    return list(unique_map.values())[:limit]
+
+
+def _format_techniques(techniques: list) -> str:
+    return "\n".join(
+        f"- ID: {tech['id']}\n"
+        f"  Name: {tech['name']}\n"
+        f"  Description: {tech.get('description', '').split('.')[0]}."
+        for tech in techniques
+    )
 
 
 def _mitre_attack_query_tool(query: Any) -> str:
@@ -58,44 +144,25 @@ def _mitre_attack_query_tool(query: Any) -> str:
     try:
         client = get_attack_client()
         keywords = _generate_keywords(query)
-        all_results = []
-        for kw in keywords:
-            try:
-                results = client.get_techniques_by_content(kw)
-                if results:
-                    all_results.extend(results)
-            except Exception as e:
-                logger.warning(f"Error searching with keyword '{kw}': {e}")
-
-        # Remove duplicates by ID preserving first occurrence
-        unique_map = {}
-        for tech in all_results:
-            if isinstance(tech, dict) and "id" in tech and tech["id"] not in unique_map:
-                unique_map[tech["id"]] = tech
-        unique = unique_map.values()
+        by_kw = _search_keywords(client, keywords)
+        unique = _unique_techniques([by_kw[kw] for kw in keywords])  # Limit to the 5 most relevant results
         if not unique:
             logger.error(
                 f"No MITRE ATT&CK techniques found for query: '{query}'."
             )
             return f"No MITRE ATT&CK techniques found for query: '{query}'."
 
-        formatted_results = []
-        for tech in list(unique)[:5]:  # Limit to the 5 most relevant results
-            formatted_results.append(
-                f"- ID: {tech['id']}\n"
-                f"  Name: {tech['name']}\n"
-                f"  Description: {tech.get('description', '').split('.')[0]}."
-            )
-        logger.info(f"Techniques found: {[t['id'] for t in list(unique)[:5]]}")
+        formatted = _format_techniques(unique)
+        logger.info(f"Techniques found: {[t['id'] for t in unique]}")
         if tlogger:
             tlogger.info(
                 "tool_result",
                 extra={
                     "task_name": "MITRE ATT&CK Technique Query Tool",
-                    "output_data": "\n".join(formatted_results)[:1000],
+                    "output_data": formatted[:1000],
                 },
             )
-        return "\n".join(formatted_results)
+        return formatted
     except Exception as e:
         logger.error(f"An error occurred while searching MITRE ATT&CK: {e}")
         if tlogger:
@@ -108,6 +175,79 @@ def _mitre_attack_query_tool(query: Any) -> str:
 mitre_attack_query_tool = tool("MITRE ATT&CK Technique Query Tool")(_mitre_attack_query_tool)
 
 
+def _finding_query(item: Any) -> str:
+    """Texto de búsqueda de un hallazgo: el nombre corto matchea mejor que la descripción larga."""
+    if isinstance(item, dict):
+        for key in ("query", "detector_name", "name", "threat", "risk_description"):
+            value = item.get(key)
+            if isinstance(value, str) and value.strip():
+                return value.strip()
+    return normalize_query(item).strip()
+
+
+def _normalize_findings(findings: Any) -> List[str]:
+    # CrewAI puede pasar un JSON serializado, {"findings": [...]}, una lista de dicts o de strings
+    if isinstance(findings, str):
+        try:
+            findings = json.loads(findings)
+        except ValueError:
+            findings = [line.strip(" -*") for line in findings.splitlines()]
+    if isinstance(findings, dict):
+        for key in ("findings", "queries", "threats"):
+            if key in findings:
+                return _normalize_findings(findings[key])
+        findings = [findings]
+    if not isinstance(findings, (list, tuple)):
+        findings = [findings]
+    queries = [q for q in (_finding_query(f) for f in findings) if q]
+    return list(dict.fromkeys(queries))[: max(1, settings.MITRE_BATCH_MAX_FINDINGS)]
+
+
+def _mitre_batch_enrichment_tool(findings: Any) -> str:
+    """
+    Maps ALL analyzer findings to MITRE ATT&CK techniques in a single call.
+    Pass the list of findings (names or short descriptions), e.g. {"findings": ["Credential Stuffing", "Phishing"]}.
+    Returns the candidate techniques grouped by finding; prefer it over querying findings one by one.
+    """
+    queries = _normalize_findings(findings)
+    logger.info(f"Batch MITRE ATT&CK enrichment for {len(queries)} findings")
+    tlogger = get_trace_logger()
+    if tlogger:
+        tlogger.info(
+            "tool_invocation",
+            extra={"task_name": "MITRE ATT&CK Batch Enrichment Tool", "input_data": {"findings": queries}},
+        )
+    if not queries:
+        return "No findings received. Pass a list of finding names, e.g. {\"findings\": [\"Credential Stuffing\"]}."
+    try:
+        client = get_attack_client()
+        keywords_by_query = {q: _generate_keywords(q) for q in queries}
+        # Todas las keywords de todos los hallazgos en un único fan-out (las repetidas se buscan una vez)
+        by_kw = _search_keywords(client, [kw for kws in keywords_by_query.values() for kw in kws])
+        sections = []
+        for i, q in enumerate(queries, 1):
+            unique = _unique_techniques([by_kw[kw] for kw in keywords_by_query[q]])
+            body = _format_techniques(unique) if unique else f"No MITRE ATT&CK techniques found for query: '{q}'."
+            sections.append(f"### Finding {i}: {q}\n{body}")
+        out = "\n\n".join(sections)
+        if tlogger:
+            tlogger.info(
+                "tool_result",
+                extra={"task_name": "MITRE ATT&CK Batch Enrichment Tool", "output_data": out[:1000]},
+            )
+        return out
+    except Exception as e:
+        logger.error(f"An error occurred during batch MITRE ATT&CK enrichment: {e}")
+        if tlogger:
+            tlogger.info(
+                "tool_error",
+                extra={"task_name": "MITRE ATT&CK Batch Enrichment Tool", "output_data": str(e)},
+            )
+        return f"An error occurred during batch MITRE ATT&CK enrichment: {e}"
+
+mitre_batch_enrichment_tool = tool("MITRE ATT&CK Batch Enrichment Tool")(_mitre_batch_enrichment_tool)
+
+
 @tool("MITRE ATT&CK Technique Details Tool")
 def get_mitre_technique_details(technique_id_or_name: str) -> str:
     """
@@ -123,6 +263,10 @@ def get_mitre_technique_details(technique_id_or_name: str) -> str:
             tech = client.get_technique_by_id(technique_id_or_name)
             # If not found, get_technique_by_id may return None
 
+        # Índice local: lookup directo por nombre antes de la búsqueda por contenido
+        if tech is None and hasattr(client, "get_technique_by_name"):
+            tech = client.get_technique_by_name(technique_id_or_name)
+
         # If not found by ID, try to find by name
         if tech is None:
             # Search by content and pick the first exact match by name
@@ -1,10 +1,8 @@
 import logging
-import math
-from langchain_openai import OpenAIEmbeddings
-from src.config import settings
-from src.rag_system.retriever_factory import CohereRerank  # may be None
-from src.rag_system.retriever_factory import create_advanced_retriever, get_rag_chain
+from src.rag_system.embeddings import get_embeddings
 from src.config import settings
+from src.rag_system.retriever_factory import create_advanced_retriever, get_rag_chain, get_doc_embeddings, retrieve_context_docs, format_context
+from src.rag_system.mmr import mmr_select
 
 
 
@@ -32,53 +30,14 @@ def query_dbir_report(query: str) -> str:
 
 async def ask_rag(question: str) -> dict:
     """
-    Ejecuta una consulta directa al RAG devolviendo la respuesta y un preview del contexto.
+    Ejecuta una consulta directa al RAG devolviendo la respuesta y el contexto exacto que vio el LLM.
     """
     try:
-        retriever = create_advanced_retriever(
-            chroma_path=settings.CHROMA_DB_PATH,
-            collection_name=settings.COLLECTION_NAME,
-            openai_api_key=settings.OPENAI_API_KEY,
-            cohere_api_key=getattr(settings, "COHERE_API_KEY", None),
-        )
-        # Recuperar docs con compatibilidad moderna
-        docs = _get_docs(retriever, question)
-
-        # Turbo: sin Cohere y sin MMR; Heavy: MMR si no hay Cohere
-        if not settings.is_turbo and docs:
-            use_cohere = bool(getattr(settings, "COHERE_API_KEY", None)) and CohereRerank is not None
-            if not use_cohere:
-                emb = OpenAIEmbeddings(model="text-embedding-3-small", api_key=settings.OPENAI_API_KEY)
-                def cosine(a, b):
-                    dot = sum(x*y for x, y in zip(a, b))
-                    na = math.sqrt(sum(x*x for x in a))
-                    nb = math.sqrt(sum(y*y for y in b))
-                    return dot / (na * nb + 1e-10)
-                q = emb.embed_query(question)
-                docs = list(docs)[:20]
-                D = [emb.embed_query(getattr(d, 'page_content', str(d))[:2000]) for d in docs]
-                sims_q = [cosine(q, d) for d in D]
-                selected_idx = []
-                first = max(range(len(docs)), key=lambda i: sims_q[i])
-                selected_idx.append(first)
-                while len(selected_idx) < min(5, len(docs)):
-                    best_i = None; best_score = -1e9
-                    for i in range(len(docs)):
-                        if i in selected_idx:
-                            continue
-                        max_sim_to_S = max(cosine(D[i], D[j]) for j in selected_idx) if selected_idx else 0.0
-                        score = 0.5 * sims_q[i] - 0.5 * max_sim_to_S
-                        if score > best_score:
-                            best_score = score; best_i = i
-                    if best_i is None:
-                        break
-                    selected_idx.append(best_i)
-                docs = [docs[i] for i in selected_idx]
-
-        context = "\n---\n".join(getattr(d, 'page_content', str(d)) for d in docs[:5])
+        # Una sola recuperación: los mismos docs alimentan al LLM y al preview devuelto
+        docs = retrieve_context_docs(question)
         chain = get_rag_chain()
-        answer = chain.invoke(question)
-        return {"answer": answer, "context": context}
+        answer = chain.invoke({"question": question, "docs": docs})
+        return {"answer": answer, "context": format_context(docs)}
     except Exception as e:
         logging.error(f"Error in ask_rag: {e}")
         return {"answer": "", "context": ""}
@@ -98,33 +57,11 @@ async def get_docs_with_scores(question: str) -> list[dict]:
             cohere_api_key=getattr(settings, "COHERE_API_KEY", None),
         )
         docs = _get_docs(retriever, question)
-        emb = OpenAIEmbeddings(model="text-embedding-3-small", api_key=settings.OPENAI_API_KEY)
-        q = emb.embed_query(question)
-        def cosine(a, b):
-            dot = sum(x*y for x, y in zip(a, b))
-            na = math.sqrt(sum(x*x for x in a))
-            nb = math.sqrt(sum(y*y for y in b))
-            return dot / (na * nb + 1e-10)
-        docs = list(docs)[:20]
-        D = [emb.embed_query(getattr(d, 'page_content', str(d))[:2000]) for d in docs]
-        sims = [cosine(q, d) for d in D]
-        # Selección MMR 5 docs
-        selected_idx = []
-        if sims:
-            first = max(range(len(docs)), key=lambda i: sims[i])
-            selected_idx.append(first)
-            while len(selected_idx) < min(5, len(docs)):
-                best_i = None; best_score = -1e9
-                for i in range(len(docs)):
-                    if i in selected_idx:
-                        continue
-                    max_sim_to_S = max(cosine(D[i], D[j]) for j in selected_idx) if selected_idx else 0.0
-                    score = 0.5 * sims[i] - 0.5 * max_sim_to_S
-                    if score > best_score:
-                        best_score = score; best_i = i
-                if best_i is None:
-                    break
-                selected_idx.append(best_i)
+        q = get_embeddings().embed_query(question)
+        docs = list(docs)[:settings.MMR_FETCH_K]
+        # Vectores almacenados en Chroma (sin re-embeber cada chunk) + selección MMR
+        D = get_doc_embeddings(docs)
+        selected_idx, sims = mmr_select(q, D, top_n=settings.MMR_TOP_N, lambda_mult=settings.MMR_LAMBDA)
         for i, d in enumerate(docs):
             results.append({
                 "score": round(sims[i], 6) if i < len(sims) else 0.0,
@@ -1,18 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import json
+import logging
+import threading
 import time
-from typing import Any, Dict
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Tuple
 
 from src.config import settings
 from src.models import FinalReport
-from src.cache import cache_get, cache_set
+from src.cache import acache_get, acache_set, aget_ingest_stamp, cache_get, cache_set, get_ingest_stamp
 from src.rag_system.retriever_factory import create_advanced_retriever
+from src.rag_system.embeddings import get_embeddings
+from src.resources import openai_client_kwargs, register_shutdown_hook
+from src import singleflight
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_core.runnables import RunnableLambda
+from langchain_core.output_parsers import StrOutputParser
 
 
 def _norm_question(q: str) -> str:
@@ -24,12 +30,25 @@ def _norm_question(q: str) -> str:
     return " ".join(q.split())[:300]
 
 
-def _ingest_id() -> str:
-    # versionar por path + nombre de colección
-    raw = f"{settings.CHROMA_DB_PATH}:{settings.COLLECTION_NAME}"
+def _ingest_id_from_stamp(stamp: str) -> str:
+    # versionar por path + nombre de colección + sello de la última ingesta
+    raw = f"{settings.CHROMA_DB_PATH}:{settings.COLLECTION_NAME}:{stamp}"
     return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
 
 
+def _ingest_id() -> str:
+    stamp = get_ingest_stamp(settings.COLLECTION_NAME, host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+    return _ingest_id_from_stamp(stamp)
+
+
+async def _aingest_id() -> str:
+    try:
+        stamp = await aget_ingest_stamp(settings.COLLECTION_NAME, host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+    except Exception:
+        stamp = ""
+    return _ingest_id_from_stamp(stamp)
+
+
 def _strip_code_fences(s: str) -> str:
     s = s.strip()
     if s.startswith("```"):
@@ -62,7 +81,127 @@ def _parse_json_output(text: str) -> Dict[str, Any] | None:
     return None
 
 
-CACHE_VERSION = "v3"
+CACHE_VERSION = "v4"
+
+# Contadores del caché de reportes (hit / miss / stale / error)
+_CACHE_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "stale": 0, "errors": 0, "writes": 0}
+_CACHE_STATS_LOCK = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _CACHE_STATS_LOCK:
+        _CACHE_STATS[name] = _CACHE_STATS.get(name, 0) + 1
+
+
+def get_report_cache_stats() -> Dict[str, Any]:
+    """Snapshot de los contadores del caché de reportes turbo."""
+    with _CACHE_STATS_LOCK:
+        stats: Dict[str, Any] = dict(_CACHE_STATS)
+    lookups = stats["hits"] + stats["misses"] + stats["stale"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["version"] = CACHE_VERSION
+    return stats
+
+
+def reset_report_cache_stats() -> None:
+    with _CACHE_STATS_LOCK:
+        for k in _CACHE_STATS:
+            _CACHE_STATS[k] = 0
+
+
+def _report_cache_key(qn: str, ingest_id: str | None = None, mode: str = "turbo") -> str:
+    # También es la clave de single-flight (con mode="heavy" para la crew)
+    ingest_id = ingest_id or _ingest_id()
+    return f"{mode}:{CACHE_VERSION}:report:{ingest_id}:{hashlib.sha1(qn.encode('utf-8')).hexdigest()}"
+
+
+def _decode_cached_report(raw: str | None, ingest_id: str) -> Dict[str, Any] | None:
+    """
+    Solo devuelve entradas con la versión/ingesta actuales que validan contra
+    FinalReport; el resto cuenta como 'stale'.
+    """
+    if raw is None:
+        _count("misses")
+        return None
+    try:
+        envelope = json.loads(raw)
+        if not isinstance(envelope, dict) or envelope.get("version") != CACHE_VERSION or envelope.get("ingest_id") != ingest_id:
+            raise ValueError("legacy or foreign cache entry")
+        report = envelope.get("report")
+        FinalReport.model_validate(report)
+    except Exception:
+        _count("stale")
+        return None
+    _count("hits")
+    return report
+
+
+def _encode_cached_report(ingest_id: str, data: Dict[str, Any]) -> str | None:
+    try:
+        FinalReport.model_validate(data)
+    except Exception:
+        return None
+    return json.dumps({"version": CACHE_VERSION, "ingest_id": ingest_id, "report": data}, ensure_ascii=False)
+
+
+def _read_cached_report(cache_key: str, ingest_id: str) -> Dict[str, Any] | None:
+    """Lectura read-through del reporte cacheado (ver `_decode_cached_report`)."""
+    try:
+        raw = cache_get(cache_key, host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+    except Exception:
+        _count("errors")
+        return None
+    return _decode_cached_report(raw, ingest_id)
+
+
+async def _aread_cached_report(cache_key: str, ingest_id: str) -> Dict[str, Any] | None:
+    try:
+        raw = await acache_get(cache_key, host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+    except Exception:
+        _count("errors")
+        return None
+    return _decode_cached_report(raw, ingest_id)
+
+
+def _write_cached_report(cache_key: str, ingest_id: str, data: Dict[str, Any], ttl_seconds: int | None = None) -> bool:
+    """Persiste el reporte envuelto con versión e ingest_id; ignora reportes que no validan."""
+    payload = _encode_cached_report(ingest_id, data)
+    if payload is None:
+        return False
+    try:
+        cache_set(
+            cache_key,
+            payload,
+            ttl_seconds=ttl_seconds or settings.REPORT_CACHE_TTL_SECONDS,
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+        )
+    except Exception:
+        _count("errors")
+        return False
+    _count("writes")
+    return True
+
+
+async def _awrite_cached_report(cache_key: str, ingest_id: str, data: Dict[str, Any], ttl_seconds: int | None = None) -> bool:
+    payload = _encode_cached_report(ingest_id, data)
+    if payload is None:
+        return False
+    try:
+        await acache_set(
+            cache_key,
+            payload,
+            ttl_seconds=ttl_seconds or settings.REPORT_CACHE_TTL_SECONDS,
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+        )
+    except Exception:
+        _count("errors")
+        return False
+    _count("writes")
+    return True
 
 
 def _normalize_report(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -227,22 +366,34 @@ def _derive_detectors_from_docs(docs: list, existing_names: set[str], needed: in
     return out
 
 
-def run_turbo_pipeline(user_input: str) -> Dict[str, Any]:
-    """
-    Pipeline rápido sin CrewAI: recupera contexto DBIR y genera el reporte final JSON.
-    Cachea resultados por pregunta normalizada + ingest_id.
-    """
-    # Permitir invocación explícita desde el endpoint con `mode=turbo`,
-    # independientemente del valor global de `ANALYZER_MODE`.
+# Prompt compacto con reglas de calidad (JSON estricto, exactamente 5 detectores)
+_TURBO_TEMPLATE = (
+    'You are a senior cybersecurity reporter. Using ONLY the DBIR 2025 context, '
+    'return a STRICT JSON FinalReport with fields: report_id (string), application_name (string), summary (string), '
+    'prioritized_detectors (list of exactly 5 Detector objects). Detector rules: '
+    'name is a concise technical noun phrase (8–120 chars, not narrative), description is specific (40–600 chars, not equal to name; aim 60–120 chars), '
+    'actionable_steps has exactly 3 distinct items, severity is one of ["High","Medium","Low"]. '
+    'Output ONLY raw JSON (no prose, no markdown, no backticks).\n\n'
+    '{format_instructions}\n\n'
+    'User Input: {user_input}\n\nContext:\n{context}\n'
+)
+_REPAIR_TEMPLATE = (
+    'Your previous output did not validate against the FinalReport + Detector constraints. '
+    'Return a STRICT valid JSON with the exact keys and shapes described here: {format_instructions}\n\n'
+    'User Input: {user_input}\n\nContext:\n{context}\n'
+)
+_FORMAT_INSTRUCTIONS = (
+    'Format: a single JSON object with EXACTLY these top-level keys: '
+    '"report_id", "application_name", "summary", "prioritized_detectors". '
+    'The value of "prioritized_detectors" is an array of up to 5 objects where each object has keys '
+    '"detector_name" (8-120 chars noun phrase), "description" (40-600 chars), '
+    '"actionable_steps" (array with exactly 3 strings), and "severity" ("High"|"Medium"|"Low").'
+)
 
-    # Cache lookup
-    qn = _norm_question(user_input)
-    cache_key = f"turbo:{CACHE_VERSION}:report:{_ingest_id()}:{hashlib.sha1(qn.encode('utf-8')).hexdigest()}"
-    # Deshabilitar lectura de caché para evitar formatos legados
-    cached = None
 
+def _turbo_retriever():
     # Build retriever once (factory ya cachea en TURBO)
-    retriever = create_advanced_retriever(
+    return create_advanced_retriever(
         chroma_path=settings.CHROMA_DB_PATH,
         collection_name=settings.COLLECTION_NAME,
         openai_api_key=settings.OPENAI_API_KEY,
@@ -250,101 +401,169 @@ def run_turbo_pipeline(user_input: str) -> Dict[str, Any]:
         force_turbo=True,
     )
 
-    last_docs: list | None = None
-    def build_context(question: str) -> str:
-        nonlocal last_docs
-        try:
-            if hasattr(retriever, "invoke"):
-                docs = retriever.invoke(question)
-            else:
-                docs = retriever.get_relevant_documents(question)
-        except Exception:
-            docs = []
-        last_docs = list(docs) if docs else []
-        texts = []
-        for d in list(docs)[:5]:
-            content = getattr(d, "page_content", str(d))
-            texts.append(content)
-        return "\n---\n".join(texts)
-
-    # Prompt compacto con reglas de calidad (JSON estricto, exactamente 5 detectores)
-    template = (
-        'You are a senior cybersecurity reporter. Using ONLY the DBIR 2025 context, '
-        'return a STRICT JSON FinalReport with fields: report_id (string), application_name (string), summary (string), '
-        'prioritized_detectors (list of exactly 5 Detector objects). Detector rules: '
-        'name is a concise technical noun phrase (8–120 chars, not narrative), description is specific (40–600 chars, not equal to name; aim 60–120 chars), '
-        'actionable_steps has exactly 3 distinct items, severity is one of ["High","Medium","Low"]. '
-        'Output ONLY raw JSON (no prose, no markdown, no backticks).\n\n'
-        '{format_instructions}\n\n'
-        'User Input: {user_input}\n\nContext:\n{context}\n'
-    )
-    prompt = ChatPromptTemplate.from_template(template)
-    # LLM con tokens acotados para turbo
-    llm = ChatOpenAI(model=settings.OPENAI_MODEL_NAME, temperature=0.1, api_key=settings.OPENAI_API_KEY, max_tokens=1024)
-
-    json_parser = JsonOutputParser()
-    fmt_instructions = (
-        'Format: a single JSON object with EXACTLY these top-level keys: '
-        '"report_id", "application_name", "summary", "prioritized_detectors". '
-        'The value of "prioritized_detectors" is an array of up to 5 objects where each object has keys '
-        '"detector_name" (8-120 chars noun phrase), "description" (40-600 chars), '
-        '"actionable_steps" (array with exactly 3 strings), and "severity" ("High"|"Medium"|"Low").'
-    )
-    chain_json = (
-        {"context": RunnableLambda(build_context), "user_input": RunnableLambda(lambda x: user_input), "format_instructions": RunnableLambda(lambda _: fmt_instructions)}
-        | prompt
-        | llm
-        | json_parser
-    )
-    chain_text = (
-        {"context": RunnableLambda(build_context), "user_input": RunnableLambda(lambda x: user_input), "format_instructions": RunnableLambda(lambda _: fmt_instructions)}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
 
-    t0 = time.perf_counter()
+def _docs_to_context(docs) -> str:
+    texts = []
+    for d in list(docs or [])[:5]:
+        content = getattr(d, "page_content", str(d))
+        texts.append(content)
+    return "\n---\n".join(texts)
+
+
+def _build_context(inp: Dict[str, Any]) -> str:
     try:
-        out = chain_json.invoke(qn)
+        retriever = _turbo_retriever()
+        if hasattr(retriever, "invoke"):
+            docs = retriever.invoke(inp["question"])
+        else:
+            docs = retriever.get_relevant_documents(inp["question"])
     except Exception:
-        out = chain_text.invoke(qn)
-    dt = (time.perf_counter() - t0) * 1000.0
+        docs = []
+    return _docs_to_context(docs)
+
+
+def warm_turbo_retriever() -> None:
+    """Construye el retriever TURBO (vectorstore + cliente Chroma) en el arranque de la API."""
+    try:
+        _turbo_retriever()
+    except Exception as e:
+        logging.warning(f"Warmup del retriever TURBO falló: {e}")
+
+
+def _search_docs(question: str) -> list:
+    retriever = _turbo_retriever()
+    if hasattr(retriever, "invoke"):
+        return list(retriever.invoke(question) or [])
+    return list(retriever.get_relevant_documents(question) or [])
+
+
+async def _afetch_docs(question: str) -> list:
+    """
+    Solo el embedding de la pregunta es async de punta a punta (queda en el caché de
+    embeddings). Chroma no tiene cliente async aquí: la construcción del retriever (si no
+    se precalentó) y la búsqueda van juntas a un thread con `asyncio.to_thread`, sin
+    bloquear el event loop, y reutilizan ese embedding sin otra llamada de red.
+    """
+    try:
+        await get_embeddings().aembed_query(question)
+        return await asyncio.to_thread(_search_docs, question)
+    except Exception:
+        return []
+
+
+class RetrievalScope:
+    """
+    Recuperación compartida entre preguntas de un mismo lote (batch): `aliases` mapea
+    pregunta normalizada -> representante de su grupo y los docs se memoizan por
+    representante, de modo que preguntas similares disparan una sola búsqueda.
+    Los reportes de preguntas alias (con docs de otra pregunta) no se cachean.
+    """
+
+    def __init__(self, aliases: Dict[str, str] | None = None):
+        self.aliases = dict(aliases or {})
+        self._docs: Dict[str, asyncio.Future] = {}
+        self.fetches = 0
 
-    # Parse y validar con Pydantic; un reintento si falla
+    async def get(self, question: str) -> list:
+        key = self.aliases.get(question, question)
+        fut = self._docs.get(key)
+        if fut is None:
+            self.fetches += 1
+            fut = asyncio.ensure_future(_afetch_docs(key))
+            self._docs[key] = fut
+        return list(await asyncio.shield(fut))
+
+    def is_alias(self, question: str) -> bool:
+        """True si `question` reutiliza la recuperación de otro representante."""
+        return self.aliases.get(question, question) != question
+
+
+_RETRIEVAL_SCOPE: ContextVar[RetrievalScope | None] = ContextVar("turbo_retrieval_scope", default=None)
+
+
+def set_retrieval_scope(scope: RetrievalScope | None):
+    """Activa un `RetrievalScope` para el contexto actual (y las tareas creadas desde él); retorna el token."""
+    return _RETRIEVAL_SCOPE.set(scope)
+
+
+def reset_retrieval_scope(token) -> None:
+    _RETRIEVAL_SCOPE.reset(token)
+
+
+async def _aretrieve_docs(inp: Dict[str, Any]) -> list:
+    scope = _RETRIEVAL_SCOPE.get()
+    if scope is not None:
+        return await scope.get(inp["question"])
+    return await _afetch_docs(inp["question"])
+
+
+class TurboPipeline:
+    """
+    Cadenas LCEL del modo turbo (generación y reparación) construidas una sola vez.
+    El contexto se recupera una vez por request fuera de las cadenas y se comparte
+    entre la llamada principal y la de reparación; ambas devuelven texto crudo que
+    se parsea una única vez.
+    """
+
+    def __init__(self, llm: Any = None):
+        # LLM con tokens acotados para turbo (reutiliza el pool HTTP compartido)
+        self.llm = llm or ChatOpenAI(model=settings.OPENAI_MODEL_NAME, temperature=0.1, api_key=settings.OPENAI_API_KEY, max_tokens=1024, **openai_client_kwargs())
+        self.prompt = ChatPromptTemplate.from_template(_TURBO_TEMPLATE).partial(format_instructions=_FORMAT_INSTRUCTIONS)
+        self.repair_prompt = ChatPromptTemplate.from_template(_REPAIR_TEMPLATE).partial(format_instructions=_FORMAT_INSTRUCTIONS)
+        self.generate_chain = self.prompt | self.llm | StrOutputParser()
+        self.repair_chain = self.repair_prompt | self.llm | StrOutputParser()
+
+
+_TURBO_PIPELINE: TurboPipeline | None = None
+_TURBO_PIPELINE_KEY: tuple | None = None
+_TURBO_PIPELINE_LOCK = threading.Lock()
+
+
+def get_turbo_pipeline() -> TurboPipeline:
+    """Pipeline turbo compilado, compartido entre requests; se reconstruye si cambia el modelo o la API key."""
+    global _TURBO_PIPELINE, _TURBO_PIPELINE_KEY
+    key = (settings.OPENAI_MODEL_NAME, settings.OPENAI_API_KEY)
+    pipeline = _TURBO_PIPELINE
+    if pipeline is not None and _TURBO_PIPELINE_KEY == key:
+        return pipeline
+    with _TURBO_PIPELINE_LOCK:
+        if _TURBO_PIPELINE is None or _TURBO_PIPELINE_KEY != key:
+            _TURBO_PIPELINE = TurboPipeline()
+            _TURBO_PIPELINE_KEY = key
+        return _TURBO_PIPELINE
+
+
+def _reset_turbo_pipeline() -> None:
+    # El LLM retiene el cliente HTTP compartido: se descarta cuando éste se cierra
+    global _TURBO_PIPELINE, _TURBO_PIPELINE_KEY
+    with _TURBO_PIPELINE_LOCK:
+        _TURBO_PIPELINE, _TURBO_PIPELINE_KEY = None, None
+
+
+register_shutdown_hook(_reset_turbo_pipeline)
+
+
+def _valid_report(fr: Dict[str, Any]) -> bool:
+    try:
+        FinalReport.model_validate(fr)
+        return True
+    except Exception:
+        return False
+
+
+def _coerce_output(out: Any) -> Dict[str, Any] | None:
     if isinstance(out, dict):
-        data: Dict[str, Any] | None = out
-    else:
-        data = _parse_json_output(out if isinstance(out, str) else str(out))
-    def _valid(fr: Dict[str, Any]) -> bool:
-        try:
-            FinalReport.model_validate(fr)
-            return True
-        except Exception:
-            return False
-    if not isinstance(data, dict) or not _valid(data):
-        try:
-            repair_tmpl = (
-                'Your previous output did not validate against the FinalReport + Detector constraints. '
-                'Return a STRICT valid JSON with the exact keys and shapes described here: {format_instructions}\n\n'
-                'User Input: {user_input}\n\nContext:\n{context}\n'
-            )
-            repair_prompt = ChatPromptTemplate.from_template(repair_tmpl)
-            repair_chain = (
-                {"context": RunnableLambda(build_context), "user_input": RunnableLambda(lambda x: user_input), "format_instructions": RunnableLambda(lambda _: fmt_instructions)}
-                | repair_prompt
-                | llm
-                | json_parser
-            )
-            out2 = repair_chain.invoke(qn)
-            data = out2 if isinstance(out2, dict) else _parse_json_output(out2)
-        except Exception:
-            data = None
+        return out
+    return _parse_json_output(out if isinstance(out, str) else str(out))
+
+
+def _finalize_report(data: Dict[str, Any] | None, dt: float) -> Dict[str, Any]:
     if not isinstance(data, dict):
         data = {"report_id": "TURBO-REPORT", "application_name": "Turbo Analyzer", "summary": "", "prioritized_detectors": []}
     # Re-validar y manejar envoltorio común {'FinalReport': {...}}
-    if isinstance(data, dict) and (not _valid(data)) and set(data.keys()) == {"FinalReport"} and isinstance(data.get("FinalReport"), dict):
+    if isinstance(data, dict) and (not _valid_report(data)) and set(data.keys()) == {"FinalReport"} and isinstance(data.get("FinalReport"), dict):
         inner = data.get("FinalReport")
-        if isinstance(inner, dict) and _valid(inner):
+        if isinstance(inner, dict) and _valid_report(inner):
             data = inner
 
     # Adjuntar métrica simple y limpiar claves extra
@@ -358,11 +577,133 @@ def run_turbo_pipeline(user_input: str) -> Dict[str, Any]:
             data["prioritized_detectors"] = plist[:5]
     except Exception:
         pass
+    return data
+
 
-    # Cachear 24h (después de normalizar y completar)
+def run_turbo_pipeline(user_input: str) -> Dict[str, Any]:
+    """
+    Pipeline rápido sin CrewAI: recupera contexto DBIR y genera el reporte final JSON.
+    Cachea resultados por pregunta normalizada + ingest_id.
+    """
+    # Permitir invocación explícita desde el endpoint con `mode=turbo`,
+    # independientemente del valor global de `ANALYZER_MODE`.
+
+    # Cache lookup (read-through, validado contra FinalReport)
+    t_lookup = time.perf_counter()
+    qn = _norm_question(user_input)
+    ingest_id = _ingest_id()
+    cache_key = _report_cache_key(qn, ingest_id)
+    cached = _read_cached_report(cache_key, ingest_id) if settings.REPORT_CACHE_ENABLED else None
+    if cached is not None:
+        cached["timing_ms"] = int((time.perf_counter() - t_lookup) * 1000.0)
+        return cached
+
+    # Single-flight: requests idénticos concurrentes (misma clave de caché) esperan un único cómputo
+    return singleflight.do(cache_key, lambda: _compute_report(qn, user_input, cache_key, ingest_id))
+
+
+def _compute_report(qn: str, user_input: str, cache_key: str, ingest_id: str) -> Dict[str, Any]:
+    pipeline = get_turbo_pipeline()
+    inp = {"question": qn, "user_input": user_input}
+
+    t0 = time.perf_counter()
+    # Recuperación memoizada: una vez por request, compartida por generación y reparación
+    inp["context"] = _build_context(inp)
     try:
-        cache_set(cache_key, json.dumps(data, ensure_ascii=False), ttl_seconds=86400, host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+        data = _coerce_output(pipeline.generate_chain.invoke(inp))
     except Exception:
-        pass
+        data = None
+    # Un único reintento solo si el JSON parseado no valida (un fallo de parseo no repite la llamada)
+    if isinstance(data, dict) and not _valid_report(data) and not _valid_report(data.get("FinalReport") or {}):
+        try:
+            data = _coerce_output(pipeline.repair_chain.invoke(inp)) or data
+        except Exception:
+            pass
+    dt = (time.perf_counter() - t0) * 1000.0
+    data = _finalize_report(data, dt)
+
+    # Cachear (después de normalizar y completar); solo reportes válidos
+    if settings.REPORT_CACHE_ENABLED:
+        _write_cached_report(cache_key, ingest_id, data)
     # Devolver el dict final para que el servicio lo serialice de forma consistente
     return data
+
+
+async def astream_turbo_pipeline(user_input: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Variante en streaming del pipeline turbo (nativa async). Emite tuplas (evento, datos):
+    'cache' (hit), 'coalesced' (se esperó un cómputo idéntico en curso), 'retrieval'
+    (contexto listo), 'token' (texto parcial del LLM), 'repair' (reintento de validación)
+    y finalmente 'report' con el dict final.
+    """
+    t_lookup = time.perf_counter()
+    qn = _norm_question(user_input)
+    ingest_id = await _aingest_id()
+    cache_key = _report_cache_key(qn, ingest_id)
+    cached = await _aread_cached_report(cache_key, ingest_id) if settings.REPORT_CACHE_ENABLED else None
+    if cached is not None:
+        cached["timing_ms"] = int((time.perf_counter() - t_lookup) * 1000.0)
+        yield "cache", {"hit": True}
+        yield "report", cached
+        return
+
+    # Single-flight: si el mismo reporte ya se está generando (aquí u otro worker), esperarlo
+    flight = None
+    if settings.SINGLEFLIGHT_ENABLED:
+        joined, flight = await singleflight.ajoin(cache_key)
+        if joined:
+            yield "coalesced", {}
+            yield "report", flight
+            return
+    try:
+        pipeline = get_turbo_pipeline()
+        inp = {"question": qn, "user_input": user_input}
+
+        t0 = time.perf_counter()
+        docs = await _aretrieve_docs(inp)
+        inp["context"] = _docs_to_context(docs)
+        yield "retrieval", {"docs": min(len(docs), 5), "elapsed_ms": int((time.perf_counter() - t0) * 1000.0)}
+
+        chunks: list[str] = []
+        try:
+            async for chunk in pipeline.generate_chain.astream(inp):
+                if chunk:
+                    chunks.append(chunk)
+                    yield "token", {"text": chunk}
+            data = _coerce_output("".join(chunks))
+        except Exception:
+            data = None
+        if isinstance(data, dict) and not _valid_report(data) and not _valid_report(data.get("FinalReport") or {}):
+            yield "repair", {}
+            try:
+                data = _coerce_output(await pipeline.repair_chain.ainvoke(inp)) or data
+            except Exception:
+                pass
+        dt = (time.perf_counter() - t0) * 1000.0
+        data = _finalize_report(data, dt)
+
+        # Un alias se generó con los docs de su representante: no se cachea bajo su propia clave
+        scope = _RETRIEVAL_SCOPE.get()
+        if settings.REPORT_CACHE_ENABLED and not (scope is not None and scope.is_alias(qn)):
+            await _awrite_cached_report(cache_key, ingest_id, data)
+    except BaseException as e:
+        # Incluye cancelación / cliente desconectado: liberar a los seguidores
+        if flight is not None:
+            await flight.fail(e)
+        raise
+    if flight is not None:
+        await flight.finish(data)
+    yield "report", data
+
+
+async def arun_turbo_pipeline(user_input: str) -> Dict[str, Any]:
+    """
+    Versión nativa async de `run_turbo_pipeline`: Redis asyncio para el caché,
+    embedding de la pregunta async y LLM async, sin ocupar un thread del executor
+    mientras se espera a OpenAI. Consume `astream_turbo_pipeline` hasta el reporte.
+    """
+    report: Dict[str, Any] = {}
+    async for event, payload in astream_turbo_pipeline(user_input):
+        if event == "report":
+            report = payload
+    return report
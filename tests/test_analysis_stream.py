@@ -0,0 +1,65 @@
+"""
+Tests para el endpoint SSE /api/analyze/stream.
+"""
+
+import json
+
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from api.main import app
+import src.turbo_pipeline as tp
+from tests.test_report_cache import VALID_REPORT
+
+client = TestClient(app)
+
+
+def _events(response):
+    out = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_stream_turbo_emits_retrieval_tokens_and_report(monkeypatch):
+    monkeypatch.setattr(tp.settings, "REPORT_CACHE_ENABLED", False)
+
+    async def fake_docs(inp):
+        return ["doc a", "doc b"]
+
+    monkeypatch.setattr(tp, "_aretrieve_docs", fake_docs)
+    pipeline = tp.TurboPipeline(llm=FakeListChatModel(responses=[json.dumps(VALID_REPORT)]))
+    monkeypatch.setattr(tp, "get_turbo_pipeline", lambda: pipeline)
+
+    response = client.post("/api/analyze/stream?mode=turbo", json={"user_input": "Describo mi app."})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response)
+    names = [e for e, _ in events]
+    assert names[0] == "start" and names[1] == "retrieval" and names[-1] == "report"
+    assert events[1][1]["docs"] == 2
+    tokens = "".join(d["text"] for e, d in events if e == "token")
+    assert json.loads(tokens)["report_id"] == "r-1"
+    final = events[-1][1]
+    assert final["valid"] is True and final["report"]["report_id"] == "r-1"
+
+
+def test_stream_heavy_emits_task_events(mocker):
+    def fake_mcp(text, logger, on_event=None, cancel_event=None):
+        for name in ("analysis", "classification", "reporting"):
+            on_event("task", {"task": name, "output": None})
+        return dict(VALID_REPORT)
+
+    mocker.patch("api.services.crew_service.run_mcp_analysis", side_effect=fake_mcp)
+    response = client.post("/api/analyze/stream?mode=heavy", json={"user_input": "Describo mi app."})
+    events = _events(response)
+    assert [d["task"] for e, d in events if e == "task"] == ["analysis", "classification", "reporting"]
+    assert events[-1][0] == "report" and events[-1][1]["valid"] is True
+
+
+def test_stream_reports_errors_as_events(mocker):
+    mocker.patch("api.services.crew_service.run_mcp_analysis", side_effect=Exception("boom"))
+    response = client.post("/api/analyze/stream?mode=heavy", json={"user_input": "x"})
+    events = _events(response)
+    assert events[-1][0] == "error" and events[-1][1]["status"] == 500
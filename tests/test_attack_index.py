@@ -0,0 +1,83 @@
+import json
+from unittest.mock import patch
+
+import src.tools.mitre_tool as mitre_mod
+from src.tools.attack_index import AttackIndex, find_bundle_files
+
+
+def _pattern(ext_id, name, description, **extra):
+    obj = {
+        "type": "attack-pattern",
+        "id": f"attack-pattern--{ext_id}",
+        "name": name,
+        "description": description,
+        "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": "credential-access"}],
+        "external_references": [
+            {"source_name": "mitre-attack", "external_id": ext_id, "url": f"https://attack.mitre.org/techniques/{ext_id}"}
+        ],
+    }
+    obj.update(extra)
+    return obj
+
+
+def _write_bundle(path, objects):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"type": "bundle", "objects": objects}), encoding="utf-8")
+
+
+def _bundle_dir(tmp_path):
+    _write_bundle(tmp_path / "v16.1" / "enterprise-attack.json", [_pattern("T1110", "Old", "old")])
+    _write_bundle(tmp_path / "v17.1" / "enterprise-attack.json", [
+        _pattern("T1110", "Brute Force", "Adversaries may use brute force techniques to gain access."),
+        _pattern("T1110.003", "Password Spraying", "Adversaries may use a single password against many accounts. Credential stuffing and brute force variant."),
+        _pattern("T1566", "Phishing", "Adversaries may send phishing messages to gain access."),
+        _pattern("T9999", "Old Technique", "brute force legacy", revoked=True),
+        {"type": "intrusion-set", "id": "intrusion-set--1", "name": "APT"},
+    ])
+    return tmp_path
+
+
+def test_index_from_bundles_picks_latest_version_and_skips_revoked(tmp_path):
+    paths = find_bundle_files(str(_bundle_dir(tmp_path)))
+    assert [p.parent.name for p in paths] == ["v17.1"]
+    index = AttackIndex.from_bundles(paths)
+    assert len(index) == 3
+    assert index.get_technique_by_id("t1110.003")["name"] == "Password Spraying"
+    assert index.get_technique_by_name("phishing")["id"] == "T1566"
+    assert index.get_technique_by_id("T9999") is None
+
+
+def test_content_search_matches_substrings_and_ranks_name_hits_first(tmp_path):
+    index = AttackIndex.from_bundles(find_bundle_files(str(_bundle_dir(tmp_path))))
+    ids = [t["id"] for t in index.get_techniques_by_content("Brute Force")]
+    assert ids == ["T1110", "T1110.003"]
+    assert [t["id"] for t in index.get_techniques_by_content("phish")] == ["T1566"]
+    assert index.get_techniques_by_content("force brute") == []
+    assert index.get_techniques_by_content("") == []
+
+
+def test_mitre_tools_use_local_index(tmp_path, monkeypatch):
+    index = AttackIndex.from_bundles(find_bundle_files(str(_bundle_dir(tmp_path))))
+    monkeypatch.setattr(mitre_mod, "_attack", None)
+    monkeypatch.setattr(mitre_mod.settings, "MITRE_ATTACK_SOURCE", "auto")
+    with patch("src.tools.mitre_tool.get_attack_index", return_value=index), \
+            patch("src.tools.mitre_tool.attack_client", side_effect=AssertionError("TAXII no debe usarse")):
+        assert mitre_mod.get_attack_client() is index
+        out = mitre_mod._mitre_attack_query_tool("credential stuffing")
+        details = json.loads(mitre_mod.get_mitre_technique_details.run("Password Spraying"))
+    assert "T1110.003" in out
+    assert details["id"] == "T1110.003"
+    assert details["tactics"] == ["credential-access"]
+    mitre_mod._attack = None
+
+
+def test_auto_source_warns_when_falling_back_to_taxii(monkeypatch, caplog):
+    monkeypatch.setattr(mitre_mod, "_attack", None)
+    monkeypatch.setattr(mitre_mod.settings, "MITRE_ATTACK_SOURCE", "auto")
+    sentinel = object()
+    with patch("src.tools.mitre_tool.get_attack_index", return_value=None), \
+            patch("src.tools.mitre_tool.attack_client", return_value=sentinel), \
+            caplog.at_level("WARNING", logger=mitre_mod.logger.name):
+        assert mitre_mod.get_attack_client() is sentinel
+    assert "TAXII" in caplog.text
+    mitre_mod._attack = None
@@ -0,0 +1,154 @@
+"""
+Tests del análisis por lotes (/api/analyze/batch, batch_service).
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services import batch_service
+import src.turbo_pipeline as tp
+
+client = TestClient(app)
+
+
+def _fake_crew(mocker):
+    async def fake(user_input, mode_override=None, cancel_event=None):
+        return {"report_json": json.dumps({"summary": user_input}), "session_id": "s", "missing_fields": []}
+
+    return mocker.patch("api.services.batch_service.crew_service.run_analysis_crew", side_effect=fake)
+
+
+def test_batch_dedupes_normalized_inputs(mocker):
+    crew = _fake_crew(mocker)
+    items = [{"id": "a", "user_input": "Mi App"}, {"id": "b", "user_input": "otra app"}, {"id": "c", "user_input": "  mi app "}]
+    out = asyncio.run(batch_service.run_batch(items, mode_override="heavy", concurrency=2))
+    assert crew.await_count == 2
+    assert [r["id"] for r in out["results"]] == ["a", "b", "c"]
+    assert out["results"][2]["duplicate_of"] == "a" and out["results"][2]["report"] == out["results"][0]["report"]
+    summary = out["summary"]
+    assert summary["items"] == 3 and summary["unique"] == 2 and summary["succeeded"] == 3
+    assert summary["items_per_second"] is not None
+
+
+def test_closing_batch_sets_cancel_event_of_pending_items(mocker):
+    events = {}
+
+    async def fake(user_input, mode_override=None, cancel_event=None):
+        events[user_input] = cancel_event
+        if user_input == "lenta":
+            await asyncio.Event().wait()
+        return {"report_json": json.dumps({"summary": user_input}), "session_id": "s", "missing_fields": []}
+
+    mocker.patch("api.services.batch_service.crew_service.run_analysis_crew", side_effect=fake)
+
+    async def run():
+        gen = batch_service.iter_batch([{"user_input": "lenta"}, {"user_input": "rapida"}], mode_override="heavy", concurrency=2)
+        first = await gen.__anext__()
+        await gen.aclose()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return first
+
+    first = asyncio.run(run())
+    assert first["report"] == {"summary": "rapida"}
+    assert events["lenta"].is_set()
+    assert not events["rapida"].is_set()
+
+
+def test_retrieval_scope_shares_similar_questions(monkeypatch):
+    calls = []
+
+    async def fake_fetch(question):
+        calls.append(question)
+        return ["doc"]
+
+    monkeypatch.setattr(tp, "_afetch_docs", fake_fetch)
+
+    async def run():
+        scope = tp.RetrievalScope({"q1": "q1", "q2": "q1", "q3": "q3"})
+        tp.set_retrieval_scope(scope)
+        docs = await asyncio.gather(*(tp._aretrieve_docs({"question": q}) for q in ("q1", "q2", "q3")))
+        return scope, docs
+
+    scope, docs = asyncio.run(run())
+    assert sorted(calls) == ["q1", "q3"] and scope.fetches == 2
+    assert docs == [["doc"], ["doc"], ["doc"]]
+
+
+def test_retrieval_aliases_group_by_similarity(monkeypatch):
+    vectors = {"a": [1.0, 0.0], "b": [0.99, 0.05], "c": [0.0, 1.0]}
+
+    class FakeEmb:
+        async def aembed_documents(self, texts):
+            return [vectors[t] for t in texts]
+
+    monkeypatch.setattr(batch_service, "get_embeddings", lambda: FakeEmb())
+    aliases = asyncio.run(batch_service._retrieval_aliases(["a", "b", "c"], 0.95))
+    assert aliases == {"a": "a", "b": "a", "c": "c"}
+
+
+def test_batch_endpoint_jsonl(mocker):
+    _fake_crew(mocker)
+    body = {"items": [{"user_input": "uno"}, {"user_input": "dos"}]}
+    resp = client.post("/api/analyze/batch?mode=heavy&format=jsonl", json=body)
+    assert resp.status_code == 200
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["type"] for r in lines] == ["item", "item", "summary"]
+    assert client.post("/api/analyze/batch", json={"items": [{"user_input": " "}]}).status_code == 422
+
+
+def test_load_batch_inputs(tmp_path):
+    items = batch_service.load_batch_inputs("data/custom_inputs")
+    assert len(items) == 5 and items[0]["id"] == "input_example_1"
+    src = tmp_path / "in.jsonl"
+    src.write_text('{"id": "x", "text": "hola"}\n"suelto"\n', encoding="utf-8")
+    assert batch_service.load_batch_inputs(src) == [{"id": "x", "user_input": "hola"}, {"id": "2", "user_input": "suelto"}]
+
+
+def test_batch_rejects_duplicate_ids(mocker):
+    crew = _fake_crew(mocker)
+    items = [{"id": "a", "user_input": "uno"}, {"id": "a", "user_input": "dos"}]
+    with pytest.raises(ValueError, match="duplicados"):
+        asyncio.run(batch_service.run_batch(items, mode_override="heavy"))
+    assert crew.await_count == 0
+
+
+def test_aliased_reports_are_not_cached(monkeypatch):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from tests.test_report_cache import VALID_REPORT
+
+    writes = []
+
+    async def fake_write(cache_key, ingest_id, data, ttl_seconds=None):
+        writes.append(cache_key)
+        return True
+
+    async def fake_fetch(question):
+        return ["doc"]
+
+    async def no_cache(*a, **k):
+        return None
+
+    async def fake_ingest_id():
+        return "i"
+
+    monkeypatch.setattr(tp.settings, "REPORT_CACHE_ENABLED", True)
+    monkeypatch.setattr(tp.settings, "SINGLEFLIGHT_ENABLED", False)
+    monkeypatch.setattr(tp, "_aread_cached_report", no_cache)
+    monkeypatch.setattr(tp, "_awrite_cached_report", fake_write)
+    monkeypatch.setattr(tp, "_afetch_docs", fake_fetch)
+    monkeypatch.setattr(tp, "_aingest_id", fake_ingest_id)
+    pipeline = tp.TurboPipeline(llm=FakeListChatModel(responses=[json.dumps(VALID_REPORT)] * 2))
+    monkeypatch.setattr(tp, "get_turbo_pipeline", lambda: pipeline)
+
+    async def run():
+        tp.set_retrieval_scope(tp.RetrievalScope({"q1": "q1", "q2": "q1"}))
+        await tp.arun_turbo_pipeline("q1")
+        await tp.arun_turbo_pipeline("q2")
+
+    asyncio.run(run())
+    assert writes == [tp._report_cache_key("q1", "i")]
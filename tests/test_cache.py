@@ -0,0 +1,66 @@
+from src import cache as cache_mod
+
+
+def test_redis_pool_is_shared_per_target():
+    cache_mod.close_redis_pools()
+    p1 = cache_mod.get_redis_pool("localhost", 6379, 0)
+    p2 = cache_mod.get_redis_pool("localhost", 6379, 0)
+    p3 = cache_mod.get_redis_pool("localhost", 6379, 1)
+    assert p1 is p2
+    assert p1 is not p3
+    c1 = cache_mod.get_redis_client("localhost", 6379, 0)
+    assert c1.connection_pool is p1
+    cache_mod.close_redis_pools()
+    assert cache_mod.get_redis_pool(None, None, 0) is None
+
+
+def test_async_redis_pools_are_per_loop_and_released():
+    import asyncio
+    import gc
+
+    async def pool():
+        return cache_mod.get_async_redis_client("localhost", 6379, 0).connection_pool
+
+    async def pool_twice_then_close():
+        p = await pool()
+        assert (await pool()) is p
+        await cache_mod.aclose_redis_pools()
+        assert asyncio.get_running_loop() not in cache_mod._async_redis_pools
+        return p
+
+    before = len(cache_mod._async_redis_pools)
+    p1 = asyncio.run(pool())
+    p2 = asyncio.run(pool_twice_then_close())
+    assert p1 is not p2
+    # El loop descartado no retiene su pool (sin fugas ni reutilización por id de loop)
+    gc.collect()
+    assert len(cache_mod._async_redis_pools) == before
+    assert cache_mod.get_async_redis_client("localhost", 6379, 0) is None
+
+
+def test_cache_many_memory_fallback():
+    cache_mod._memory_cache.clear()
+    cache_mod.cache_set_many({"a": "1", "b": "2"}, ttl_seconds=60)
+    assert cache_mod.cache_get_many(["a", "missing", "b"]) == ["1", None, "2"]
+    assert cache_mod.cache_get_many([]) == []
+
+
+def test_memory_tier_enforces_ttl_and_lru_bounds(monkeypatch):
+    lru = cache_mod.MemoryLRUCache(max_entries=2, max_bytes=1024)
+    lru.set("a", "1", ttl_seconds=60)
+    lru.set("b", "2", ttl_seconds=60)
+    assert lru.get("a") == "1"  # 'a' pasa a ser el más reciente
+    lru.set("c", "3", ttl_seconds=60)
+    assert lru.get("b") is None and lru.get("a") == "1" and lru.get("c") == "3"
+    lru.set("d", "4", ttl_seconds=-1)
+    assert lru.get("d") is None
+    assert lru.stats()["evictions"] >= 1 and lru.stats()["expirations"] == 1
+
+
+def test_memory_tier_bounded_by_bytes():
+    lru = cache_mod.MemoryLRUCache(max_entries=100, max_bytes=15)
+    lru.set("k1", "x" * 8, ttl_seconds=60)
+    lru.set("k2", "y" * 8, ttl_seconds=60)
+    assert lru.get("k1") is None and lru.get("k2") == "y" * 8
+    lru.set("big", "z" * 50, ttl_seconds=60)
+    assert lru.get("big") is None
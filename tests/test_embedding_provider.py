@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import src.llm_provider as provider
+import src.rag_system.embeddings as emb_mod
+from src.rag_system.embeddings import EmbeddingMismatchError, ensure_collection_embedding
+
+
+class FakeSentenceTransformer:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, **kwargs):
+        self.calls.append((list(texts), batch_size))
+        return np.asarray([[float(len(t)), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return 3
+
+
+class FakeCollection:
+    def __init__(self, metadata=None, count=0, dim=None):
+        self.name = "dbir"
+        self.metadata = metadata
+        self._count = count
+        self._dim = dim
+        self.modified = None
+
+    def count(self):
+        return self._count
+
+    def peek(self, limit=1):
+        return {"embeddings": [[0.0] * self._dim] if self._dim else []}
+
+    def modify(self, metadata=None):
+        self.modified = metadata
+        self.metadata = metadata
+
+
+@pytest.fixture
+def local_provider(monkeypatch):
+    model = FakeSentenceTransformer()
+    monkeypatch.setattr(provider.settings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(provider.settings, "LOCAL_EMBEDDING_MODEL", "mini")
+    monkeypatch.setattr(provider.settings, "LOCAL_EMBEDDING_BATCH_SIZE", 8)
+    monkeypatch.setattr(provider.settings, "REDIS_HOST", None)
+    monkeypatch.setattr(provider.settings, "EMBEDDING_CACHE_DISK_ENABLED", False)
+    monkeypatch.setattr(provider, "_load_sentence_transformer", lambda name, device: model)
+    emb_mod._EMBEDDINGS.clear()
+    yield model
+    emb_mod._EMBEDDINGS.clear()
+
+
+def test_local_provider_embeds_in_batches_with_separate_cache_namespace(local_provider):
+    emb = emb_mod.get_embeddings()
+    assert isinstance(emb.underlying.underlying, provider.LocalEmbeddings)
+    assert emb.model_name == "local:mini"
+    assert emb.embed_documents(["ab", "abc"]) == [[2.0, 1.0, 0.0], [3.0, 1.0, 0.0]]
+    assert emb.embed_query("ab") == [2.0, 1.0, 0.0]
+    # La query ya estaba en caché; el modelo recibió un único batch
+    assert local_provider.calls == [(["ab", "abc"], 8)]
+    assert provider.embedding_dimension() == 3
+
+
+async def test_local_provider_async_path(local_provider):
+    out = await emb_mod.get_embeddings().aembed_query("abcd")
+    assert out == [4.0, 1.0, 0.0]
+
+
+def test_unsupported_embedding_provider(monkeypatch):
+    monkeypatch.setattr(provider.settings, "EMBEDDING_PROVIDER", "nope")
+    with pytest.raises(ValueError):
+        provider.get_embeddings_backend()
+
+
+def test_guard_stamps_metadata_on_ingest(local_provider):
+    col = FakeCollection(metadata={"hnsw:space": "cosine"})
+    ensure_collection_embedding(col, writing=True)
+    assert col.modified == {"embedding_model": "local:mini", "embedding_dim": 3}
+    # Consultar la misma colección con el mismo modelo es válido
+    col._count = 10
+    ensure_collection_embedding(col)
+
+
+def test_guard_rejects_other_model(local_provider):
+    col = FakeCollection(metadata={"embedding_model": "text-embedding-3-small", "embedding_dim": 1536}, count=5)
+    with pytest.raises(EmbeddingMismatchError):
+        ensure_collection_embedding(col)
+
+
+def test_guard_detects_dimension_of_legacy_collection(local_provider):
+    # Colección ingestada antes del guard (sin metadata) con vectores de OpenAI
+    with pytest.raises(EmbeddingMismatchError):
+        ensure_collection_embedding(FakeCollection(count=3, dim=1536))
+    ensure_collection_embedding(FakeCollection(count=0))
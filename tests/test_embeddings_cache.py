@@ -0,0 +1,131 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+from src.rag_system.embeddings import CachedEmbeddings, _decode_vector, _encode_vector
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 1.0]
+
+
+def test_cached_embeddings_reuses_vectors(monkeypatch):
+    monkeypatch.setattr("src.rag_system.embeddings.settings.REDIS_HOST", None)
+    inner = CountingEmbeddings()
+    emb = CachedEmbeddings(inner, model_name="fake-model")
+    assert emb.embed_query("hola") == [4.0, 1.0]
+    assert emb.embed_query("hola") == [4.0, 1.0]
+    # Solo los textos nuevos (y deduplicados) llegan al modelo
+    out = emb.embed_documents(["hola", "mundo", "mundo"])
+    assert out == [[4.0, 1.0], [5.0, 1.0], [5.0, 1.0]]
+    assert inner.calls == [["hola"], ["mundo"]]
+    assert emb.stats()["hits"] == 2 and emb.stats()["misses"] == 2
+
+
+def test_cached_embeddings_keys_by_model():
+    inner = CountingEmbeddings()
+    a = CachedEmbeddings(inner, model_name="m1")
+    b = CachedEmbeddings(inner, model_name="m2")
+    assert a._key("x") != b._key("x")
+
+
+def test_vector_encoding_roundtrip():
+    vec = [0.5, -1.25, 3.0]
+    assert _decode_vector(_encode_vector(vec)) == vec
+
+
+class FlakyEmbeddings(CountingEmbeddings):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def embed_documents(self, texts):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("429")
+        return super().embed_documents(texts)
+
+
+def test_batched_embeddings_split_order_and_retry():
+    from src.rag_system.embeddings import BatchedEmbeddings
+    inner = FlakyEmbeddings(failures=1)
+    emb = BatchedEmbeddings(inner, batch_size=2, max_concurrency=3, max_retries=2, backoff_seconds=0)
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    out = emb.embed_documents(texts)
+    assert [v[0] for v in out] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert sorted(len(c) for c in inner.calls) == [1, 2, 2]
+
+
+def test_disk_tier_survives_restart(monkeypatch, tmp_path):
+    from src.rag_system.embeddings import DiskVectorCache
+    monkeypatch.setattr("src.rag_system.embeddings.settings.REDIS_HOST", None)
+    path = str(tmp_path / "emb.sqlite3")
+    inner = CountingEmbeddings()
+    first = CachedEmbeddings(inner, model_name="fake-model", disk=DiskVectorCache(path))
+    assert first.embed_documents(["hola", "mundo"]) == [[4.0, 1.0], [5.0, 1.0]]
+    first.disk.close()
+
+    # Proceso nuevo: LRU vacío, los vectores se leen del sqlite sin llamar al modelo
+    second = CachedEmbeddings(inner, model_name="fake-model", disk=DiskVectorCache(path))
+    assert second.embed_query("mundo") == [5.0, 1.0]
+    assert inner.calls == [["hola", "mundo"]]
+
+
+def test_disk_tier_prunes_oldest_entries(tmp_path):
+    from src.rag_system.embeddings import DiskVectorCache
+    disk = DiskVectorCache(str(tmp_path / "emb.sqlite3"), max_entries=10)
+    disk.set_many({f"old{i}": [float(i)] for i in range(500)})
+    disk.set_many({f"new{i}": [float(i)] for i in range(500)})
+    assert disk.get_many(["old0", "new499"]) == [None, [499.0]]
+    assert disk._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0] == 10
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def test_batched_retry_is_the_only_retry_layer(monkeypatch):
+    from src.rag_system import embeddings as emb_mod
+    from src.rag_system.embeddings import BatchedEmbeddings
+
+    # Las queries también reintentan (el cliente OpenAI ya no lo hace)
+    inner = FlakyEmbeddings(failures=0)
+    state = {"fails": 1}
+
+    def flaky_query(text):
+        if state["fails"]:
+            state["fails"] -= 1
+            raise RuntimeError("timeout")
+        return [1.0]
+
+    inner.embed_query = flaky_query
+    emb = BatchedEmbeddings(inner, max_retries=2, backoff_seconds=0)
+    assert emb.embed_query("x") == [1.0]
+
+    # Un 429 ya agotó los reintentos del transporte: no se multiplica
+    calls = []
+
+    def limited(texts):
+        calls.append(texts)
+        raise RateLimited()
+
+    inner.embed_documents = limited
+    with pytest.raises(RateLimited):
+        emb.embed_documents(["a"])
+    assert len(calls) == 1
+
+    # El cliente OpenAI se crea sin reintentos propios
+    monkeypatch.setattr(emb_mod.settings, "EMBEDDING_PROVIDER", "openai")
+    monkeypatch.setattr(emb_mod.settings, "EMBEDDING_CACHE_DISK_ENABLED", False)
+    emb_mod._EMBEDDINGS.clear()
+    try:
+        assert emb_mod.get_embeddings().underlying.underlying.max_retries == 0
+    finally:
+        emb_mod._EMBEDDINGS.clear()
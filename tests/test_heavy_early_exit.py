@@ -0,0 +1,101 @@
+import math
+
+from langchain_core.documents import Document
+import src.rag_system.retriever_factory as rf
+
+
+class FakeVectorstore:
+    """Hijos cuyo coseno con la pregunta ([1, 0]) es `score - i*0.01`."""
+
+    def __init__(self, score):
+        self.score = score
+        self.calls = 0
+
+    def _vec(self, i):
+        c = max(min(self.score - i * 0.01, 1.0), -1.0)
+        return [c, math.sqrt(1.0 - c * c)]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        self.calls += 1
+        return [Document(page_content=f"doc{i}", id=str(i)) for i in range(k)]
+
+    def get(self, ids=None, include=None, where=None):
+        return {"ids": list(ids or []), "embeddings": [self._vec(int(i)) for i in ids or []]}
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [1.0, 0.0]
+
+
+class FakeRetriever:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, question):
+        self.calls += 1
+        return [Document(page_content="multi")]
+
+
+def _context_fn(monkeypatch, score):
+    vs, ret = FakeVectorstore(score), FakeRetriever()
+    monkeypatch.setattr(rf, "get_vectorstore", lambda *a, **k: vs)
+    monkeypatch.setattr(rf, "get_embeddings", lambda *a, **k: FakeEmbeddings())
+    monkeypatch.setattr(rf, "create_advanced_retriever", lambda **k: ret)
+    monkeypatch.setattr(rf, "mmr_rerank", lambda q, docs, **k: docs)
+    monkeypatch.setattr(rf.settings, "ANALYZER_MODE", "heavy")
+    monkeypatch.setattr(rf.settings, "COHERE_API_KEY", None)
+    monkeypatch.setattr(rf, "_CACHED_RAG_CHAIN", {})
+    chain = rf.get_rag_chain()
+    return chain.first.steps__["context"], vs, ret
+
+
+def test_heavy_early_exit_skips_multiquery(monkeypatch):
+    build_context, vs, ret = _context_fn(monkeypatch, score=0.9)
+    ctx = build_context.invoke("pregunta")
+    assert vs.calls == 1 and ret.calls == 0
+    assert ctx.count("---") == rf.settings.MMR_TOP_N - 1
+
+
+def test_heavy_low_score_falls_back_to_advanced(monkeypatch):
+    build_context, vs, ret = _context_fn(monkeypatch, score=0.1)
+    assert build_context.invoke("pregunta") == "multi"
+    assert vs.calls == 1 and ret.calls == 1
+
+
+async def test_ask_rag_retrieves_once_and_returns_llm_context(monkeypatch):
+    import src.tools.retriever as retriever_mod
+
+    calls = []
+    docs = [Document(page_content="ctx1"), Document(page_content="ctx2")]
+
+    def fake_retrieve(question, force_turbo=False):
+        calls.append(question)
+        return docs
+
+    class FakeChain:
+        def invoke(self, inp):
+            assert inp == {"question": "q", "docs": docs}
+            return "respuesta"
+
+    monkeypatch.setattr(retriever_mod, "retrieve_context_docs", fake_retrieve)
+    monkeypatch.setattr(retriever_mod, "get_rag_chain", lambda *a, **k: FakeChain())
+    out = await retriever_mod.ask_rag("q")
+    assert calls == ["q"]
+    assert out == {"answer": "respuesta", "context": "ctx1\n---\nctx2"}
+
+
+def test_early_exit_threshold_is_cosine_and_keeps_mmr(monkeypatch):
+    # Coseno 0.6 ≥ 0.55 (en L2 el relevance score de Chroma sería 1 - 0.8/√2 ≈ 0.43 y no saldría)
+    monkeypatch.setattr(rf.settings, "MMR_LAMBDA", 0.5)
+    build_context, vs, ret = _context_fn(monkeypatch, score=0.6)
+    picked = []
+    real_select = rf.mmr_select
+    monkeypatch.setattr(rf, "mmr_select", lambda *a, **k: picked.append(1) or real_select(*a, **k))
+    ctx = build_context.invoke("pregunta")
+    assert ret.calls == 0 and picked == [1]
+    assert ctx.count("---") == rf.settings.MMR_TOP_N - 1
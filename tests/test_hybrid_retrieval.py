@@ -0,0 +1,146 @@
+import os
+
+from langchain_core.documents import Document
+
+import src.rag_system.bm25 as bm25_mod
+import src.rag_system.retriever_factory as rf
+from src.rag_system.bm25 import BM25Index, get_bm25_index, tokenize
+from src.rag_system.hybrid import HybridRetriever, rrf_fuse
+
+CHUNKS = {
+    "c1": ("Ransomware was present in 44% of breaches this year.", {"doc_id": "p1"}),
+    "c2": ("Credential abuse via T1110 brute force remains the top initial access vector.", {"doc_id": "p1"}),
+    "c3": ("Third-party involvement in breaches doubled to 30%.", {"doc_id": "p2"}),
+    "c4": ("Phishing and pretexting drive the social engineering pattern.", {"doc_id": "p2"}),
+}
+
+
+class FakeVectorstore:
+    """Chroma simulado: `get` expone la colección y la búsqueda densa devuelve un orden fijo."""
+
+    def __init__(self, dense_order=("c4", "c1", "c3", "c2")):
+        self.dense_order = dense_order
+        self.get_calls = 0
+
+    def get(self, include=None):
+        self.get_calls += 1
+        ids = list(CHUNKS)
+        return {"ids": ids, "documents": [CHUNKS[i][0] for i in ids], "metadatas": [CHUNKS[i][1] for i in ids]}
+
+    def similarity_search(self, query, k=4):
+        return [Document(page_content=CHUNKS[i][0], metadata=CHUNKS[i][1], id=i) for i in self.dense_order[:k]]
+
+    async def asimilarity_search(self, query, k=4):
+        return self.similarity_search(query, k)
+
+
+class FakeDocstore:
+    def mget(self, ids):
+        return [Document(page_content=f"parent {i}") for i in ids]
+
+
+def test_tokenizer_keeps_technique_ids_and_compounds():
+    toks = tokenize("T1110.003 and third-party vendors")
+    assert "t1110.003" in toks and "third-party" in toks and "party" in toks
+    assert "and" not in toks
+
+
+def test_bm25_ranks_exact_terms():
+    index = BM25Index(list(CHUNKS), [t for t, _ in CHUNKS.values()])
+    assert [index.ids[i] for i, _ in index.search("T1110 brute force", k=5)] == ["c2"]
+    assert index.ids[index.search("third-party breaches", k=5)[0][0]] == "c3"
+    assert index.search("zzz", k=5) == []
+
+
+def test_rrf_fuse_rewards_agreement():
+    fused = rrf_fuse([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [k for k, _ in fused] == ["a", "c", "b"]
+
+
+def test_bm25_index_persisted_and_reloaded_on_change(tmp_path):
+    vs = FakeVectorstore()
+    bm25_mod.reset_bm25_cache()
+    index = get_bm25_index(vs, "col", str(tmp_path))
+    assert len(index) == 4 and vs.get_calls == 1
+    assert os.path.exists(tmp_path / "col.bm25.json")
+    # Segunda llamada: misma instancia, sin volver a leer Chroma
+    assert get_bm25_index(vs, "col", str(tmp_path)) is index and vs.get_calls == 1
+    # Una nueva ingesta reescribe el archivo → se recarga
+    BM25Index(["x"], ["new ransomware chunk"]).save(tmp_path / "col.bm25.json")
+    st = os.stat(tmp_path / "col.bm25.json")
+    os.utime(tmp_path / "col.bm25.json", (st.st_atime, st.st_mtime + 5))
+    assert get_bm25_index(vs, "col", str(tmp_path)).ids == ["x"]
+    bm25_mod.reset_bm25_cache()
+
+
+async def test_hybrid_retriever_fuses_dense_and_bm25(tmp_path):
+    bm25_mod.reset_bm25_cache()
+    ret = HybridRetriever(vectorstore=FakeVectorstore(), dense_k=2, sparse_k=2, top_k=3, collection_name="col", chroma_path=str(tmp_path))
+    docs = ret.invoke("T1110 brute force")
+    # c2 solo aparece por BM25 pero entra al top gracias a la fusión
+    assert [d.id for d in docs] == ["c4", "c2", "c1"]
+    assert [d.id for d in await ret.ainvoke("T1110 brute force")] == ["c4", "c2", "c1"]
+
+    parents = HybridRetriever(vectorstore=FakeVectorstore(), docstore=FakeDocstore(), dense_k=2, sparse_k=2,
+                              collection_name="col", chroma_path=str(tmp_path))
+    assert [d.page_content for d in parents.invoke("T1110 brute force")] == ["parent p2", "parent p1"]
+    bm25_mod.reset_bm25_cache()
+
+
+def test_hybrid_mode_skips_multiquery_in_heavy(monkeypatch, tmp_path):
+    monkeypatch.setattr(rf.settings, "RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(rf.settings, "HYBRID_MULTIQUERY", False)
+    monkeypatch.setattr(rf.settings, "REDIS_HOST", None)
+    monkeypatch.setattr(rf.settings, "ANALYZER_MODE", "heavy")
+    monkeypatch.setattr(rf, "get_vectorstore", lambda *a, **k: FakeVectorstore())
+    monkeypatch.setattr(rf, "_CACHED_ADVANCED_RETRIEVER", {})
+    ret = rf.create_advanced_retriever(str(tmp_path), "col", "sk-x", None)
+    assert isinstance(ret, HybridRetriever)
+    assert ret.top_k == 20
+
+
+class DictDocstore:
+    """Docstore que devuelve el payload JSON guardado (como RedisDocStore antes de normalizar)."""
+
+    def mget(self, ids):
+        return [{"page_content": f"parent {i}", "metadata": {"page_number": 7}} for i in ids]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def set(self, k, v):
+        self.data[k] = v.encode("utf-8")
+
+    def execute(self):
+        pass
+
+    def get(self, k):
+        return self.data.get(k)
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+
+def test_hybrid_retriever_returns_documents_from_dict_docstore(tmp_path):
+    bm25_mod.reset_bm25_cache()
+    ret = HybridRetriever(vectorstore=FakeVectorstore(), docstore=DictDocstore(), dense_k=2, sparse_k=2,
+                          collection_name="col", chroma_path=str(tmp_path))
+    docs = ret.invoke("T1110 brute force")
+    assert all(isinstance(d, Document) for d in docs)
+    assert [(d.page_content, d.metadata["page_number"]) for d in docs] == [("parent p2", 7), ("parent p1", 7)]
+    bm25_mod.reset_bm25_cache()
+
+
+def test_redis_docstore_roundtrips_documents():
+    from src.rag_system.redis_docstore import RedisDocStore
+
+    store = RedisDocStore(client=FakeRedis())
+    store.mset([("p1", Document(page_content="parent", metadata={"page_number": 3}))])
+    out = store.mget(["p1", "missing"])
+    assert isinstance(out[0], Document) and out[0].metadata == {"page_number": 3} and out[1] is None
+    assert store.get("p1").page_content == "parent"
@@ -0,0 +1,233 @@
+import pytest
+from langchain.storage import InMemoryStore
+from langchain_core.documents import Document
+
+import src.rag_system.ingest as ingest
+
+
+class FakeVectorstore:
+    """Chroma simulado: upsert por id y conteo de documentos embebidos."""
+
+    def __init__(self, ids=()):
+        self.docs = {i: Document(page_content="legacy") for i in ids}
+        self.embedded = 0
+
+    def add_documents(self, documents, ids=None):
+        self.embedded += len(documents)
+        for i, d in zip(ids, documents):
+            self.docs[i] = d
+
+    def delete(self, ids=None):
+        for i in ids or []:
+            self.docs.pop(i, None)
+
+    def get(self, include=None):
+        return {"ids": list(self.docs)}
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    pages = {}
+    vs, store = FakeVectorstore(), InMemoryStore()
+    calls = {"bm25": 0, "stamp": 0}
+
+    def fake_load(path):
+        return {
+            n: Document(page_content=text, metadata={"source": str(path), "filename": path.name, "page_number": n})
+            for n, text in pages[path.name].items()
+        }
+
+    monkeypatch.setattr(ingest.settings, "CHROMA_DB_PATH", str(tmp_path / "db"))
+    monkeypatch.setattr(ingest.settings, "INGEST_INPUT_DIR", str(input_dir))
+    monkeypatch.setattr(ingest, "load_pdf_pages", fake_load)
+    monkeypatch.setattr(ingest, "_open_stores", lambda: (env.vs, store))
+    monkeypatch.setattr(ingest, "ensure_collection_embedding", lambda *a, **k: None)
+    monkeypatch.setattr(ingest, "build_bm25_index", lambda *a, **k: calls.__setitem__("bm25", calls["bm25"] + 1))
+    monkeypatch.setattr(ingest, "bump_ingest_stamp", lambda *a, **k: calls.__setitem__("stamp", calls["stamp"] + 1))
+
+    def write(name, content):
+        pages[name] = content
+        # El contenido del archivo cambia con sus páginas (hash de archivo distinto)
+        (input_dir / name).write_text(repr(sorted(content.items())))
+
+    class Env:
+        pass
+
+    env = Env()
+    env.vs, env.store, env.calls, env.write, env.input_dir = vs, store, calls, write, input_dir
+    return env
+
+
+def _long(word, n=60):
+    return " ".join(f"{word}{i}" for i in range(n))
+
+
+def test_first_run_indexes_everything_and_rerun_embeds_nothing(env):
+    env.write("a.pdf", {1: _long("ransomware"), 2: _long("phishing")})
+    env.write("b.pdf", {1: _long("credential")})
+    first = ingest.ingest_reports()
+    assert first["pages_added"] == 3 and first["chunks_added"] == len(env.vs.docs) == env.vs.embedded
+    # Hijos apuntan a un padre existente en el docstore
+    parent_ids = {d.metadata["doc_id"] for d in env.vs.docs.values()}
+    assert all(env.store.mget(list(parent_ids)))
+
+    embedded = env.vs.embedded
+    second = ingest.ingest_reports()
+    assert second["sources_skipped"] == 2 and second["chunks_added"] == 0
+    assert env.vs.embedded == embedded
+    assert env.calls == {"bm25": 1, "stamp": 1}
+
+
+def test_changed_page_only_reembeds_that_page(env):
+    env.write("a.pdf", {1: _long("ransomware"), 2: _long("phishing")})
+    ingest.ingest_reports()
+    manifest = ingest.load_manifest()
+    old_page2 = set(manifest["sources"]["a.pdf"]["pages"]["2"]["child_ids"])
+    page1 = manifest["sources"]["a.pdf"]["pages"]["1"]
+
+    env.write("a.pdf", {1: _long("ransomware"), 2: _long("pretexting")})
+    embedded = env.vs.embedded
+    out = ingest.ingest_reports()
+    assert out["pages_unchanged"] == 1 and out["pages_added"] == 1
+    assert env.vs.embedded - embedded == out["chunks_added"]
+    assert not old_page2 & set(env.vs.docs)
+    assert ingest.load_manifest()["sources"]["a.pdf"]["pages"]["1"] == page1
+    assert env.store.mget(page1["parent_ids"])[0] is not None
+
+
+def test_removed_pages_and_sources_are_deleted(env):
+    env.write("a.pdf", {1: _long("ransomware"), 2: _long("phishing")})
+    env.write("b.pdf", {1: _long("credential")})
+    ingest.ingest_reports()
+    b_parents = ingest.load_manifest()["sources"]["b.pdf"]["pages"]["1"]["parent_ids"]
+
+    (env.input_dir / "b.pdf").unlink()
+    env.write("a.pdf", {1: _long("ransomware")})
+    out = ingest.ingest_reports()
+    assert out["pages_deleted"] == 2
+    manifest = ingest.load_manifest()
+    assert list(manifest["sources"]) == ["a.pdf"]
+    assert set(env.vs.docs) == set(manifest["sources"]["a.pdf"]["pages"]["1"]["child_ids"])
+    assert env.store.mget(b_parents) == [None] * len(b_parents)
+
+
+def test_legacy_collection_without_manifest_is_rebuilt(env):
+    env.vs = FakeVectorstore(ids=["uuid-1", "uuid-2"])
+    env.write("a.pdf", {1: _long("ransomware")})
+    out = ingest.ingest_reports()
+    assert "uuid-1" not in env.vs.docs and out["chunks_deleted"] == 2
+
+
+def test_chunk_ids_are_deterministic():
+    doc = Document(page_content=_long("breach"), metadata={"page_number": 4})
+    a = ingest.split_page(doc, "a.pdf", 4)
+    b = ingest.split_page(Document(page_content=doc.page_content, metadata={"page_number": 4}), "a.pdf", 4)
+    assert a["child_ids"] == b["child_ids"] and a["parent_ids"] == b["parent_ids"]
+    assert ingest.split_page(doc, "b.pdf", 4)["parent_ids"] != a["parent_ids"]
+
+
+@pytest.fixture
+def ranged(env, monkeypatch):
+    """Parseo por rangos con un pool de threads en lugar de procesos (los monkeypatch no cruzan procesos)."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    ranges = []
+
+    def fake_range(path, start, end):
+        ranges.append((start, end))
+        texts = env.pages_text
+        return [Document(page_content=texts[n], metadata={"page_number": n, "coordinates": {"x": 1}}) for n in range(start + 1, end + 1)]
+
+    monkeypatch.setattr(ingest.settings, "INGEST_PARSE_WORKERS", 3)
+    monkeypatch.setattr(ingest.settings, "INGEST_PAGES_PER_TASK", 3)
+    monkeypatch.setattr(ingest.settings, "INGEST_UPSERT_BATCH", 4)
+    monkeypatch.setattr(ingest.settings, "INGEST_UPSERT_WORKERS", 1)
+    monkeypatch.setattr(ingest, "_count_pages", lambda path: 10)
+    monkeypatch.setattr(ingest, "_load_range_elements", fake_range)
+    monkeypatch.setattr(ingest, "_parse_pool", lambda workers: ThreadPoolExecutor(max_workers=workers))
+    env.pages_text = {n: _long(f"page{n}w") for n in range(1, 11)}
+    env.write("dbir.pdf", env.pages_text)
+    env.ranges = ranges
+    return env
+
+
+def test_parallel_parse_by_page_ranges_and_bulk_upserts(ranged):
+    calls = []
+    add = ranged.vs.add_documents
+    ranged.vs.add_documents = lambda docs, ids=None: calls.append(len(docs)) or add(docs, ids=ids)
+    out = ingest.ingest_reports()
+    assert sorted(ranged.ranges) == [(0, 3), (3, 6), (6, 9), (9, 10)]
+    assert out["pages_added"] == 10
+    pages = ingest.load_manifest()["sources"]["dbir.pdf"]["pages"]
+    assert sorted(pages, key=int) == [str(n) for n in range(1, 11)]
+    # Upserts en bulk (varios hijos por llamada), no uno por página
+    assert sum(calls) == out["chunks_added"] == len(ranged.vs.docs) and len(calls) < 10
+    assert all(d.metadata["page_number"] in range(1, 11) for d in ranged.vs.docs.values())
+
+
+def test_interrupted_ingest_resumes_from_checkpoint(ranged):
+    add = ranged.vs.add_documents
+    state = {"calls": 0}
+
+    def flaky(docs, ids=None):
+        state["calls"] += 1
+        if state["calls"] == 2:
+            raise RuntimeError("rate limit")
+        add(docs, ids=ids)
+
+    ranged.vs.add_documents = flaky
+    first = ingest.ingest_reports()
+    assert first["sources_failed"] == 1
+    entry = ingest.load_manifest()["sources"]["dbir.pdf"]
+    assert entry["file_hash"] is None and 0 < len(entry["pages"]) < 10
+    # Lo registrado en el checkpoint está efectivamente en Chroma
+    assert all(i in ranged.vs.docs for p in entry["pages"].values() for i in p["child_ids"])
+
+    ranged.vs.add_documents = add
+    second = ingest.ingest_reports()
+    assert second["pages_unchanged"] == len(entry["pages"])
+    assert second["pages_added"] == 10 - len(entry["pages"])
+    assert ingest.load_manifest()["sources"]["dbir.pdf"]["file_hash"] is not None
+
+
+def test_chunks_keep_unstructured_title_and_category():
+    from pathlib import Path
+
+    elements = [
+        Document(page_content="Ransomware trends", metadata={"page_number": 2, "category": "Title"}),
+        Document(page_content=_long("ransomware", 120), metadata={"page_number": 2, "category": "NarrativeText", "section": "Results"}),
+        Document(page_content="Credential abuse", metadata={"page_number": 2, "category": "Title"}),
+        Document(page_content=_long("credential", 120), metadata={"page_number": 2, "category": "NarrativeText"}),
+    ]
+    page = ingest._group_pages(elements, Path("data/input/dbir.pdf"))[2]
+    chunks = ingest.split_page(page, "dbir.pdf", 2)
+    first, last = chunks["parents"][0].metadata, chunks["parents"][-1].metadata
+    assert first["title"] == "Ransomware trends" and first["category"] == "Title"
+    assert last["title"] == "Credential abuse" and last["page_number"] == 2
+    assert chunks["children"][1].metadata["section"] == "Results"
+    # Metadatos simples (Chroma) y sin claves internas
+    for d in chunks["parents"] + chunks["children"]:
+        assert "_spans" not in d.metadata and "start_index" not in d.metadata
+        assert all(isinstance(v, (str, int, float, bool)) for v in d.metadata.values())
+
+
+def test_force_rebuilds_collection_on_embedding_model_change(env, monkeypatch):
+    env.write("a.pdf", {1: _long("ransomware")})
+    ingest.ingest_reports()
+
+    def guard(collection, writing=False):
+        if not getattr(env.vs, "was_reset", False):
+            raise ingest.EmbeddingMismatchError("otro modelo.")
+
+    monkeypatch.setattr(ingest, "ensure_collection_embedding", guard)
+    assert ingest.ingest_reports() is None  # sin --force no se toca la colección
+
+    def reset_collection():
+        env.vs.docs.clear()
+        env.vs.was_reset = True
+
+    env.vs.reset_collection = reset_collection
+    out = ingest.ingest_reports(force=True)
+    assert env.vs.was_reset and out["pages_added"] == 1 and len(env.vs.docs) == out["chunks_added"]
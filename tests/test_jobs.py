@@ -0,0 +1,70 @@
+"""
+Tests para la cola de jobs /api/jobs (backend en proceso).
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services import job_service
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(job_service.settings, "REDIS_HOST", None)
+    monkeypatch.setattr(job_service.settings, "REDIS_PORT", None)
+    with TestClient(app) as c:  # lifespan: inicia y detiene los workers
+        yield c
+
+
+def _wait_status(client, job_id, statuses, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} no llegó a {statuses}: {job}")
+
+
+def test_job_lifecycle_persists_result(client, mocker):
+    mocker.patch(
+        "api.services.job_service.crew_service.run_analysis_crew",
+        return_value={"report_json": "{\"ok\": true}", "session_id": "s-1", "timing_ms": 5},
+    )
+    resp = client.post("/api/jobs?mode=heavy", json={"user_input": "Describo mi app."})
+    assert resp.status_code == 202
+    job = resp.json()
+    assert job["status"] == "queued" and job["mode"] == "heavy"
+    done = _wait_status(client, job["job_id"], {"succeeded", "failed"})
+    assert done["status"] == "succeeded"
+    assert done["result"]["report_json"] == "{\"ok\": true}" and done["result"]["session_id"] == "s-1"
+
+
+def test_job_cancel_running(client, mocker):
+    seen = {}
+
+    async def slow(*args, cancel_event=None, **kwargs):
+        seen["cancel_event"] = cancel_event
+        await asyncio.sleep(30)
+
+    mocker.patch("api.services.job_service.crew_service.run_analysis_crew", side_effect=slow)
+    job_id = client.post("/api/jobs", json={"user_input": "lento"}).json()["job_id"]
+    _wait_status(client, job_id, {"running"})
+    resp = client.delete(f"/api/jobs/{job_id}")
+    assert resp.status_code == 200 and resp.json()["status"] == "cancelled"
+    assert _wait_status(client, job_id, {"cancelled"})["finished_at"] is not None
+    # El thread de la crew heavy recibe la señal de cancelación
+    assert seen["cancel_event"].is_set()
+    assert client.delete(f"/api/jobs/{job_id}").status_code == 409
+
+
+def test_job_queue_full_and_not_found(client, mocker, monkeypatch):
+    monkeypatch.setattr(job_service.settings, "JOB_QUEUE_MAX_SIZE", 0)
+    resp = client.post("/api/jobs", json={"user_input": "x"})
+    assert resp.status_code == 503 and resp.headers["retry-after"] == "5"
+    assert client.get("/api/jobs/no-existe").status_code == 404
+    assert client.post("/api/jobs", json={"user_input": "  "}).status_code == 422
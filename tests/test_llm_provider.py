@@ -4,6 +4,7 @@ Tests para el proveedor de LLM.
 
 import pytest
 from src.llm_provider import get_llm
+from src.resources import openai_client_kwargs
 from src.config import Settings
 
 
@@ -27,7 +28,7 @@ def test_get_llm_provider_openai(mocker):
     # 4. Aserciones
     assert llm_instance == mock_chat_openai.return_value
     mock_chat_openai.assert_called_once_with(
-        api_key="test_openai_key", model="gpt-4.1-nano", temperature=0.5
+        api_key="test_openai_key", model="gpt-4.1-nano", temperature=0.5, **openai_client_kwargs()
     )
 
 
@@ -66,3 +67,19 @@ def test_get_llm_provider_unsupported(mocker):
         get_llm()
 
     assert "Proveedor de LLM no soportado: unsupported_provider" in str(excinfo.value)
+
+
+def test_get_llm_uses_limited_transport(mocker):
+    """El ChatOpenAI y el litellm de CrewAI comparten el cliente HTTP con el limitador."""
+    import litellm
+    from src.rate_limit import AsyncLimitedTransport, LimitedTransport
+
+    mocker.patch("src.llm_provider.settings", Settings(LLM_PROVIDER="openai", OPENAI_API_KEY="test_openai_key"))
+    mocker.patch.object(litellm, "client_session", None)
+    mocker.patch.object(litellm, "aclient_session", None)
+    llm = get_llm()
+    assert isinstance(llm.root_client._client._transport, LimitedTransport)
+    # El transporte async crea un AsyncLimitedTransport por event loop
+    assert isinstance(llm.root_async_client._client._transport._factory(), AsyncLimitedTransport)
+    assert litellm.client_session is llm.root_client._client
+    assert litellm.aclient_session._transport is llm.root_async_client._client._transport
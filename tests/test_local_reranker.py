@@ -0,0 +1,105 @@
+from langchain_core.documents import Document
+
+import src.rag_system.reranker as rr
+import src.rag_system.retriever_factory as rf
+
+
+class FakeCrossEncoder:
+    """Puntúa por cantidad de palabras de la query presentes en el documento."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        self.batches.append((len(pairs), batch_size))
+        return [sum(w in d.lower() for w in q.lower().split()) for q, d in pairs]
+
+
+def _docs():
+    return [
+        Document(page_content="Phishing emails", id="a"),
+        Document(page_content="Ransomware and extortion in ransomware breaches", id="b", metadata={"page_number": 3}),
+        Document(page_content="Ransomware extortion", id="c"),
+    ]
+
+
+def test_rerank_orders_by_cross_encoder_score(monkeypatch):
+    model = FakeCrossEncoder()
+    monkeypatch.setattr(rr, "get_cross_encoder", lambda: model)
+    monkeypatch.setattr(rr.settings, "RERANKER_BATCH_SIZE", 16)
+    out = rr.rerank_documents("ransomware extortion", _docs(), top_n=2)
+    assert [d.id for d in out] == ["b", "c"]
+    assert out[0].metadata["page_number"] == 3 and out[0].metadata["relevance_score"] == 2.0
+    # Una sola llamada batcheada con todos los pares
+    assert model.batches == [(3, 16)]
+
+
+def test_rerank_keeps_order_when_model_fails(monkeypatch):
+    def boom():
+        raise RuntimeError("no model")
+
+    monkeypatch.setattr(rr, "get_cross_encoder", boom)
+    assert [d.id for d in rr.rerank_documents("q", _docs(), top_n=2)] == ["a", "b"]
+
+
+def test_model_is_loaded_once(monkeypatch):
+    loads = []
+    monkeypatch.setattr(rr, "_load_model", lambda key: loads.append(key) or FakeCrossEncoder())
+    rr.reset_cross_encoder()
+    assert rr.get_cross_encoder() is rr.get_cross_encoder()
+    assert len(loads) == 1
+    rr.reset_cross_encoder()
+
+
+async def test_compressor_async_path(monkeypatch):
+    monkeypatch.setattr(rr, "get_cross_encoder", lambda: FakeCrossEncoder())
+    out = await rr.LocalCrossEncoderRerank(top_n=1).acompress_documents(_docs(), "phishing")
+    assert [d.id for d in out] == ["a"]
+
+
+def test_heavy_uses_local_reranker_instead_of_mmr(monkeypatch):
+    class FakeRetriever:
+        def invoke(self, question):
+            return _docs()
+
+    class LowScoreVectorstore:
+        def similarity_search_by_vector(self, embedding, k=4):
+            return [Document(page_content="x", id="x")]
+
+        def get(self, ids=None, include=None, where=None):
+            return {"ids": ["x"], "embeddings": [[0.0, 1.0]]}
+
+    class QueryEmbeddings:
+        def embed_query(self, text):
+            return [1.0, 0.0]
+
+    monkeypatch.setattr(rf.settings, "ANALYZER_MODE", "heavy")
+    monkeypatch.setattr(rf.settings, "COHERE_API_KEY", None)
+    monkeypatch.setattr(rf, "local_reranker_available", lambda: True)
+    monkeypatch.setattr(rf, "get_vectorstore", lambda *a, **k: LowScoreVectorstore())
+    monkeypatch.setattr(rf, "get_embeddings", lambda *a, **k: QueryEmbeddings())
+    monkeypatch.setattr(rf, "create_advanced_retriever", lambda **k: FakeRetriever())
+    monkeypatch.setattr(rf, "mmr_rerank", lambda *a, **k: (_ for _ in ()).throw(AssertionError("MMR no debe correr")))
+    assert [d.id for d in rf.retrieve_context_docs("q")] == ["a", "b", "c"]
+
+
+def test_unavailable_when_disabled(monkeypatch):
+    monkeypatch.setattr(rr.settings, "RERANKER_ENABLED", False)
+    assert rr.local_reranker_available() is False
+
+
+def test_rerank_accepts_docstore_payloads(monkeypatch):
+    # Padres de RedisDocStore / ParentDocumentRetriever como JSON: se puntúan igual que Documents
+    monkeypatch.setattr(rr, "get_cross_encoder", lambda: FakeCrossEncoder())
+    parents = [{"page_content": "Phishing emails", "metadata": {}},
+               {"page_content": "Ransomware extortion", "metadata": {"page_number": 9}}]
+    out = rr.rerank_documents("ransomware", parents, top_n=2)
+    assert [d.page_content for d in out] == ["Ransomware extortion", "Phishing emails"]
+    assert out[0].metadata["page_number"] == 9 and out[0].metadata["relevance_score"] == 1.0
+
+
+def test_rerank_fallback_is_logged(monkeypatch, caplog):
+    monkeypatch.setattr(rr, "get_cross_encoder", lambda: (_ for _ in ()).throw(RuntimeError("no model")))
+    with caplog.at_level("WARNING", logger=rr.logger.name):
+        rr.rerank_documents("q", _docs(), top_n=1)
+    assert any("RuntimeError" in r.getMessage() and r.levelname == "WARNING" for r in caplog.records)
@@ -0,0 +1,89 @@
+import threading
+import time
+from unittest.mock import patch
+
+from src.tools.mitre_tool import _mitre_attack_query_tool, _mitre_batch_enrichment_tool, _normalize_findings
+
+
+class SlowAttack:
+    """Dummy de attackcti que registra cuántas búsquedas corren a la vez."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def get_techniques_by_content(self, kw):
+        with self._lock:
+            self.calls.append(kw)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return [{"id": f"T{abs(hash(kw.lower())) % 9000 + 1000}", "name": kw.title(), "description": f"Desc {kw}. More."}]
+
+
+def test_batch_enrichment_resolves_findings_concurrently():
+    attack = SlowAttack()
+    findings = {"findings": [
+        {"detector_name": "Credential Stuffing", "risk_description": "long text"},
+        {"detector_name": "Phishing"},
+        "Ransomware",
+    ]}
+    with patch("src.tools.mitre_tool.get_attack_client", return_value=attack):
+        out = _mitre_batch_enrichment_tool(findings)
+    assert "### Finding 1: Credential Stuffing" in out
+    assert "### Finding 2: Phishing" in out
+    assert "### Finding 3: Ransomware" in out
+    assert attack.max_active > 1
+    # Cada keyword distinta se busca una sola vez
+    assert len(attack.calls) == len(set(attack.calls))
+
+
+def test_batch_enrichment_isolates_failing_keywords():
+    class PartialAttack:
+        def get_techniques_by_content(self, kw):
+            if "phishing" in kw.lower():
+                raise RuntimeError("taxii down")
+            return [{"id": "T1110", "name": "Brute Force", "description": "Adversaries may brute force."}]
+
+    with patch("src.tools.mitre_tool.get_attack_client", return_value=PartialAttack()):
+        out = _mitre_batch_enrichment_tool('["Credential Stuffing", "Phishing"]')
+    assert "T1110" in out
+    assert "No MITRE ATT&CK techniques found for query: 'Phishing'" in out
+
+
+def test_normalize_findings_formats():
+    assert _normalize_findings("- Phishing\n- Ransomware\n") == ["Phishing", "Ransomware"]
+    assert _normalize_findings({"detector_name": "Phishing"}) == ["Phishing"]
+    assert _normalize_findings(["a", "a", "b", "c", "d", "e", "f"]) == ["a", "b", "c", "d", "e"]
+
+
+def test_query_tool_does_not_repeat_lowercase_keyword():
+    attack = SlowAttack(delay=0)
+    with patch("src.tools.mitre_tool.get_attack_client", return_value=attack):
+        _mitre_attack_query_tool("phishing")
+    assert attack.calls == ["phishing"]
+
+
+def test_heavy_classifier_uses_only_mcp_tools_when_available(monkeypatch):
+    from crewai.tools import tool
+    import src.agents as agents
+
+    @tool("search_techniques")
+    def search_techniques(query: str) -> str:
+        """Busca técnicas en el MCP externo."""
+        return query
+
+    monkeypatch.setattr(agents, "get_external_tools", lambda: [search_techniques])
+    agent = agents.risk_classifier_agent(turbo=False)
+    assert [t.name for t in agent.tools] == ["search_techniques"]
+    assert "Batch Enrichment" not in agent.system_template and "search_techniques" in agent.system_template
+
+    # Sin MCP: herramientas locales con el enriquecimiento por lotes
+    monkeypatch.setattr(agents, "get_external_tools", lambda: [])
+    agent = agents.risk_classifier_agent(turbo=False)
+    assert agent.tools[0].name == agents.mitre_batch_enrichment_tool.name
@@ -0,0 +1,92 @@
+from langchain_core.documents import Document
+import src.rag_system.retriever_factory as rf
+
+
+class FakeVectorstore:
+    def __init__(self, stored):
+        self.stored = stored
+        self.calls = 0
+
+    def get(self, ids=None, include=None):
+        self.calls += 1
+        assert include == ["embeddings"]
+        found = [i for i in ids if i in self.stored]
+        return {"ids": found, "embeddings": [self.stored[i] for i in found]}
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return [1.0, 0.0]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[0.0, 1.0] for _ in texts]
+
+
+def test_doc_embeddings_reuse_stored_vectors(monkeypatch):
+    emb = FakeEmbeddings()
+    monkeypatch.setattr(rf, "get_embeddings", lambda *a, **k: emb)
+    vs = FakeVectorstore({"a": [1.0, 0.0], "b": [0.5, 0.5]})
+    docs = [Document(page_content="A", id="a"), Document(page_content="B", id="b"), Document(page_content="parent")]
+    vecs = rf.get_doc_embeddings(docs, vs)
+    assert vecs == [[1.0, 0.0], [0.5, 0.5], [0.0, 1.0]]
+    # Solo el doc sin vector almacenado se embebe, en un único batch
+    assert emb.embedded == ["parent"] and vs.calls == 1
+
+
+def test_mmr_rerank_embeds_only_the_question(monkeypatch):
+    emb = FakeEmbeddings()
+    monkeypatch.setattr(rf, "get_embeddings", lambda *a, **k: emb)
+    stored = {"a": [1.0, 0.0], "a2": [0.99, 0.01], "c": [0.6, 0.8]}
+    docs = [Document(page_content=k, id=k) for k in stored]
+    picked = rf.mmr_rerank("q", docs, top_n=2, lambda_mult=0.3, vectorstore=FakeVectorstore(stored))
+    assert [d.id for d in picked] == ["a", "c"]
+    assert emb.embedded == ["q"]
+
+
+def test_vectorized_mmr_select_edge_cases():
+    from src.rag_system.mmr import mmr_select
+    assert mmr_select([1.0, 0.0], [], top_n=5) == ([], [])
+    idx, sims = mmr_select([1.0, 0.0], [[0.0, 1.0], [1.0, 0.0], [1.0, 0.0]], top_n=5)
+    # Nunca repite índices y respeta el tamaño disponible
+    assert idx[0] == 1 and sorted(idx) == [0, 1, 2]
+    assert round(sims[1], 4) == 1.0
+
+
+class ChildVectorstore:
+    """Chroma con solo chunks hijos (metadata doc_id → padre), como con ParentDocumentRetriever."""
+
+    def __init__(self, children):
+        self.children = children  # id -> (doc_id, vector)
+
+    def get(self, ids=None, where=None, include=None):
+        if where is not None:
+            wanted = set(where["doc_id"]["$in"])
+            hits = [(i, p, v) for i, (p, v) in self.children.items() if p in wanted]
+            return {"ids": [i for i, _, _ in hits], "metadatas": [{"doc_id": p} for _, p, _ in hits],
+                    "embeddings": [v for _, _, v in hits]}
+        found = [i for i in ids if i in self.children]
+        return {"ids": found, "embeddings": [self.children[i][1] for i in found]}
+
+
+def test_mmr_with_docstore_parents_embeds_only_the_question(monkeypatch):
+    from src.rag_system.redis_docstore import RedisDocStore
+    from tests.test_hybrid_retrieval import FakeRedis
+
+    emb = FakeEmbeddings()
+    monkeypatch.setattr(rf, "get_embeddings", lambda *a, **k: emb)
+    store = RedisDocStore(client=FakeRedis())
+    store.mset([(p, Document(page_content=f"parent {p}")) for p in ("p1", "p2", "p3")])
+    vs = ChildVectorstore({
+        "c1": ("p1", [1.0, 0.0]), "c2": ("p1", [1.0, 0.0]),
+        "c3": ("p2", [0.99, 0.01]), "c4": ("p3", [0.6, 0.8]),
+    })
+    parents = store.mget(["p1", "p2", "p3"])
+    assert rf.get_doc_embeddings(parents, vs)[0] == [1.0, 0.0]
+    picked = rf.mmr_rerank("q", parents, top_n=2, lambda_mult=0.3, vectorstore=vs)
+    assert [d.id for d in picked] == ["p1", "p3"]
+    assert emb.embedded == ["q"]
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import api.app as app_module
+from api.main import app
+from src import rate_limit
+
+CHAT_URL = "https://api.openai.com/v1/chat/completions"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "LLM_429_BACKOFF_SECONDS", 0.0)
+    rate_limit.reset_limiters()
+    yield
+    rate_limit.reset_limiters()
+
+
+def _body(model="gpt-test"):
+    return json.dumps({"model": model, "messages": []})
+
+
+def test_retries_429_with_backoff_then_succeeds():
+    statuses = iter([429, 429, 200])
+    transport = rate_limit.LimitedTransport(httpx.MockTransport(lambda req: httpx.Response(next(statuses), json={})))
+    with httpx.Client(transport=transport) as client:
+        resp = client.post(CHAT_URL, content=_body())
+    assert resp.status_code == 200
+    stats = rate_limit.get_limiter("gpt-test").stats()
+    assert stats["retries_429"] == 2 and stats["requests"] == 3 and stats["in_flight"] == 0
+
+
+def test_per_model_concurrency_limit_and_queue_metrics(monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "LLM_MODEL_LIMITS", {"gpt-test": {"max_concurrency": 2}})
+    active = {"now": 0, "max": 0}
+
+    async def handler(request):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.05)
+        active["now"] -= 1
+        return httpx.Response(200, json={"ok": True})
+
+    async def run():
+        transport = rate_limit.AsyncLimitedTransport(httpx.MockTransport(handler))
+        async with httpx.AsyncClient(transport=transport) as client:
+            await asyncio.gather(*(client.post(CHAT_URL, content=_body()) for _ in range(6)))
+            # Otro modelo no comparte el límite; requests no-OpenAI pasan directo
+            await client.post(CHAT_URL, content=_body("otro"))
+            await client.get("https://api.openai.com/v1/models")
+
+    asyncio.run(run())
+    stats = {s["model"]: s for s in rate_limit.limiter_stats()["models"]}
+    assert active["max"] == 2
+    assert stats["gpt-test"]["requests"] == 6 and stats["gpt-test"]["queue_ms_max"] > 0
+    assert stats["gpt-test"]["max_concurrency"] == 2 and "otro" in stats
+
+
+def test_token_bucket_spaces_requests(monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "LLM_MODEL_LIMITS", {"gpt-test": {"max_concurrency": 1, "rpm": 600}})
+    transport = rate_limit.LimitedTransport(httpx.MockTransport(lambda req: httpx.Response(200, json={})))
+    t0 = time.monotonic()
+    with httpx.Client(transport=transport) as client:
+        for _ in range(3):
+            client.post(CHAT_URL, content=_body())
+    # 10 req/s con ráfaga de 1: el 2º y 3º esperan ~0.1 s cada uno
+    assert time.monotonic() - t0 >= 0.18
+
+
+def test_gate_timeout_and_handoff():
+    gate = rate_limit._Gate(1)
+    assert gate.acquire()
+    assert not gate.acquire(timeout=0.05)
+    gate.release()
+    assert gate.acquire(timeout=0.05)
+
+
+def test_api_sheds_load_with_503(monkeypatch):
+    monkeypatch.setattr(app_module, "is_overloaded", lambda: True)
+    resp = TestClient(app).post("/api/analyze", json={"user_input": "x"})
+    assert resp.status_code == 503 and resp.headers["retry-after"] == "5"
+    assert rate_limit.limiter_stats()["shed"] == 1
@@ -0,0 +1,173 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+import src.turbo_pipeline as tp
+from src import cache as cache_mod
+
+
+VALID_REPORT = {
+    "report_id": "r-1",
+    "application_name": "App",
+    "summary": "S",
+    "prioritized_detectors": [
+        {
+            "detector_name": "Credential Stuffing Detector",
+            "description": "Detects bursts of failed logins across many accounts from shared IPs.",
+            "actionable_steps": ["Enable MFA.", "Rate-limit logins.", "Alert on spikes."],
+            "severity": "High",
+        }
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def _stamp_dir(monkeypatch, tmp_path):
+    # El sello sin Redis se escribe junto al manifest (CHROMA_DB_PATH)
+    monkeypatch.setattr(cache_mod.settings, "CHROMA_DB_PATH", str(tmp_path))
+
+
+def _memory_only(monkeypatch):
+    monkeypatch.setattr(tp.settings, "REDIS_HOST", None)
+    monkeypatch.setattr(tp.settings, "REDIS_PORT", None)
+    cache_mod._memory_cache.clear()
+    tp.reset_report_cache_stats()
+
+
+def test_report_cache_miss_then_hit(monkeypatch):
+    _memory_only(monkeypatch)
+    ingest_id = tp._ingest_id()
+    key = tp._report_cache_key("pregunta", ingest_id)
+    assert tp._read_cached_report(key, ingest_id) is None
+    assert tp._write_cached_report(key, ingest_id, dict(VALID_REPORT))
+    assert tp._read_cached_report(key, ingest_id)["report_id"] == "r-1"
+    stats = tp.get_report_cache_stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1 and stats["writes"] == 1
+
+
+def test_report_cache_rejects_invalid_and_legacy(monkeypatch):
+    _memory_only(monkeypatch)
+    ingest_id = tp._ingest_id()
+    key = tp._report_cache_key("otra", ingest_id)
+    # Reportes que no validan no se persisten
+    assert not tp._write_cached_report(key, ingest_id, {"report_id": "x"})
+    # Entradas legadas (sin envoltorio) cuentan como stale
+    cache_mod.cache_set(key, json.dumps(VALID_REPORT))
+    assert tp._read_cached_report(key, ingest_id) is None
+    assert tp.get_report_cache_stats()["stale"] == 1
+
+
+def test_report_cache_invalidated_by_new_ingest(monkeypatch):
+    _memory_only(monkeypatch)
+    before = tp._ingest_id()
+    cache_mod.bump_ingest_stamp(tp.settings.COLLECTION_NAME)
+    assert tp._ingest_id() != before
+
+
+def test_cache_stats_endpoint():
+    client = TestClient(app)
+    resp = client.get("/api/cache/stats")
+    assert resp.status_code == 200
+    data = resp.json()["report_cache"]
+    assert {"hits", "misses", "stale", "hit_ratio", "version"} <= set(data)
+
+
+def test_async_pipeline_served_from_cache(monkeypatch):
+    import asyncio
+
+    _memory_only(monkeypatch)
+    ingest_id = asyncio.run(tp._aingest_id())
+    assert ingest_id == tp._ingest_id()
+    key = tp._report_cache_key(tp._norm_question("Pregunta Async"), ingest_id)
+    assert asyncio.run(tp._awrite_cached_report(key, ingest_id, dict(VALID_REPORT)))
+    # Hit en caché: no construye retriever ni llama al LLM
+    monkeypatch.setattr(tp, "_turbo_retriever", lambda: (_ for _ in ()).throw(AssertionError("no retrieval")))
+    out = asyncio.run(tp.arun_turbo_pipeline("pregunta async"))
+    assert out["report_id"] == "r-1" and "timing_ms" in out
+    assert tp.get_report_cache_stats()["hits"] == 1
+
+
+def test_afetch_docs_builds_and_searches_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+
+    threads = []
+
+    class FakeEmb:
+        async def aembed_query(self, text):
+            threads.append(("embed", threading.get_ident()))
+            return [0.0]
+
+    class FakeRetriever:
+        def invoke(self, question):
+            threads.append(("search", threading.get_ident()))
+            return ["doc"]
+
+    def fake_retriever():
+        threads.append(("build", threading.get_ident()))
+        return FakeRetriever()
+
+    monkeypatch.setattr(tp, "get_embeddings", lambda: FakeEmb())
+    monkeypatch.setattr(tp, "_turbo_retriever", fake_retriever)
+
+    async def run():
+        return threading.get_ident(), await tp._afetch_docs("q")
+
+    loop_thread, docs = asyncio.run(run())
+    assert docs == ["doc"]
+    by_step = dict(threads)
+    assert by_step["embed"] == loop_thread
+    assert by_step["build"] != loop_thread and by_step["search"] != loop_thread
+
+
+class StampRedis:
+    """Redis simulado para el sello de ingesta: cuenta los GET."""
+
+    def __init__(self):
+        self.data, self.gets = {}, 0
+
+    def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+def test_ingest_stamp_bypasses_l1_and_is_memoized_per_request(monkeypatch):
+    fake = StampRedis()
+    monkeypatch.setattr(cache_mod, "_get_redis_client", lambda *a, **k: fake)
+    monkeypatch.setattr(cache_mod.settings, "CACHE_L1_ENABLED", True)
+    key = cache_mod._ingest_stamp_key("col")
+    fake.data[key] = b"nuevo"
+    # Un sello viejo en el L1 (p.ej. antes de una ingesta en otro worker) no se sirve
+    cache_mod._memory_cache.set(key, "viejo", 300)
+    assert cache_mod.get_ingest_stamp("col") == "nuevo"
+
+    fake.gets = 0
+    with cache_mod.ingest_stamp_scope():
+        assert cache_mod.get_ingest_stamp("col") == "nuevo"
+        assert cache_mod.get_ingest_stamp("col") == "nuevo"
+    assert fake.gets == 1
+    # Fuera del scope se vuelve a leer Redis: la nueva ingesta se ve en el request siguiente
+    cache_mod.bump_ingest_stamp("col")
+    assert cache_mod.get_ingest_stamp("col") not in ("nuevo", "viejo")
+    cache_mod._memory_cache.clear()
+
+
+def test_ingest_stamp_without_redis_is_shared_across_processes(monkeypatch, tmp_path):
+    _memory_only(monkeypatch)
+    before = tp._ingest_id()
+    # La ingesta corre en otro proceso (job dbir-ingest): sin Redis, el sello debe verse aquí
+    env = dict(os.environ, CHROMA_DB_PATH=str(tmp_path), REDIS_HOST="", OPENAI_API_KEY="sk-x")
+    env.pop("REDIS_PORT", None)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = f"from src.cache import bump_ingest_stamp; print(bump_ingest_stamp({tp.settings.COLLECTION_NAME!r}))"
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=root, capture_output=True, text=True, check=True)
+    stamp = out.stdout.strip().splitlines()[-1]
+    assert cache_mod.get_ingest_stamp(tp.settings.COLLECTION_NAME) == stamp
+    assert tp._ingest_id() != before
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import src.resources as res
+
+
+def test_http_client_shared_and_reset_on_shutdown():
+    c1 = res.get_http_client()
+    assert res.get_http_client() is c1
+    kwargs = res.openai_client_kwargs()
+    assert kwargs["http_client"] is c1
+    called = []
+    res.register_shutdown_hook(lambda: called.append(True))
+    res.shutdown_resources()
+    assert called == [True]
+    assert c1.is_closed
+    assert res.get_http_client() is not c1
+
+
+def test_chroma_client_created_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(res.settings, "CHROMA_DB_HOST", None)
+    monkeypatch.setattr(res.settings, "CHROMA_DB_PATH", str(tmp_path))
+    res.shutdown_resources()
+    client = res.get_chroma_client()
+    assert res.get_chroma_client() is client
+    assert res.chroma_client_kind() == "persistent"
+    res.shutdown_resources()
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: la conexión queda en el pool
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_async_http_client_survives_sequential_event_loops():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    res.shutdown_resources()
+    client = res.get_async_http_client()
+    assert res.openai_client_kwargs()["http_async_client"] is client
+
+    async def fetch():
+        return (await asyncio.wait_for(client.get(url), 5)).text
+
+    try:
+        # Como en main.py: dos asyncio.run seguidos con el mismo cliente compartido
+        assert asyncio.run(fetch()) == "ok"
+        assert asyncio.run(fetch()) == "ok"
+    finally:
+        server.shutdown()
+        server.server_close()
+        res.shutdown_resources()
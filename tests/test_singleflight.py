@@ -0,0 +1,169 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src import singleflight
+import src.turbo_pipeline as tp
+from tests.test_report_cache import VALID_REPORT
+
+
+@pytest.fixture(autouse=True)
+def _no_redis(monkeypatch):
+    monkeypatch.setattr(singleflight.settings, "REDIS_HOST", None)
+    monkeypatch.setattr(singleflight.settings, "REDIS_PORT", None)
+
+
+def test_sync_concurrent_calls_share_one_computation():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"n": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(singleflight.do("k-sync", compute))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and len(results) == 5
+    assert all(r == {"n": 1} for r in results)
+    # Cada seguidor recibe su propia copia
+    assert len({id(r) for r in results}) == 5
+
+
+def test_sync_leader_error_propagates():
+    def boom():
+        time.sleep(0.1)
+        raise RuntimeError("fallo")
+
+    errors = []
+
+    def call():
+        try:
+            singleflight.do("k-err", boom)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == ["fallo"] * 3
+
+
+def test_async_coalesces_and_recovers_from_cancelled_leader():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"ok": True}
+
+    async def run():
+        results = await asyncio.gather(*(singleflight.ado("k-async", compute) for _ in range(4)))
+        assert len(calls) == 1 and all(r == {"ok": True} for r in results)
+        # Líder cancelado: el seguidor toma el relevo en lugar de fallar
+        leader = asyncio.ensure_future(singleflight.ado("k-cancel", compute))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(singleflight.ado("k-cancel", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == {"ok": True}
+
+    asyncio.run(run())
+    assert len(calls) == 3
+
+
+def test_turbo_stream_coalesces_identical_requests(monkeypatch):
+    monkeypatch.setattr(tp.settings, "REPORT_CACHE_ENABLED", False)
+    fetches = []
+
+    async def slow_docs(inp):
+        fetches.append(inp["question"])
+        await asyncio.sleep(0.1)
+        return ["doc"]
+
+    monkeypatch.setattr(tp, "_aretrieve_docs", slow_docs)
+    pipeline = tp.TurboPipeline(llm=FakeListChatModel(responses=[json.dumps(VALID_REPORT)]))
+    monkeypatch.setattr(tp, "get_turbo_pipeline", lambda: pipeline)
+
+    async def run():
+        return await asyncio.gather(tp.arun_turbo_pipeline("Mi App"), tp.arun_turbo_pipeline("  mi app "))
+
+    first, second = asyncio.run(run())
+    assert len(fetches) == 1
+    assert first["report_id"] == second["report_id"] == "r-1"
+
+
+def test_closed_stream_leader_hands_over_to_follower(monkeypatch):
+    # Cliente SSE desconectado: aclose() lanza GeneratorExit en el líder; el seguidor no debe recibirlo
+    monkeypatch.setattr(tp.settings, "REPORT_CACHE_ENABLED", False)
+    fetches = []
+
+    async def slow_docs(inp):
+        fetches.append(inp["question"])
+        await asyncio.sleep(0.05)
+        return ["doc"]
+
+    monkeypatch.setattr(tp, "_aretrieve_docs", slow_docs)
+    pipeline = tp.TurboPipeline(llm=FakeListChatModel(responses=[json.dumps(VALID_REPORT)] * 2))
+    monkeypatch.setattr(tp, "get_turbo_pipeline", lambda: pipeline)
+
+    async def run():
+        leader = tp.astream_turbo_pipeline("mi app")
+        assert (await leader.__anext__())[0] == "retrieval"
+        follower = asyncio.ensure_future(tp.arun_turbo_pipeline("mi app"))
+        await asyncio.sleep(0.01)
+        await leader.aclose()
+        return await follower
+
+    report = asyncio.run(run())
+    assert report["report_id"] == "r-1"
+    assert len(fetches) == 2
+
+
+def test_cancelled_leader_hands_over_to_follower():
+    from src.mcp_crews import CrewCancelled, _cancel_check
+
+    started = threading.Event()
+    calls = []
+
+    def cancelled():
+        calls.append("leader")
+        started.set()
+        time.sleep(0.1)
+        raise CrewCancelled("job cancelado")
+
+    def compute():
+        calls.append("follower")
+        return {"ok": True}
+
+    errors, results = [], []
+
+    def leader():
+        try:
+            singleflight.do("k-crew", cancelled)
+        except CrewCancelled as e:
+            errors.append(e)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    started.wait()
+    results.append(singleflight.do("k-crew", compute))
+    t.join()
+    # El seguidor no hereda la cancelación del líder: recalcula
+    assert len(errors) == 1 and results == [{"ok": True}] and calls == ["leader", "follower"]
+    # CrewAI no reintenta TimeoutError: el step_callback corta la crew
+    flag = threading.Event()
+    check = _cancel_check(flag)
+    check(None)
+    flag.set()
+    with pytest.raises(TimeoutError):
+        check(None)
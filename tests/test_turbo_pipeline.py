@@ -0,0 +1,58 @@
+import json
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import src.turbo_pipeline as tp
+from src import cache as cache_mod
+from tests.test_report_cache import VALID_REPORT
+
+
+def _offline(monkeypatch, responses):
+    monkeypatch.setattr(tp.settings, "REDIS_HOST", None)
+    monkeypatch.setattr(tp.settings, "REDIS_PORT", None)
+    monkeypatch.setattr(tp.settings, "REPORT_CACHE_ENABLED", False)
+    cache_mod._memory_cache.clear()
+    calls = {"retrieval": 0}
+
+    def fake_context(inp):
+        calls["retrieval"] += 1
+        return "contexto DBIR"
+
+    monkeypatch.setattr(tp, "_build_context", fake_context)
+    llm = FakeListChatModel(responses=responses)
+    pipeline = tp.TurboPipeline(llm=llm)
+    monkeypatch.setattr(tp, "get_turbo_pipeline", lambda: pipeline)
+    return calls, llm
+
+
+def test_compiled_pipeline_is_shared(monkeypatch):
+    monkeypatch.setattr(tp.settings, "OPENAI_API_KEY", "sk-test")
+    tp._reset_turbo_pipeline()
+    first = tp.get_turbo_pipeline()
+    assert tp.get_turbo_pipeline() is first
+    monkeypatch.setattr(tp.settings, "OPENAI_API_KEY", "sk-other")
+    assert tp.get_turbo_pipeline() is not first
+    tp._reset_turbo_pipeline()
+
+
+def test_run_turbo_pipeline_uses_compiled_chains(monkeypatch):
+    _offline(monkeypatch, [json.dumps(VALID_REPORT)])
+    out = tp.run_turbo_pipeline("¿Qué detectores priorizar?")
+    assert out["report_id"] == "r-1" and "timing_ms" in out
+
+
+def test_repair_reuses_single_retrieval(monkeypatch):
+    invalid = {"report_id": "x", "prioritized_detectors": "none"}
+    calls, llm = _offline(monkeypatch, [json.dumps(invalid), json.dumps(VALID_REPORT)])
+    out = tp.run_turbo_pipeline("pregunta")
+    assert out["report_id"] == "r-1"
+    assert calls["retrieval"] == 1
+    assert llm.i == 0  # ambas respuestas consumidas (generación + reparación)
+
+
+def test_unparseable_output_does_not_call_model_again(monkeypatch):
+    calls, llm = _offline(monkeypatch, ["no es json", json.dumps(VALID_REPORT)])
+    out = tp.run_turbo_pipeline("pregunta")
+    assert out["prioritized_detectors"] == []
+    assert calls["retrieval"] == 1
+    assert llm.i == 1  # una sola llamada al modelo